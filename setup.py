@@ -47,5 +47,7 @@ setup(
     tests_require=tests_require,
     extras_require={
         'test': tests_require,
+        # Faster HTML parsing for scraped pages, used instead of html.parser if installed.
+        'lxml': ['lxml'],
     }
 )
@@ -0,0 +1,41 @@
+"""
+Benchmarks expanding a weekly event which has no end (test/test_events_weekly.ics)
+at increasing distances from its start, both from its original start (how recurring
+events used to be expanded) and from its rebased start.
+
+Run from the repository root with `python -m test.bench_events`.
+"""
+import timeit
+from datetime import datetime
+from unittest.mock import patch
+from icalendar import Calendar
+from uqcsbot.scripts.events import (handle_calendar, BRISBANE_TZ)
+
+REPEATS = 20
+YEARS = [2001, 2020, 2100, 2500, 9000]
+# Expanding from the original start is only timed up to this year, as it gets too slow.
+MAX_UNREBASED_YEAR = 2100
+
+
+def main():
+    with open('test/test_events_weekly.ics', 'rb') as events_file:
+        calendar = Calendar.from_ical(events_file.read())
+    print(f'{REPEATS} expansions per year')
+    print(f'{"year":<8}{"original start (ms)":>22}{"rebased start (ms)":>22}')
+    for year in YEARS:
+        current_time = BRISBANE_TZ.localize(datetime(year, 8, 1))
+        rebased = timeit.timeit(lambda: handle_calendar(calendar, current_time=current_time),
+                                number=REPEATS)
+        unrebased_str = '-'
+        if year <= MAX_UNREBASED_YEAR:
+            with patch('uqcsbot.scripts.events.get_rebased_start',
+                       new=lambda recurrence, dtstart, after: dtstart):
+                unrebased = timeit.timeit(
+                    lambda: handle_calendar(calendar, current_time=current_time),
+                    number=REPEATS)
+            unrebased_str = f'{unrebased * 1000 / REPEATS:.2f}'
+        print(f'{year:<8}{unrebased_str:>22}{rebased * 1000 / REPEATS:>22.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Benchmarks parsing the HTML fixtures in test/ with a full html.parser parse
+(how the scrapers used to work) against the shared scraping utility.
+
+Run from the repository root with `python -m test.bench_scraping`.
+"""
+import timeit
+from bs4 import BeautifulSoup
+from uqcsbot.utils.scraping_utils import get_soup, HTML_PARSER
+from uqcsbot.utils.itee_seminar_utils import (SEMINAR_SUMMARY_STRAINER,
+                                              SEMINAR_DETAILS_STRAINER)
+from uqcsbot.scripts.parking import PARKING_TABLE_STRAINER
+from uqcsbot.scripts.umart import SEARCH_RESULT_STRAINER
+
+REPEATS = 50
+FIXTURES = [('test/ITEE_Upcoming_Seminars.html', SEMINAR_SUMMARY_STRAINER),
+            ('test/ITEE_Seminar1.html', SEMINAR_DETAILS_STRAINER),
+            ('test/ITEE_Seminar2.html', SEMINAR_DETAILS_STRAINER),
+            ('test/parking.html', PARKING_TABLE_STRAINER),
+            ('test/umart_products_list_search.html', SEARCH_RESULT_STRAINER)]
+
+
+def main():
+    print(f'Parser: {HTML_PARSER}, {REPEATS} parses per fixture')
+    print(f'{"fixture":<42}{"html.parser (ms)":>18}{"get_soup (ms)":>16}{"speedup":>10}')
+    for path, strainer in FIXTURES:
+        with open(path, 'rb') as html_file:
+            page = html_file.read()
+        full = timeit.timeit(lambda: BeautifulSoup(page, 'html.parser'), number=REPEATS)
+        strained = timeit.timeit(lambda: get_soup(page, parse_only=strainer), number=REPEATS)
+        print(f'{path:<42}{full * 1000 / REPEATS:>18.2f}{strained * 1000 / REPEATS:>16.2f}'
+              f'{full / strained:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmarks fetching the BOM products needed for the daily Brisbane weather post
+from a local FTP stand-in serving the test/bom_*.xml fixtures, with a simulated
+round trip time. Compares opening a connection per product in turn (how the
+products used to be fetched) against fetching them as one batch over one session.
+
+Run from the repository root with `python -m test.bench_weather`.
+"""
+import os
+import socket
+import socketserver
+import threading
+import time
+import timeit
+from unittest.mock import patch
+from urllib.request import urlopen
+import xml.etree.ElementTree as ET
+from uqcsbot.scripts.weather import fetch_products
+
+REPEATS = 10
+ROUND_TRIP_TIMES = [0, 0.01, 0.03]
+# The state forecast and Brisbane's detailed forecast.
+PRODUCTS = ['IDQ10605', 'IDQ11295']
+FIXTURE_PATH = 'test/bom_{product}.xml'
+
+
+class FTPHandler(socketserver.StreamRequestHandler):
+    """
+    Handles an FTP session, supporting just enough of the protocol (passive,
+    binary retrievals of files from the fixture directory) for ftplib.
+    """
+
+    def setup(self):
+        super().setup()
+        # otherwise replies wait on delayed acknowledgements, unlike a real server
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def reply(self, line: str):
+        time.sleep(self.server.round_trip_time)  # type: ignore
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        data_listener = None
+        self.reply('220 Ready')
+        for line in self.rfile:
+            command, _, argument = line.decode().strip().partition(' ')
+            command = command.upper()
+            if command == 'USER':
+                self.reply('331 Password required')
+            elif command == 'PASS':
+                self.reply('230 Logged in')
+            elif command in ('CWD', 'TYPE', 'NOOP'):
+                self.reply('250 OK' if command == 'CWD' else '200 OK')
+            elif command in ('PASV', 'EPSV'):
+                data_listener = socket.socket()
+                data_listener.bind(('127.0.0.1', 0))
+                data_listener.listen()
+                port = data_listener.getsockname()[1]
+                if command == 'EPSV':
+                    self.reply(f'229 Entering Extended Passive Mode (|||{port}|)')
+                else:
+                    self.reply(f'227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 255})')
+            elif command == 'RETR':
+                product = os.path.splitext(os.path.basename(argument))[0]
+                path = FIXTURE_PATH.format(product=product)
+                if data_listener is None or not os.path.exists(path):
+                    self.reply('550 File not found')
+                    continue
+                self.reply('150 Opening data connection')
+                data_connection, _ = data_listener.accept()
+                with data_connection, open(path, 'rb') as fixture:
+                    data_connection.sendall(fixture.read())
+                data_listener.close()
+                data_listener = None
+                self.reply('226 Transfer complete')
+            elif command == 'QUIT':
+                self.reply('221 Goodbye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class LocalFTPServer(socketserver.ThreadingTCPServer):
+    """
+    A local FTP server serving the BOM fixtures, which can be used as a
+    context manager to run it in the background.
+    """
+    daemon_threads = True
+
+    def __init__(self, round_trip_time: float = 0):
+        super().__init__(('127.0.0.1', 0), FTPHandler)
+        self.round_trip_time = round_trip_time
+        self.port = self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def fetch_each_product(port: int):
+    """
+    Fetches each product over its own connection in turn, as they used to be.
+    """
+    for product in PRODUCTS:
+        data = urlopen(f'ftp://127.0.0.1:{port}/anon/gen/fwo/{product}.xml')
+        ET.fromstring(data.read())
+
+
+def main():
+    print(f'{len(PRODUCTS)} products, {REPEATS} fetches per round trip time')
+    print(f'{"round trip (ms)":<18}{"each product (ms)":>20}{"one batch (ms)":>18}{"speedup":>10}')
+    for round_trip_time in ROUND_TRIP_TIMES:
+        with LocalFTPServer(round_trip_time) as server, \
+                patch('uqcsbot.scripts.weather.BOM_FTP_HOST', '127.0.0.1'), \
+                patch('uqcsbot.scripts.weather.BOM_FTP_PORT', server.port):
+            each = timeit.timeit(lambda: fetch_each_product(server.port), number=REPEATS)
+            batch = timeit.timeit(lambda: fetch_products(PRODUCTS), number=REPEATS)
+        print(f'{round_trip_time * 1000:<18.0f}{each * 1000 / REPEATS:>20.2f}'
+              f'{batch * 1000 / REPEATS:>18.2f}{each / batch:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
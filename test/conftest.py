@@ -59,7 +59,7 @@ class MockUQCSBot(UQCSBot):
         self.test_users = deepcopy(TEST_USERS)
         self.test_channels = deepcopy(TEST_CHANNELS)
         # Mock DB
-        self.db_engine = create_engine("sqlite:///:memory", echo=True)
+        self.db_engine = create_engine("sqlite://", echo=True)
         Base.metadata.create_all(self.db_engine)
         self._mock_session_maker = sessionmaker(bind=self.db_engine)
 
@@ -310,6 +310,23 @@ class MockUQCSBot(UQCSBot):
         return {'ok': True, 'channel': channel.id, 'ts': message['ts'],
                 'message': message}
 
+    def mocked_chat_update(self, **kwargs):
+        '''
+        Mocks chat.update api call.
+        '''
+        message = self.get_channel_message(channel=kwargs.get('channel'),
+                                           timestamp=kwargs.get('ts'))
+        if message is None:
+            return {'ok': False, 'error': 'test'}
+
+        # Strip the kwargs down to only ones which are valid for this api call.
+        # Note: If there is an additional argument you need supported, add it
+        # here as well.
+        message.update({k: v for k, v in kwargs.items() if k in ('text', 'attachments')})
+
+        return {'ok': True, 'channel': message['channel'], 'ts': message['ts'],
+                'text': message.get('text')}
+
     def create_db_session(self) -> Session:
         return self._mock_session_maker()
 
@@ -1,7 +1,10 @@
 import json
+from datetime import datetime
 from typing import List
+from unittest.mock import patch
 from uqcsbot.utils.command_utils import UsageSyntaxException
-from uqcsbot.scripts.advent import (Member, SortMode, format_advent_leaderboard,
+from uqcsbot.scripts import advent
+from uqcsbot.scripts.advent import (Leaderboard, Member, SortMode, format_advent_leaderboard,
                                     format_day_leaderboard, format_full_leaderboard,
                                     format_global_leaderboard, parse_arguments)
 
@@ -128,3 +131,110 @@ def test_advent_member_sort():
     members.sort(key=Member.sort_key(SortMode.LOCAL))
 
     assert [member.name for member in members] == sorted_names
+
+def test_advent_leaderboard_views():
+    """
+    Tests that each precomputed view of a leaderboard matches the leaderboard
+    formatted from freshly parsed members.
+    """
+    leaderboard = Leaderboard(ADVENT_TEST_DATA, 2020)
+
+    assert leaderboard.format(0, False, SortMode.PART_2) \
+        == format_advent_leaderboard(_parse_members(), False, False, SortMode.LOCAL)
+    assert leaderboard.format(0, True, SortMode.PART_2) \
+        == format_advent_leaderboard(_parse_members(), False, True, SortMode.GLOBAL)
+    for day in (1, 16, 17):
+        for sort in (SortMode.PART_1, SortMode.PART_2, SortMode.DELTA):
+            assert leaderboard.format(day, False, sort) \
+                == format_advent_leaderboard(_parse_members(day), True, False, sort)
+
+def test_advent_leaderboard_cache():
+    """
+    Tests that a leaderboard is fetched at most once per refresh interval,
+    whether it's viewed or refreshed in the background, that the last good
+    leaderboard is kept if fetching it again fails, and that leaderboards
+    which can't be fetched are forgotten once they're due to be fetched again.
+    """
+    advent._leaderboards.clear()
+    advent._last_viewed.clear()
+    with patch("uqcsbot.scripts.advent.get_leaderboard",
+               return_value=ADVENT_TEST_DATA) as mocked_get:
+        leaderboard = advent.get_cached_leaderboard(2020, 989288)
+        assert advent.get_cached_leaderboard(2020, 989288) is leaderboard
+        advent.refresh_leaderboards.func()
+        assert mocked_get.call_count == 1
+
+        # the leaderboard is due to be refreshed, but can't be fetched
+        cached = advent._leaderboards[(2020, 989288)]
+        advent._leaderboards[(2020, 989288)] = cached._replace(
+            fetched=cached.fetched - advent.LEADERBOARD_REFRESH_INTERVAL)
+        mocked_get.side_effect = ValueError
+        advent.refresh_leaderboards.func()
+        assert mocked_get.call_count == 2
+        assert advent.get_cached_leaderboard(2020, 989288) is leaderboard
+        assert advent.get_cached_leaderboard(2019, 989288) is None
+        assert advent.get_cached_leaderboard(2019, 989288) is None
+        assert mocked_get.call_count == 3
+
+        # the leaderboard which couldn't be fetched isn't kept refreshed, and isn't
+        # fetched again when viewed until the interval has passed
+        assert (2019, 989288) not in advent._last_viewed
+        advent.refresh_leaderboards.func()
+        assert advent.get_cached_leaderboard(2019, 989288) is None
+        assert mocked_get.call_count == 3
+
+        # once it's due to be fetched again, it's forgotten, unless it's being fetched
+        cached = advent._leaderboards[(2019, 989288)]
+        advent._leaderboards[(2019, 989288)] = cached._replace(
+            fetched=cached.fetched - advent.LEADERBOARD_REFRESH_INTERVAL)
+        with advent._leaderboard_locks[(2019, 989288)]:
+            advent.refresh_leaderboards.func()
+        assert (2019, 989288) in advent._leaderboards
+        advent.refresh_leaderboards.func()
+        assert mocked_get.call_count == 3
+        assert (2019, 989288) not in advent._leaderboards
+        assert (2019, 989288) not in advent._leaderboard_locks
+    advent._leaderboards.clear()
+    advent._last_viewed.clear()
+
+
+def test_advent_new_stars(uqcsbot):
+    """
+    Tests that stars gained between refreshes of the UQCS leaderboard are
+    announced, in the order they were gained.
+    """
+    from copy import deepcopy
+    from test.conftest import TEST_CHANNEL_ID
+    new_data = deepcopy(ADVENT_TEST_DATA)
+    strayy, = (m for m in new_data["members"].values() if m["name"] == "Strayy")
+    day_4 = strayy["completion_day_level"]["4"]
+    day_4["2"] = {"get_star_ts": str(int(day_4["1"]["get_star_ts"]) + 12 * 60 + 34)}
+    strayy["completion_day_level"]["25"] = {"1": {"get_star_ts": "1608872400"}}
+    new_data["members"]["1"] = {"name": "New Member", "local_score": 0, "stars": 1,
+                                "global_score": 0,
+                                "completion_day_level": {"1": {"1": {"get_star_ts": "1606802400"}}}}
+
+    advent._leaderboards.clear()
+    advent._last_viewed.clear()
+    advent._announced_leaderboard = None
+    with patch("uqcsbot.scripts.advent.get_leaderboard",
+               side_effect=[ADVENT_TEST_DATA, new_data, new_data]), \
+            patch("uqcsbot.scripts.advent.AOC_CHANNEL", TEST_CHANNEL_ID), \
+            patch("uqcsbot.scripts.advent.bot", uqcsbot), \
+            patch("uqcsbot.scripts.advent.get_announced_leaderboard_key",
+                  return_value=(2020, advent.UQCS_LEADERBOARD)):
+        for _ in range(3):
+            advent.refresh_leaderboards.func()
+            cached = advent._leaderboards[(2020, advent.UQCS_LEADERBOARD)]
+            advent._leaderboards[(2020, advent.UQCS_LEADERBOARD)] = cached._replace(
+                fetched=cached.fetched - advent.LEADERBOARD_REFRESH_INTERVAL)
+
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert len(messages) == 1
+    day_4_start = int(datetime(2020, 12, 4, tzinfo=advent.EST_TIMEZONE).timestamp())
+    day_4_time = advent.format_seconds(int(day_4["1"]["get_star_ts"]) + 12 * 60 + 34 - day_4_start)
+    assert messages[0]["text"] == (f"Strayy got star 2 on day 4 in {day_4_time}\n"
+                                   "Strayy got star 1 on day 25 in 0:00:00")
+    advent._leaderboards.clear()
+    advent._last_viewed.clear()
+    advent._announced_leaderboard = None
@@ -0,0 +1,90 @@
+"""
+Tests for archive.py
+"""
+import pytest
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID, TEST_GROUP_ID, TEST_USER_ID
+from test.helpers import generate_event_object, MESSAGE_TYPE_MESSAGE
+
+
+@pytest.fixture(autouse=True)
+def clear_archived_channels(uqcsbot: MockUQCSBot):
+    """
+    Forgets the archived channels, which are otherwise kept in memory
+    between tests (and so between mocked databases).
+    """
+    from uqcsbot.utils import archive_utils
+    archive_utils._archived_channel_ids = None
+    yield
+    archive_utils._archived_channel_ids = None
+
+
+def test_archive_search(uqcsbot: MockUQCSBot):
+    """
+    Tests that only messages from archived channels can be searched, and that
+    edits and deletions are reflected in the archive.
+    """
+    uqcsbot.post_message(TEST_GROUP_ID, 'Pizza in the group', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, 'Pizza before archiving', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!search pizza', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!archive on', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, 'Free pizza at the meetup', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, 'The pizza is free!', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, 'Free coffee', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!search FREE pizza', user=TEST_USER_ID)
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert messages[2]['text'] == ('Messages in this channel are not being archived.'
+                                   ' Use `!archive on` to start archiving them.')
+    assert messages[4]['text'] == 'Messages in this channel are being archived for `!search`.'
+    results = messages[-1]['text'].split('\n')
+    assert len(results) == 2
+    assert results[0].endswith(f'<@{TEST_USER_ID}>: The pizza is free!')
+    assert results[1].endswith(f'<@{TEST_USER_ID}>: Free pizza at the meetup')
+
+    edited_message, deleted_message = messages[5], messages[7]
+    uqcsbot._run_handlers(generate_event_object(
+        MESSAGE_TYPE_MESSAGE, subtype='message_changed', channel=TEST_CHANNEL_ID,
+        message={**edited_message, 'text': 'Free pizza is gone'}))
+    uqcsbot._run_handlers(generate_event_object(
+        MESSAGE_TYPE_MESSAGE, subtype='message_deleted', channel=TEST_CHANNEL_ID,
+        deleted_ts=deleted_message['ts']))
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!search gone', user=TEST_USER_ID)
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!search coffee', user=TEST_USER_ID)
+    messages = uqcsbot.test_messages[TEST_CHANNEL_ID]
+    assert messages[-3]['text'].endswith(f'<@{TEST_USER_ID}>: Free pizza is gone')
+    assert messages[-1]['text'] == 'No archived messages found.'
+
+    # Only admins can stop archiving, which removes the archived messages
+    from uqcsbot.utils.archive_utils import search_messages
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!archive off', user=TEST_USER_ID)
+    assert uqcsbot.test_messages[TEST_CHANNEL_ID][-1]['text'] == \
+        ('Only workspace admins can stop archiving a channel,'
+         ' as doing so removes its archived messages.')
+    assert search_messages('pizza', [TEST_CHANNEL_ID]) != []
+    uqcsbot.users._on_user_change({'user': {**uqcsbot.test_users[TEST_USER_ID],
+                                            'is_admin': True}})
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!archive off', user=TEST_USER_ID)
+    assert search_messages('pizza', [TEST_CHANNEL_ID, TEST_GROUP_ID]) == []
+
+
+def test_archived_message_lookup(uqcsbot: MockUQCSBot):
+    """
+    Tests that archived messages can be looked up by channel and time, in the
+    same form as the Slack API would return them.
+    """
+    from uqcsbot.utils.archive_utils import archive_message, get_archived_message
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!archive on', user=TEST_USER_ID)
+    parent_message = uqcsbot.test_messages[TEST_CHANNEL_ID][-1]
+    reply = generate_event_object(MESSAGE_TYPE_MESSAGE, channel=TEST_CHANNEL_ID,
+                                  user=TEST_USER_ID, text='A reply', ts='9999999999.000000',
+                                  thread_ts=parent_message['ts'])
+    uqcsbot._run_handlers(reply)
+    attachments = [{'fallback': 'An attachment', 'text': 'An attachment'}]
+    archive_message(TEST_CHANNEL_ID, {**parent_message, 'attachments': attachments})
+
+    archived_parent = get_archived_message(TEST_CHANNEL_ID, parent_message['ts'])
+    assert archived_parent['text'] == parent_message['text']
+    assert archived_parent['attachments'] == attachments
+    archived_reply = get_archived_message(TEST_CHANNEL_ID, reply['ts'])
+    assert archived_reply['user'] == TEST_USER_ID
+    assert archived_reply['thread_ts'] == parent_message['ts']
+    assert get_archived_message(TEST_GROUP_ID, reply['ts']) is None
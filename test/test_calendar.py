@@ -0,0 +1,48 @@
+"""
+Tests for calendar.py
+"""
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID, TEST_USER_ID
+from unittest.mock import Mock, patch
+from icalendar import Calendar
+
+ASSESSMENT = {'CSSE1001': [('CSSE1001', 'Assignment 1', '1 Mar 19', '20%')],
+              'CSSE2310': [('CSSE2310', 'Final Exam', '8 Jun 19', '60%')]}
+
+
+def mocked_get_course_assessment(course_names, cutoff=None, assessment_url=None):
+    """
+    Returns fixed assessment for the given courses.
+    """
+    from datetime import datetime
+    from uqcsbot.utils.uq_course_utils import AssessmentItem
+    return [AssessmentItem(*item, start=datetime(2019, 3, 1), end=datetime(2019, 3, 1),
+                           parse_error=None)
+            for course_name in course_names for item in ASSESSMENT[course_name]]
+
+
+@patch("uqcsbot.scripts.calendar.get_course_assessment",
+       side_effect=mocked_get_course_assessment)
+def test_calendar_is_cached(mocked_get_assessment, uqcsbot: MockUQCSBot):
+    """
+    Tests that a calendar is compiled once per set of courses, regardless of
+    the order or case they're given in, and that its event UIDs are stable.
+    """
+    from uqcsbot.scripts import calendar
+    calendar._calendar_cache.clear()
+    mocked_upload = Mock(return_value={'ok': True})
+    with patch.object(MockUQCSBot, 'mocked_files_upload', mocked_upload, create=True):
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!calendar CSSE1001 csse2310', user=TEST_USER_ID)
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!calendar CSSE2310 CSSE1001', user=TEST_USER_ID)
+    assert mocked_get_assessment.call_count == 1
+    assert mocked_upload.call_count == 2
+    first_file, second_file = [call[1]['files']['file'] for call in mocked_upload.call_args_list]
+    assert first_file is second_file
+
+    events = Calendar.from_ical(first_file).walk('vevent')
+    assert [str(event['summary']) for event in events] == ['CSSE1001 (20%): Assignment 1',
+                                                           'CSSE2310 (60%): Final Exam']
+    recompiled_events = Calendar.from_ical(
+        calendar.get_calendar(mocked_get_course_assessment(['CSSE1001']))).walk('vevent')
+    assert recompiled_events[0]['uid'] == events[0]['uid']
+    assert events[0]['uid'] != events[1]['uid']
+    calendar._calendar_cache.clear()
@@ -1,3 +1,6 @@
+import json
+import time
+from unittest.mock import Mock, patch
 from test.conftest import MockUQCSBot, TEST_CHANNEL_ID
 
 
@@ -31,3 +34,99 @@ def test_categories(uqcsbot: MockUQCSBot):
     messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
 
     assert len(messages) == 4
+
+
+def make_crates_dump(path: str):
+    """
+    Writes a tiny crates.io database dump to the given path.
+    """
+    import io
+    import tarfile
+    tables = {
+        'crates.csv': 'id,name,description,homepage,repository,documentation,readme\n'
+                      '1,regex,An implementation of regular expressions for Rust,,'
+                      'https://github.com/rust-lang/regex,,"A very\nlong readme"\n'
+                      '2,regex-syntax,A regular expression parser.,,,,\n'
+                      '3,rand,Random number generators,https://rust-random.github.io,,,\n',
+        'crate_downloads.csv': 'crate_id,downloads\n1,300\n2,200\n3,400\n',
+        'categories.csv': 'id,category,slug,description,crates_cnt,path\n'
+                          '1,Algorithms,algorithms,Rust implementations of algorithms.,2,x\n'
+                          '2,Text processing,text-processing,Deal with text.,1,y\n',
+        'crates_categories.csv': 'crate_id,category_id\n1,2\n1,1\n3,1\n',
+        'users.csv': 'id,gh_login,name,gh_avatar,gh_id\n189,BurntSushi,Andrew,,1\n',
+        'crate_owners.csv': 'crate_id,owner_id,owner_kind\n1,189,0\n2,189,0\n3,1,1\n',
+    }
+    with tarfile.open(path, 'w:gz') as dump:
+        for file_name, contents in tables.items():
+            data = contents.encode()
+            member = tarfile.TarInfo(f'2026-10-19-020000/data/{file_name}')
+            member.size = len(data)
+            dump.addfile(member, io.BytesIO(data))
+
+
+def test_crates_mirror(uqcsbot: MockUQCSBot, tmp_path):
+    """
+    Tests that !crates is answered from the local mirror without calling crates.io
+    """
+    import tarfile
+    from uqcsbot.utils import crates_mirror
+    dump_path, mirror_path = str(tmp_path / 'dump.tar.gz'), str(tmp_path / 'crates.db')
+    make_crates_dump(dump_path)
+    with tarfile.open(dump_path, 'r|gz') as dump:
+        crates_mirror.build_mirror(dump, mirror_path, {'etag': '"1"'})
+    assert crates_mirror.get_meta(mirror_path)['etag'] == '"1"'
+
+    with patch('uqcsbot.utils.crates_mirror.CRATES_MIRROR_PATH', mirror_path), \
+            patch('uqcsbot.scripts.crates.requests.get') as mocked_get, \
+            patch.object(uqcsbot, 'post_message', wraps=uqcsbot.post_message) as mocked_post:
+        assert crates_mirror.get_crate('Regex')['downloads'] == 300
+        assert crates_mirror.search_crates('reg')[1] == 2
+        assert [crate['name'] for crate in crates_mirror.search_crates('random')[0]] == ['rand']
+        assert [crate['name'] for crate in crates_mirror.search_crates(
+            '', category='algorithms', sort='alpha')[0]] == ['rand', 'regex']
+        assert crates_mirror.search_crates('', user='burntsushi')[1] == 2
+        assert crates_mirror.search_crates('', user='nobody') is None
+
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!crates regex')
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!crates search regular -u BurntSushi')
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!crates categories -s crates')
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!crates categories algorithms')
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!crates user burntsushi')
+        assert not mocked_get.called
+
+    exact, search, categories, category, user = [call[1]['blocks'] for call
+                                                 in mocked_post.call_args_list[1::2]]
+    assert exact[0]['text']['text'].startswith('*<https://github.com/rust-lang/regex|regex>*')
+    assert search[0]['text']['text'] == '*Showing 2 of 2 results*'
+    assert categories[1]['text']['text'] == '```Algorithms\nText processing```'
+    assert category[2]['elements'][0]['text'] == 'Crate Count: 2'
+    assert user[0]['text']['text'].startswith('*BurntSushi:*')
+
+
+def test_crates_search_pages(uqcsbot: MockUQCSBot):
+    """
+    Tests that the pages of a crates.io search after the first are fetched
+    together, are merged in order, and that every request is rate limited
+    """
+    from uqcsbot.scripts import crates
+
+    def mocked_get(url, params, headers):
+        assert headers['User-Agent'] == crates.USER_AGENT
+        start = (params['page'] - 1) * 10
+        crates_page = [{'name': f'crate{i}', 'downloads': 100 - i, 'description': '',
+                        'homepage': None, 'repository': None, 'documentation': None}
+                       for i in range(start, min(start + 10, 25))]
+        return Mock(status_code=200,
+                    content=json.dumps({'crates': crates_page, 'meta': {'total': 25}}))
+
+    with patch('uqcsbot.scripts.crates.requests.get', side_effect=mocked_get) as mocked_request, \
+            patch.object(crates._rate_limiter, 'interval', 0.05), \
+            patch.object(uqcsbot, 'post_message', wraps=uqcsbot.post_message) as mocked_post:
+        start = time.monotonic()
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!crates search crate -l 15')
+        assert time.monotonic() - start >= 0.05
+    assert [call[0][1]['page'] for call in mocked_request.call_args_list] == [1, 2]
+    blocks = mocked_post.call_args_list[-1][1]['blocks']
+    assert blocks[0]['text']['text'] == '*Showing 15 of 25 results*'
+    assert [block['text']['text'].split('|')[1].split('>')[0] for block in blocks[2::3]] \
+        == [f'crate{i}' for i in range(15)]
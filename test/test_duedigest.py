@@ -0,0 +1,76 @@
+"""
+Tests for duedigest.py
+"""
+from datetime import datetime, timedelta
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID, TEST_DIRECT_ID, TEST_USER_ID
+from unittest.mock import patch
+
+PROFILE_IDS = {'CSSE1001': '100001', 'CSSE2310': '100002'}
+
+
+def mocked_get_course_profile_id(course_name):
+    """
+    Returns a fixed profile id for known courses.
+    """
+    from uqcsbot.utils.uq_course_utils import CourseNotFoundException
+    if course_name.upper() not in PROFILE_IDS:
+        raise CourseNotFoundException(course_name)
+    return PROFILE_IDS[course_name.upper()]
+
+
+def mocked_get_single_course_assessment(course_name, cutoff=None):
+    """
+    Returns assessment for the given course due 3 days, 10 days and 30 days from
+    now, along with an item without a due date.
+    """
+    from uqcsbot.utils.uq_course_utils import AssessmentItem
+    today = datetime.combine(datetime.today(), datetime.min.time())
+    assessment = [AssessmentItem(course_name, f'Assignment {i}', f'In {days} days', '10%',
+                                 today + timedelta(days=days), today + timedelta(days=days), None)
+                  for i, days in enumerate([10, 3, 30], start=1)]
+    assessment.append(AssessmentItem(course_name, 'Tutorials', 'Throughout Semester', '10%',
+                                     None, None, 'Could not parse date'))
+    return course_name, PROFILE_IDS[course_name], assessment
+
+
+@patch("uqcsbot.scripts.duedigest.get_course_profile_id", new=mocked_get_course_profile_id)
+def test_duedigest_subscriptions(uqcsbot: MockUQCSBot):
+    """
+    Tests subscribing to and unsubscribing from courses.
+    """
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!duedigest subscribe csse2310 CSSE1001')
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!duedigest subscribe ABCD1234')
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!duedigest unsubscribe CSSE2310')
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!duedigest')
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!duedigest unsubscribe')
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert [message['text'] for message in messages[1::2]] == [
+        'You will be sent the assessment due each week for: *CSSE1001*, *CSSE2310*',
+        "Could not find course 'ABCD1234'.",
+        'You will be sent the assessment due each week for: *CSSE1001*',
+        'You will be sent the assessment due each week for: *CSSE1001*',
+        'You are not subscribed to any courses.']
+
+
+@patch("uqcsbot.scripts.duedigest.get_course_profile_id", new=mocked_get_course_profile_id)
+def test_duedigest_job(uqcsbot: MockUQCSBot):
+    """
+    Tests that the weekly digest fetches each course once, and sends the
+    assessment due in the next 14 days.
+    """
+    from uqcsbot.scripts import duedigest
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!duedigest subscribe CSSE1001 CSSE2310',
+                         user=TEST_USER_ID)
+    with patch("uqcsbot.utils.uq_course_utils.get_single_course_assessment",
+               side_effect=mocked_get_single_course_assessment) as mocked_get_assessment:
+        duedigest.send_assessment_digests.func()
+    assert sorted(call[0][0] for call in mocked_get_assessment.call_args_list) == \
+        ['CSSE1001', 'CSSE2310']
+    messages = uqcsbot.test_messages.get(TEST_DIRECT_ID, [])
+    assert len(messages) == 1
+    assert messages[0]['text'].split('\n') == [
+        '_Assessment due in the next 14 days:_',
+        '>>>*CSSE1001*: `10%` _Assignment 2_ *(In 3 days)*',
+        '*CSSE2310*: `10%` _Assignment 2_ *(In 3 days)*',
+        '*CSSE1001*: `10%` _Assignment 1_ *(In 10 days)*',
+        '*CSSE2310*: `10%` _Assignment 1_ *(In 10 days)*']
@@ -1,15 +1,36 @@
 """
 Tests for the events module.
 """
+import pytest
+import requests
+import time
 from datetime import datetime
 from test.conftest import MockUQCSBot, TEST_CHANNEL_ID
 from pytz import timezone, utc
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 from uqcsbot.utils.itee_seminar_utils import (HttpException, get_seminars)
 
 BRISBANE_TZ = timezone('Australia/Brisbane')
 
 
+@pytest.fixture(autouse=True)
+def clear_event_caches(_uqcsbot: MockUQCSBot):
+    """
+    Clears the event indexes, sync state and seminar details between tests, as each
+    test mocks different sources. Depends on the mocked bot so that the events script
+    is bound to it.
+    """
+    from uqcsbot.scripts import events
+    from uqcsbot.utils import itee_seminar_utils
+    for cache in (events._event_indexes, events._event_snapshots, events._scheduled_reminders,
+                  itee_seminar_utils._seminar_speaker_cache):
+        cache.clear()
+    yield
+    for cache in (events._event_indexes, events._event_snapshots, events._scheduled_reminders,
+                  itee_seminar_utils._seminar_speaker_cache):
+        cache.clear()
+
+
 def mocked_html_summary_get_typical() -> bytes:
     """
     Returns locally stored HTML that represents a typical seminar listing.
@@ -146,6 +167,35 @@ def test_seminars_events_partial_results():
                             '78-430')
 
 
+def mocked_html_details_timeout(url: str) -> bytes:
+    """
+    Provides partial access to seminar details using locally stored content.
+    One endpoint works correctly, another times out.
+    """
+    if url == "https://www.itee.uq.edu.au/introduction-functional-programming":
+        raise requests.Timeout()
+    return mocked_html_details_full(url)
+
+
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
+       new=mocked_html_summary_get_typical)
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_details_page",
+       new=mocked_html_details_timeout)
+def test_seminars_events_timeouts():
+    """
+    This test checks that a seminar details page timing out only leaves that
+    seminar without a speaker, and that the seminar listings page timing out
+    leaves no seminars rather than failing.
+    """
+    from uqcsbot.scripts.events import get_seminar_events
+    summaries = get_seminars()
+    assert [title for title, _, _, _ in summaries] == [
+        'Introduction to functional programming',
+        'Performance Enhancement of Software Defined Cellular 5G &'
+        + ' Internet-of-Things Networks - Furqan Khan']
+    with patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
+               side_effect=requests.Timeout()):
+        assert get_seminar_events() == []
 @patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
        new=mocked_html_summary_get_no_results)
 def test_seminars_events_no_results():
@@ -335,3 +385,205 @@ def test_events_recurring(uqcsbot: MockUQCSBot):
     expected = "*`[Recurring] deadbeef Binary Exploitation Bootcamp`*\n" \
         "*TUE AUG 7 18:30 - 20:00* _(78-346)_"
     assert messages[1].get('attachments')[2].get('blocks')[0].get('text').get('text') == expected
+
+
+def test_calendar_conditional_get():
+    """
+    This test checks that an unchanged calendar is neither transferred nor parsed again.
+    """
+    from uqcsbot.scripts import events
+    body = mocked_events_ics()
+    responses = [Mock(status_code=200, content=body, headers={'ETag': '"v1"'}),
+                 Mock(status_code=304, content=b'', headers={})]
+    events._calendar_responses.clear()
+    events._parsed_calendars.clear()
+    with patch("uqcsbot.scripts.events.requests.get", side_effect=responses) as mocked_get:
+        first_calendar = events.get_calendar("uqcs")
+        assert events.get_calendar("uqcs") is first_calendar
+    assert mocked_get.call_args_list[0][1]['headers'] == {}
+    assert mocked_get.call_args_list[1][1]['headers'] == {'If-None-Match': '"v1"'}
+    events._calendar_responses.clear()
+    events._parsed_calendars.clear()
+
+
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
+       new=mocked_html_summary_get_no_results)
+@patch("uqcsbot.scripts.events.get_current_time", new=mocked_get_august_time)
+def test_events_index_is_reused(uqcsbot: MockUQCSBot):
+    """
+    This test checks that consecutive '!events' calls are answered from the event index,
+    and that 'next N' filters return the soonest events in order.
+    """
+    with patch("uqcsbot.scripts.events.get_calendar_file",
+               side_effect=mocked_events_ics) as mocked_calendar_file:
+        uqcsbot.post_message(TEST_CHANNEL_ID, "!events 3")
+        uqcsbot.post_message(TEST_CHANNEL_ID, "!events full")
+    assert mocked_calendar_file.call_count == 2  # Once for each of UQCS and external
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    next_events = [attachment['blocks'][0]['text']['text']
+                   for attachment in messages[1]['attachments']]
+    all_events = [attachment['blocks'][0]['text']['text']
+                  for attachment in messages[3]['attachments']]
+    assert next_events == all_events[:3]
+    assert next_events[0] == "*`CodeNetwork Hackathon`*\n*FRI AUG 2 10:00 - TUE AUG 6 9:59* " \
+        "_(River City Labs)_"
+
+
+def mocked_weekly_events_ics(source: str = "uqcs") -> bytes:
+    """
+    Returns a locally stored .ics file containing a weekly event which has
+    been running since 2000 and has no end.
+    """
+    with open("test/test_events_weekly.ics", "rb") as events_file:
+        return events_file.read()
+
+
+@patch("uqcsbot.scripts.events.get_calendar_file", new=mocked_weekly_events_ics)
+@patch("uqcsbot.scripts.events.get_current_time", new=mocked_get_no_time)
+def test_events_long_running_recurring(uqcsbot: MockUQCSBot):
+    """
+    This test simulates the user invoking '!events uqcs full' long after a weekly event
+    with no end began, skipping any excluded dates.
+    """
+    uqcsbot.post_message(TEST_CHANNEL_ID, "!events uqcs full")
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert len(messages) == 2
+    assert [attachment['blocks'][0]['text']['text']
+            for attachment in messages[1]['attachments']] == [
+        "*`[Recurring] Weekly Hack Night`*\n*TUE AUG 4 18:30 - 20:00* _(78-217)_",
+        "*`[Recurring] Weekly Hack Night`*\n*TUE AUG 18 18:30 - 20:00* _(78-217)_",
+        "*`[Recurring] Weekly Hack Night`*\n*TUE AUG 25 18:30 - 20:00* _(78-217)_"]
+
+
+def mocked_slow_html_summary_get() -> bytes:
+    """
+    Returns the typical seminar summary page, but only after the events timeout.
+    """
+    time.sleep(1.5)
+    return mocked_html_summary_get_typical()
+
+
+@patch("uqcsbot.scripts.events.get_calendar_file", new=mocked_events_ics)
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
+       new=mocked_slow_html_summary_get)
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_details_page",
+       new=mocked_html_details_full)
+@patch("uqcsbot.scripts.events.get_current_time", new=mocked_get_august_time)
+@patch("uqcsbot.scripts.events.SOURCE_TIMEOUT", new=1)
+def test_events_slow_source(uqcsbot: MockUQCSBot):
+    """
+    This test simulates the user invoking '!events' when the ITEE website is slow to respond,
+    which should be left out of the reply with a note.
+    """
+    uqcsbot.post_message(TEST_CHANNEL_ID, "!events")
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert len(messages) == 2
+    assert messages[1].get('text') == "_Events in the next *2 weeks*:_\n_Note: ITEE events" \
+        " couldn't be loaded in time, so they aren't included. Try again shortly._"
+    assert all(attachment.get('color') != "#51237A"
+               for attachment in messages[1].get('attachments'))
+    # The slow source should still be indexed once it loads, ready for the next call.
+    from uqcsbot.scripts import events
+    for _ in range(50):
+        if "itee" in events._event_indexes:
+            break
+        time.sleep(0.1)
+    assert len(events._event_indexes["itee"].events) == 2
+
+
+def test_events_current_index_months():
+    """
+    Tests that every event in a current index (e.g. ITEE seminars) is upcoming,
+    but that only the events starting in a month are listed for that month.
+    """
+    from uqcsbot.scripts.events import Event, EventIndex
+    current_time = mocked_get_august_time()
+    seminars = [Event.from_seminar((title, f'https://example.com/{title}',
+                                    BRISBANE_TZ.localize(datetime(2019, month, 1, 12)), 'Room'))
+                for title, month in [('July', 7), ('October', 10), ('December', 12)]]
+    index = EventIndex(seminars, current_time, is_current=True)
+    assert list(index.between(current_time)) == seminars
+    assert list(index.in_month(current_time, 12)) == seminars[2:]
+    assert list(index.in_month(current_time, 10)) == seminars[1:2]
+    assert list(index.in_month(current_time, 7)) == seminars[:1]
+    assert list(index.in_month(current_time, 11)) == []
+
+
+@patch("uqcsbot.scripts.events.SOURCE_TIMEOUT", new=0.1)
+def test_events_index_builds_are_coalesced(uqcsbot: MockUQCSBot):
+    """
+    While a source is slow to load, repeated requests for it should wait on the
+    build already in progress rather than starting another, so a hung source
+    can only ever occupy one worker.
+    """
+    from threading import Event
+    from uqcsbot.scripts import events
+    release = Event()
+
+    def mocked_build_event_index(source, current_time):
+        release.wait(5)
+        return events.EventIndex([], current_time, is_current=True)
+
+    with patch("uqcsbot.scripts.events.build_event_index",
+               side_effect=mocked_build_event_index) as mocked_build:
+        for _ in range(5):
+            assert events.get_event_indexes(["itee"]) == ([], ["itee"])
+        build = events._event_index_builds["itee"]
+        release.set()
+        build.result()
+    assert mocked_build.call_count == 1
+    assert "itee" not in events._event_index_builds
+
+
+NEW_EVENT_ICS = b"""BEGIN:VEVENT
+DTSTART:20190815T080000Z
+DTEND:20190815T100000Z
+UID:new-event@uqcs.org
+SUMMARY:Games Night
+LOCATION:78-217
+END:VEVENT
+END:VCALENDAR"""
+
+
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
+       new=mocked_html_summary_get_no_results)
+@patch("uqcsbot.scripts.events.get_current_time", new=mocked_get_august_time)
+@patch("uqcsbot.scripts.events.EVENTS_CHANNEL", new=TEST_CHANNEL_ID)
+def test_events_sync(uqcsbot: MockUQCSBot):
+    """
+    This test checks that the background sync announces new and moved events, and
+    keeps a reminder scheduled for each upcoming event.
+    """
+    from uqcsbot.scripts import events
+    original_calendar = mocked_events_ics()
+    # Moves the UQCS Hackathon forward a week, and adds a new event.
+    changed_calendar = original_calendar \
+        .replace(b"DTSTART:20190823T080000Z", b"DTSTART:20190830T080000Z") \
+        .replace(b"DTEND:20190825T100000Z", b"DTEND:20190901T100000Z") \
+        .replace(b"END:VCALENDAR", NEW_EVENT_ICS)
+    empty_calendar = b"BEGIN:VCALENDAR\nEND:VCALENDAR"
+
+    def reminder_times():
+        return {job.args[0].summary: job.trigger.run_date
+                for job in uqcsbot._scheduler.get_jobs()
+                if job.id.startswith("event-reminder:uqcs:")}
+
+    for calendar in (original_calendar, changed_calendar):
+        with patch("uqcsbot.scripts.events.get_calendar_file",
+                   new=lambda source: calendar if source == "uqcs" else empty_calendar):
+            events.refresh_event_indexes.func()
+        if calendar is original_calendar:
+            # Nothing is announced on the first sync.
+            assert uqcsbot.test_messages.get(TEST_CHANNEL_ID, []) == []
+            assert reminder_times()["UQCS Hackathon"] == datetime(2019, 8, 23, 7, tzinfo=utc)
+
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert [message['text'] for message in messages] == [
+        "_New event added:_", "_Event moved from *FRI AUG 23 18:00 - SUN AUG 25 20:00*:_"]
+    assert messages[0]['attachments'][0]['blocks'][0]['text']['text'].startswith(
+        "*`Games Night`*")
+    assert reminder_times()["UQCS Hackathon"] == datetime(2019, 8, 30, 7, tzinfo=utc)
+    assert reminder_times()["Games Night"] == datetime(2019, 8, 15, 7, tzinfo=utc)
+    for job in uqcsbot._scheduler.get_jobs():
+        if job.id.startswith("event-reminder:"):
+            job.remove()
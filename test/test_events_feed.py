@@ -0,0 +1,58 @@
+"""
+Tests for events_feed.py
+"""
+import json
+from datetime import datetime
+from test.conftest import MockUQCSBot
+from test.test_events import (mocked_events_ics, mocked_get_august_time,
+                              mocked_html_summary_get_typical, mocked_html_details_full)
+from unittest.mock import patch
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+
+@patch("uqcsbot.scripts.events.get_calendar_file", new=mocked_events_ics)
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_summary_page",
+       new=mocked_html_summary_get_typical)
+@patch("uqcsbot.utils.itee_seminar_utils.get_seminar_details_page",
+       new=mocked_html_details_full)
+@patch("uqcsbot.scripts.events.get_current_time", new=mocked_get_august_time)
+def test_events_feed(uqcsbot: MockUQCSBot):
+    """
+    Tests that the merged events are served as iCalendar and JSON, and that the
+    feed is only regenerated when the events change.
+    """
+    from uqcsbot.scripts import events, events_feed
+    events._event_indexes.clear()
+    server = events_feed.create_events_feed_server('127.0.0.1', 0)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        with urlopen(f'{url}/events.ics') as response:
+            ical = response.read()
+            etag = response.headers['ETag']
+        assert ical.startswith(b'BEGIN:VCALENDAR')
+        assert b'SUMMARY:UQCS Hackathon' in ical
+        assert b'SUMMARY:[ITEE Seminar] Introduction to functional programming' in ical
+
+        with urlopen(f'{url}/events.json') as response:
+            feed_events = json.loads(response.read())
+        assert {'UQCS', 'external', 'ITEE'} == {event['source'] for event in feed_events}
+        # %z only accepts offsets without a colon before Python 3.7
+        starts = [datetime.strptime(event['start'][:-3] + event['start'][-2:],
+                                    '%Y-%m-%dT%H:%M:%S%z') for event in feed_events]
+        assert starts == sorted(starts)
+        assert len(feed_events) == ical.count(b'BEGIN:VEVENT')
+
+        # The sources are rebuilt, but are unchanged, so the feed isn't regenerated.
+        feed = events_feed.get_events_feed()
+        events._event_indexes.clear()
+        assert events_feed.get_events_feed() is feed
+        try:
+            urlopen(Request(f'{url}/events.ics', headers={'If-None-Match': etag}))
+            assert False
+        except HTTPError as e:
+            assert e.code == 304
+    finally:
+        server.shutdown()
+        server.server_close()
+        events._event_indexes.clear()
@@ -0,0 +1,61 @@
+"""
+Tests for history.py
+"""
+from datetime import datetime
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID, TEST_GROUP_ID, TEST_USER_ID
+from test.helpers import (generate_event_object, MESSAGE_TYPE_PIN_ADDED,
+                          MESSAGE_TYPE_PIN_REMOVED)
+from unittest.mock import Mock, patch
+from pytz import timezone
+
+BRISBANE_TIMEZONE = timezone('Australia/Brisbane')
+
+
+def get_pin(years_ago: int, text: str, days_ago: int = 0) -> dict:
+    """
+    Returns a pinned message item posted the given number of years (and
+    days) before now. Years should be a multiple of 4 in case today is the
+    29th of February.
+    """
+    now = datetime.now(BRISBANE_TIMEZONE)
+    posted = now.replace(year=now.year - years_ago)
+    timestamp = posted.timestamp() - days_ago * 24 * 60 * 60
+    return {'type': 'message',
+            'message': {'ts': f'{timestamp:.6f}', 'user': TEST_USER_ID, 'text': text}}
+
+
+def test_daily_history_uses_pin_index(uqcsbot: MockUQCSBot):
+    """
+    Tests that the pin index is built once, kept current by pin events, and
+    that the daily job reposts an anniversary pin without calling Slack.
+    """
+    from uqcsbot.scripts import history
+    pins = {TEST_CHANNEL_ID: [get_pin(8, 'Eight years ago'),
+                              get_pin(4, 'Yesterday', days_ago=1)],
+            TEST_GROUP_ID: [get_pin(12, 'Private')]}
+    mocked_pins_list = Mock(side_effect=lambda channel, **kwargs: {'ok': True,
+                                                                   'items': pins.get(channel, [])})
+    with patch.object(MockUQCSBot, 'mocked_pins_list', mocked_pins_list, create=True):
+        history.bootstrap_pin_index({'type': 'hello'})
+        bootstrap_calls = mocked_pins_list.call_count
+        assert bootstrap_calls > 0
+        # Reconnecting finds the index already built.
+        history.bootstrap_pin_index({'type': 'hello'})
+        assert mocked_pins_list.call_count == bootstrap_calls
+
+        added_pin = get_pin(16, 'Sixteen years ago')
+        uqcsbot._run_handlers(generate_event_object(MESSAGE_TYPE_PIN_ADDED,
+                                                    channel_id=TEST_CHANNEL_ID, item=added_pin))
+        uqcsbot._run_handlers(generate_event_object(MESSAGE_TYPE_PIN_REMOVED,
+                                                    channel_id=TEST_CHANNEL_ID,
+                                                    item=pins[TEST_CHANNEL_ID][0]))
+        with patch("uqcsbot.scripts.history.choice", side_effect=lambda pins: pins[0]) \
+                as mocked_choice:
+            history.daily_history.func()
+        assert mocked_pins_list.call_count == bootstrap_calls
+
+    anniversary = mocked_choice.call_args[0][0]
+    assert [pin.text for pin in anniversary] == ['Sixteen years ago']
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert messages[-1]['text'] == (f'On this day, 16 years ago, <@{TEST_USER_ID}> said'
+                                    f'\n>>>Sixteen years ago')
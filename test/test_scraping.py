@@ -0,0 +1,23 @@
+"""
+Tests for scraping_utils.py
+"""
+from unittest.mock import patch
+from bs4 import SoupStrainer
+from uqcsbot.utils.scraping_utils import get_soup
+
+
+def test_strained_parse_matches_fallback_parser():
+    """
+    Tests that only the strained subtree is kept, and that the result is the
+    same whether or not lxml is available.
+    """
+    with open("test/parking.html", "rb") as html_file:
+        page = html_file.read()
+    strainer = SoupStrainer("table", attrs={"id": "parkingAvailability"})
+    soup = get_soup(page, parse_only=strainer)
+    with patch("uqcsbot.utils.scraping_utils.HTML_PARSER", "html.parser"):
+        fallback_soup = get_soup(page, parse_only=strainer)
+    assert soup.find("title") is None
+    rows = [row.get_text().split() for row in soup.find_all("tr")]
+    fallback_rows = [row.get_text().split() for row in fallback_soup.find_all("tr")]
+    assert rows and rows == fallback_rows
@@ -1,4 +1,10 @@
-from test.conftest import MockUQCSBot, TEST_CHANNEL_ID
+import base64
+import json
+from itertools import count
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID, TEST_BOT_ID, TEST_USER_ID
+from test.helpers import (generate_event_object, MESSAGE_TYPE_REACTION_ADDED,
+                          MESSAGE_TYPE_REACTION_REMOVED)
+from unittest.mock import Mock, patch
 
 
 def test_trivia_multiple(uqcsbot: MockUQCSBot):
@@ -31,3 +37,98 @@ def test_bad_input(uqcsbot: MockUQCSBot):
     messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
 
     assert len(messages) == 6
+
+
+def encode_b64(decoded: str) -> str:
+    return base64.b64encode(decoded.encode('utf-8')).decode('utf-8')
+
+
+# Numbers the questions returned by mocked_opentdb_get
+question_numbers = count(1)
+
+
+def mocked_opentdb_get(url, params=None, timeout=None):
+    """
+    Mocks requests to OpenTDB, numbering the returned questions so that
+    they're all different.
+    """
+    from uqcsbot.scripts.trivia import TOKEN_URL, CATEGORIES_URL
+    if url == TOKEN_URL:
+        content = {'response_code': 0, 'token': 'token'}
+    elif url == CATEGORIES_URL:
+        content = {'trivia_categories': [{'id': 9, 'name': 'General Knowledge'}]}
+    else:
+        content = {'response_code': 0, 'results': [
+            {'category': encode_b64('Science'), 'type': encode_b64('boolean'),
+             'difficulty': encode_b64('easy'), 'correct_answer': encode_b64('True'),
+             'question': encode_b64(f'Question {next(question_numbers)}'),
+             'incorrect_answers': [encode_b64('False')]} for _ in range(params['amount'])]}
+    return Mock(status_code=200, content=json.dumps(content).encode('utf-8'))
+
+
+def test_trivia_question_pool(uqcsbot: MockUQCSBot):
+    """
+    Tests that questions are fetched in batches and the pool is refilled in
+    the background, and that the categories are only fetched once.
+    """
+    from uqcsbot.scripts import trivia
+    trivia._question_pools.clear()
+    trivia._session_token = None
+    trivia.get_category_list.cache_clear()
+    pool_key = (-1, 'random', 'boolean')
+    with patch("uqcsbot.scripts.trivia.requests.get",
+               side_effect=mocked_opentdb_get) as mocked_get:
+        questions = [trivia.get_question(pool_key).question
+                     for _ in range(trivia.POOL_BATCH_SIZE - trivia.REFILL_THRESHOLD + 1)]
+        # Wait for the background refill to finish
+        trivia._refill_executor.submit(lambda: None).result()
+        assert trivia.get_categories() == trivia.get_categories()
+    assert len(set(questions)) == len(questions)
+    urls = [call[0][0] for call in mocked_get.call_args_list]
+    assert urls == [trivia.TOKEN_URL, trivia.API_URL, trivia.API_URL, trivia.CATEGORIES_URL]
+    assert all(call[1]['params'].get('token') == 'token'
+               for call in mocked_get.call_args_list if call[0][0] == trivia.API_URL)
+    assert len(trivia._question_pools[pool_key]) == \
+        2 * trivia.POOL_BATCH_SIZE - len(questions)
+    trivia._question_pools.clear()
+    trivia.get_category_list.cache_clear()
+    trivia._session_token = None
+
+
+def test_trivia_session_scoring(uqcsbot: MockUQCSBot):
+    """
+    Tests that votes are tracked from reaction events, and scored with a
+    single scheduled action once the question's time is up.
+    """
+    from uqcsbot.scripts import trivia
+    question_data = trivia.QuestionData(type='boolean', question='Is this a test?',
+                                        correct_answer='True', answers=['True', 'False'],
+                                        is_boolean=True)
+
+    def react(event_type, user, reaction):
+        question_message = uqcsbot.test_messages[TEST_CHANNEL_ID][-1]
+        item = {'type': 'message', 'channel': TEST_CHANNEL_ID, 'ts': question_message['ts']}
+        uqcsbot._run_handlers(generate_event_object(event_type, user=user,
+                                                    reaction=reaction, item=item))
+
+    with patch("uqcsbot.scripts.trivia.get_question", return_value=question_data), \
+            patch("uqcsbot.scripts.trivia.REACT_INTERVAL", 0), \
+            patch("uqcsbot.scripts.trivia.schedule_action") as mocked_schedule:
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!trivia -s 10', user=TEST_USER_ID)
+        react(MESSAGE_TYPE_REACTION_ADDED, TEST_BOT_ID, 'this')
+        react(MESSAGE_TYPE_REACTION_ADDED, TEST_USER_ID, 'not-this')
+        react(MESSAGE_TYPE_REACTION_REMOVED, TEST_USER_ID, 'not-this')
+        react(MESSAGE_TYPE_REACTION_ADDED, TEST_USER_ID, 'this')
+        assert mocked_schedule.call_count == 1
+        end_question, seconds = mocked_schedule.call_args[0]
+        assert seconds == 10
+        end_question()
+        assert mocked_schedule.call_count == 1
+
+    messages = uqcsbot.test_messages[TEST_CHANNEL_ID]
+    assert messages[-1]['text'] == ('The answer to the question *Is this a test?* is: *:this:*'
+                                    f'\nCorrect: <@{TEST_USER_ID}>')
+    assert not trivia._sessions
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!trivia --leaderboard', user=TEST_USER_ID)
+    assert uqcsbot.test_messages[TEST_CHANNEL_ID][-1]['text'] == \
+        f'*Trivia leaderboard*\n>>>1. <@{TEST_USER_ID}>: 1/1 correct'
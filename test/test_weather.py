@@ -2,23 +2,44 @@ from test.conftest import MockUQCSBot, TEST_CHANNEL_ID
 from unittest.mock import patch
 import xml.etree.ElementTree as ET
 import datetime
+import threading
+import pytest
 
 
-def mocked_xml_get(state):
+@pytest.fixture(autouse=True)
+def clear_forecast_indexes():
+    """
+    Forgets the indexed forecasts and rendered daily weather, which are
+    otherwise kept between tests.
+    """
+    from uqcsbot.scripts import weather
+    weather._forecast_indexes.clear()
+    weather._daily_weather_message = None
+    yield
+    weather._forecast_indexes.clear()
+    weather._daily_weather_message = None
+
+
+def mocked_xml_get(product):
     """
     This method will be used to replace the requests response
     Returns locally stored XML Queensland forecasts from 2019.
     """
-    source = {"NSW": "IDN11060", "ACT": "IDN11060", "NT": "IDD10207", "QLD": "IDQ11295",
-              "SA": "IDS10044", "TAS": "IDT16710", "VIC": "IDV10753", "WA": "IDW14199"}
     try:
-        data = open("test/bom_{}.xml".format(source[state]))
+        data = open("test/bom_{}.xml".format(product))
         root = ET.fromstring(data.read())
     except Exception:
         return None
     return root
 
 
+def mocked_fetch_products(products):
+    """
+    This method will be used to replace fetching a batch of products over FTP
+    """
+    return {product: mocked_xml_get(product) for product in products}
+
+
 def mocked_response_header(node: ET.Element, location: str):
     """
     This method will be used to replace the header response
@@ -43,7 +64,7 @@ def mocked_response_header(node: ET.Element, location: str):
     return "*{}'s Weather Forecast For {}*".format(date_name, location)
 
 
-@patch("uqcsbot.scripts.weather.get_xml", new=mocked_xml_get)
+@patch("uqcsbot.scripts.weather.fetch_products", new=mocked_fetch_products)
 @patch("uqcsbot.scripts.weather.response_header", new=mocked_response_header)
 def test_brisbane(uqcsbot: MockUQCSBot):
     """
@@ -68,7 +89,7 @@ def test_brisbane(uqcsbot: MockUQCSBot):
     assert messages[0]['text'].split("\n")[0] == "*Today's Weather Forecast For Brisbane*"
 
 
-@patch("uqcsbot.scripts.weather.get_xml", new=mocked_xml_get)
+@patch("uqcsbot.scripts.weather.fetch_products", new=mocked_fetch_products)
 @patch("uqcsbot.scripts.weather.response_header", new=mocked_response_header)
 def test_tomorrow(uqcsbot: MockUQCSBot):
     """
@@ -79,7 +100,7 @@ def test_tomorrow(uqcsbot: MockUQCSBot):
     assert messages[-1]['text'].split("\n")[0] == "*Tomorrow's Weather Forecast For Esk*"
 
 
-@patch("uqcsbot.scripts.weather.get_xml", new=mocked_xml_get)
+@patch("uqcsbot.scripts.weather.fetch_products", new=mocked_fetch_products)
 @patch("uqcsbot.scripts.weather.response_header", new=mocked_response_header)
 def test_location(uqcsbot: MockUQCSBot):
     """
@@ -90,7 +111,7 @@ def test_location(uqcsbot: MockUQCSBot):
     assert messages[-1]['text'].split("\n")[0] == "*Today's Weather Forecast For Coffs Harbour*"
 
 
-@patch("uqcsbot.scripts.weather.get_xml", new=mocked_xml_get)
+@patch("uqcsbot.scripts.weather.fetch_products", new=mocked_fetch_products)
 @patch("uqcsbot.scripts.weather.response_header", new=mocked_response_header)
 def test_error(uqcsbot: MockUQCSBot):
     """
@@ -107,3 +128,116 @@ def test_error(uqcsbot: MockUQCSBot):
     uqcsbot.post_message(TEST_CHANNEL_ID, '!weather TAS Hobart')
     messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
     assert messages[-1]['text'] == "Could Not Retrieve BOM Data"
+
+
+@patch("uqcsbot.scripts.weather.response_header", new=mocked_response_header)
+def test_forecast_index(uqcsbot: MockUQCSBot):
+    """
+    Test that each forecast is fetched once and indexed, so that locations
+    can be found regardless of case, spelling mistakes or apostrophes, and
+    that forecasts are fetched again once they've been reissued
+    """
+    from uqcsbot.scripts import weather
+    with patch("uqcsbot.scripts.weather.fetch_products",
+               side_effect=mocked_fetch_products) as mocked_get:
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!weather COFFS   harbour')
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!weather NSW COFFS   harbour')
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!weather Brisbne 1')
+        uqcsbot.post_message(TEST_CHANNEL_ID, "!weather o'reilly")
+        assert [call[0][0] for call in mocked_get.call_args_list] \
+            == [["IDQ11295"], ["IDN11060"]]
+
+        messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+        assert messages[1]['text'] == "Location Not Found"
+        assert messages[3]['text'].split("\n")[0] == "*Today's Weather Forecast For Coffs Harbour*"
+        assert messages[5]['text'].split("\n")[0] == "*Tomorrow's Weather Forecast For Brisbane*"
+        assert messages[7]['text'].split("\n")[0] == "*Today's Weather Forecast For O'Reilly*"
+
+        # the test forecasts were issued long ago, so should all be fetched again together
+        mocked_get.reset_mock()
+        weather.refresh_forecasts.func()
+        mocked_get.assert_called_once_with(
+            sorted({*weather.STATE_PRODUCTS.values(), weather.BRISBANE_DETAILED_PRODUCT}))
+
+    # a product which can't be indexed doesn't replace the previous index of it
+    index = weather._forecast_indexes["IDQ11295"]
+    root = mocked_xml_get("IDQ11295")
+    root.find(".//next-routine-issue-time-utc").text = "soon"
+    with patch("uqcsbot.scripts.weather.fetch_products", return_value={"IDQ11295": root}):
+        assert weather.fetch_forecast_indexes(["IDQ11295"]) == {}
+    assert weather._forecast_indexes["IDQ11295"] is index
+
+
+def test_refresh_products_once_at_a_time():
+    """
+    Test that products being refreshed by two jobs at once are only fetched once
+    """
+    from uqcsbot.scripts import weather
+    fetching = threading.Event()
+    finish_fetch = threading.Event()
+
+    def mocked_slow_fetch_products(products):
+        fetching.set()
+        finish_fetch.wait(5)
+        roots = mocked_fetch_products(products)
+        for root in roots.values():
+            # so that the product isn't due again once it's been fetched
+            root.find(".//next-routine-issue-time-utc").text = "2100-01-01T00:00:00Z"
+        return roots
+
+    with patch("uqcsbot.scripts.weather.fetch_products",
+               side_effect=mocked_slow_fetch_products) as mocked_get:
+        first = threading.Thread(target=weather.refresh_products, args=(["IDQ11295"],))
+        first.start()
+        fetching.wait(5)
+        second = threading.Thread(target=weather.refresh_products, args=(["IDQ11295"],))
+        second.start()
+        finish_fetch.set()
+        first.join()
+        second.join()
+    mocked_get.assert_called_once_with(["IDQ11295"])
+
+
+def test_fetch_products():
+    """
+    Test fetching a batch of products over one session from a local FTP server
+    """
+    from test.bench_weather import LocalFTPServer
+    from uqcsbot.scripts.weather import fetch_products
+    with LocalFTPServer() as server, \
+            patch("uqcsbot.scripts.weather.BOM_FTP_HOST", "127.0.0.1"), \
+            patch("uqcsbot.scripts.weather.BOM_FTP_PORT", server.port), \
+            patch.object(server, "process_request",
+                         wraps=server.process_request) as mocked_process:
+        roots = fetch_products(["IDQ11295", "IDT16710", "IDN11060"])
+    assert mocked_process.call_count == 1
+    assert roots["IDQ11295"].findtext(".//identifier") == "IDQ11295"
+    assert roots["IDT16710"] is None
+    assert roots["IDN11060"].findtext(".//identifier") == "IDN11060"
+
+
+@patch("uqcsbot.scripts.weather.response_header", new=mocked_response_header)
+def test_daily_weather(uqcsbot: MockUQCSBot):
+    """
+    Test that the daily weather is rendered before it's posted, so posting it
+    doesn't fetch anything
+    """
+    from uqcsbot.scripts import weather
+    uqcsbot.channels._on_channel_created(
+        {'channel': {'id': 'general', 'name': 'general', 'is_public': True}})
+
+    def mocked_fetch_daily_products(products):
+        return {product: mocked_xml_get(product) for product in products}
+
+    with patch("uqcsbot.scripts.weather.fetch_products",
+               side_effect=mocked_fetch_daily_products) as mocked_get:
+        weather.prerender_daily_weather.func()
+        mocked_get.assert_called_once_with(["IDQ10605", "IDQ11295"])
+        weather.daily_weather.func()
+        assert mocked_get.call_count == 1
+    messages = uqcsbot.test_messages.get('general', [])
+    assert messages[-1]['text'].split("\n")[0] == "*Today's Weather Forecast For Brisbane*"
+    # the detailed forecast comes from the metropolitan area, not the location
+    assert "High chance of showers, most likely in the morning" in messages[-1]['text']
+    assert "UV Index predicted to reach 7 [High]" in messages[-1]['text']
+    assert "There Is A High Fire Danger Today" in messages[-1]['text']
@@ -0,0 +1,134 @@
+"""
+Tests for whatsdue.py
+"""
+from datetime import datetime
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID
+from unittest.mock import Mock, patch
+
+PROFILE_IDS = {'CSSE1001': '100001', 'CSSE2310': '100002'}
+ASSESSMENT = {'CSSE1001': [('CSSE1001', 'Assignment 1', '1 Mar 19', '20%')],
+              'CSSE2310': [('CSSE2310', 'Final Exam', 'Examination Period', '60%')]}
+ASSESSMENT_PAGE = b"""
+<table class="tblborder">
+<tr><th>Course</th><th>Task</th><th>Due</th><th>Weight</th></tr>
+<tr><td><div>CSSE1001 - Sem 1 2019 - St Lucia - Internal</div></td><td><div>Assignment 1</div></td>
+    <td><div>1 Mar 19<br/>Submitted online</div></td><td><div>20%</div></td></tr>
+<tr><td><div>CSSE1001 - Sem 1 2019 - St Lucia - Internal</div></td><td><div>Tutorials</div></td>
+    <td><div>Throughout Semester</div></td><td><div>10%</div></td></tr>
+<tr><td><div>CSSE1001 - Sem 1 2019 - St Lucia - Internal</div></td><td><div>Project</div></td>
+    <td><div>6 May 19 - 10 May 19</div></td><td><div>30%</div></td></tr>
+</table>
+"""
+
+
+def mocked_get_course_profile_id(course_name):
+    """
+    Returns a fixed profile id for known courses.
+    """
+    from uqcsbot.utils.uq_course_utils import CourseNotFoundException
+    if course_name not in PROFILE_IDS:
+        raise CourseNotFoundException(course_name)
+    return PROFILE_IDS[course_name]
+
+
+def mocked_get_course_assessment(course_names, cutoff=None, assessment_url=None):
+    """
+    Returns fixed assessment for the given courses.
+    """
+    from uqcsbot.utils.uq_course_utils import AssessmentItem
+    return [AssessmentItem(*item, start=None, end=None, parse_error=None)
+            for course_name in course_names for item in ASSESSMENT[course_name]]
+
+
+@patch("uqcsbot.utils.uq_course_utils.get_course_profile_id", new=mocked_get_course_profile_id)
+@patch("uqcsbot.utils.uq_course_utils.get_course_assessment", new=mocked_get_course_assessment)
+def test_whatsdue_streams_into_one_message(uqcsbot: MockUQCSBot):
+    """
+    Tests that !whatsdue posts a single response which ends up
+    containing the assessment for every course.
+    """
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!whatsdue CSSE1001 CSSE2310')
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert len(messages) == 2
+    response = messages[-1]['text']
+    assert '*CSSE1001*: `20%` _Assignment 1_ *(1 Mar 19)*' in response
+    assert '*CSSE2310*: `60%` _Final Exam_ *(Examination Period)*' in response
+    assert 'Still fetching' not in response
+    assert 'profileIds=100001,100002|here>' in response
+
+
+@patch("uqcsbot.utils.uq_course_utils.get_course_profile_id", new=mocked_get_course_profile_id)
+@patch("uqcsbot.utils.uq_course_utils.get_course_assessment", new=mocked_get_course_assessment)
+def test_whatsdue_unknown_course(uqcsbot: MockUQCSBot):
+    """
+    Tests that !whatsdue reports a course which could not be found.
+    """
+    uqcsbot.post_message(TEST_CHANNEL_ID, '!whatsdue CSSE1001 ABCD1234')
+    messages = uqcsbot.test_messages.get(TEST_CHANNEL_ID, [])
+    assert len(messages) == 2
+    assert messages[-1]['text'] == "Could not find course 'ABCD1234'."
+
+
+def test_exam_period_is_memoised():
+    """
+    Tests that the exam period is only fetched from UQ once per semester.
+    """
+    from uqcsbot.utils.uq_course_utils import get_current_exam_period, get_exam_period
+    calendar_page = (b'<ul><li class="description-calendar-view">'
+                     b'Semester 1 examination period 8 - 20 June 2099</li>'
+                     b'<li class="description-calendar-view">'
+                     b'Semester 2 examination period 2 - 14 November 2099</li></ul>')
+    mocked_response = Mock(status_code=200, content=calendar_page)
+    get_exam_period.cache_clear()
+    with patch("uqcsbot.utils.uq_course_utils.get_uq_request",
+               return_value=mocked_response) as mocked_request:
+        first_period = get_current_exam_period()
+        assert get_current_exam_period() == first_period
+    assert mocked_request.call_count == 1
+    get_exam_period.cache_clear()
+
+
+def test_course_profile_id_is_indexed(uqcsbot: MockUQCSBot):
+    """
+    Tests that a course's profile is only looked up on the UQ website once,
+    and that the index is pruned once its offering is no longer current.
+    """
+    # Imported here so that the module is bound to the mocked bot (and so its DB).
+    from uqcsbot.utils.uq_course_utils import get_course_profile_id, prune_course_profile_index
+    profile_url = 'https://course-profiles.uq.edu.au/student_section_loader/section_1/100728'
+    with patch("uqcsbot.utils.uq_course_utils.get_course_profile_url",
+               return_value=profile_url) as mocked_get_url:
+        assert get_course_profile_id('csse1001') == '100728'
+        assert get_course_profile_id('CSSE1001') == '100728'
+    assert mocked_get_url.call_count == 1
+
+    assert prune_course_profile_index() == 0
+    next_year = datetime(datetime.today().year + 1, 3, 1)
+    with patch("uqcsbot.utils.uq_course_utils.datetime", Mock(today=lambda: next_year)):
+        assert prune_course_profile_index() == 1
+
+
+def test_assessment_is_parsed_once():
+    """
+    Tests that an assessment table is fetched and parsed once, with its
+    due dates resolved up front and any unparsable dates recorded.
+    """
+    from uqcsbot.utils.uq_course_utils import get_course_assessment
+    mocked_response = Mock(status_code=200, content=ASSESSMENT_PAGE)
+    assessment_url = 'https://example.com/assessment?profileIds=1'
+    with patch("uqcsbot.utils.uq_course_utils.get_uq_request",
+               return_value=mocked_response) as mocked_request:
+        full_assessment = get_course_assessment(['CSSE1001'], None, assessment_url)
+        cutoff_assessment = get_course_assessment(['CSSE1001'], datetime(2019, 4, 1),
+                                                  assessment_url)
+    assert mocked_request.call_count == 1
+
+    assignment, tutorials, project = full_assessment
+    assert assignment.due_date == '1 Mar 19'
+    assert assignment.start == assignment.end == datetime(2019, 3, 1)
+    assert project.start == datetime(2019, 5, 6) and project.end == datetime(2019, 5, 10)
+    assert tutorials.start is None and tutorials.end is None
+    assert tutorials.parse_error == ("Could not parse date 'Throughout Semester'"
+                                     " for course 'CSSE1001'.")
+    # Items with unparsable dates are kept regardless of the cutoff.
+    assert cutoff_assessment == [tutorials, project]
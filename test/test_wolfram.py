@@ -0,0 +1,68 @@
+"""
+Tests for wolfram.py
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from test.conftest import MockUQCSBot, TEST_CHANNEL_ID, TEST_USER_ID
+from test.helpers import generate_event_object, MESSAGE_TYPE_MESSAGE
+from unittest.mock import Mock, patch
+
+
+def test_wolfram_conversation(uqcsbot: MockUQCSBot):
+    """
+    Tests that replies to a Wolfram conversation's thread continue it using
+    the stored conversation state, and that other threads are ignored,
+    without asking Slack for any thread's history.
+    """
+    from uqcsbot.scripts import wolfram
+    wolfram._conversations.clear()
+    responses = [('The first answer', 'conversation1', 'host1', None),
+                 ('The second answer', 'conversation2', 'host2', 's2'),
+                 ('The third answer', 'conversation3', 'host3', 's3')]
+    with patch("uqcsbot.scripts.wolfram.conversation_request", side_effect=responses) \
+            as mocked_request, \
+            patch.object(MockUQCSBot, 'mocked_conversations_history') as mocked_history, \
+            patch.object(MockUQCSBot, 'mocked_chat_update') as mocked_update:
+        uqcsbot.post_message(TEST_CHANNEL_ID, '!wolfram The first?', user=TEST_USER_ID)
+        parent_message = uqcsbot.test_messages[TEST_CHANNEL_ID][-1]
+        for thread_ts in ['1234567890.000000', parent_message['ts'], parent_message['ts']]:
+            uqcsbot._run_handlers(generate_event_object(
+                MESSAGE_TYPE_MESSAGE, channel=TEST_CHANNEL_ID, user=TEST_USER_ID,
+                text='And the next?', ts='9999999999.000000', thread_ts=thread_ts))
+    assert not mocked_history.called
+    assert not mocked_update.called
+    assert parent_message['attachments'][0]['text'] == 'The first answer'
+    assert [call[0] for call in mocked_request.call_args_list] == [
+        ('The first?',),
+        ('And the next?', 'host1', 'conversation1', ''),
+        ('And the next?', 'host2', 'conversation2', 's2')]
+    replies = [message['text'] for message in uqcsbot.test_messages[TEST_CHANNEL_ID][-2:]]
+    assert replies == ['The second answer', 'The third answer']
+    wolfram._conversations.clear()
+
+
+def test_wolfram_responses_are_cached(uqcsbot: MockUQCSBot):
+    """
+    Tests that identical queries, including concurrent ones, share a single
+    request to Wolfram, and that error responses aren't cached.
+    """
+    from uqcsbot.scripts import wolfram
+
+    def mocked_get(api_url, params):
+        time.sleep(0.2)
+        if params['input'] == 'broken':
+            return Mock(status_code=500, content=b'')
+        return Mock(status_code=200, content=b'4')
+
+    wolfram._response_cache.clear()
+    with patch("uqcsbot.scripts.wolfram.requests.get", side_effect=mocked_get) as mocked_request:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            answers = list(executor.map(wolfram.get_short_answer, ['2+2', '  2+2 ']))
+        assert answers == [b'4', b'4']
+        assert wolfram.get_short_answer('2+2') == b'4'
+        assert mocked_request.call_count == 1
+
+        wolfram.get_short_answer('broken')
+        wolfram.get_short_answer('broken')
+        assert mocked_request.call_count == 3
+    wolfram._response_cache.clear()
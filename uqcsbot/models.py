@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, String, Integer, Boolean, Index
 
 
 Base = declarative_base()
@@ -15,3 +15,116 @@ class Link(Base):  # type: ignore
 
     def __repr__(self):
         return f"Link({self.key}, {self.channel}, {self.value})"
+
+
+class CourseProfile(Base):  # type: ignore
+    """
+    Index of course codes to the id of their course profile for a given offering.
+    """
+    __tablename__ = 'course_profiles'
+
+    course_code = Column("course_code", String, primary_key=True)
+    year = Column("year", Integer, primary_key=True)
+    semester = Column("semester", Integer, primary_key=True)
+    campus = Column("campus", String, primary_key=True)
+    is_internal = Column("is_internal", Boolean, primary_key=True)
+    profile_id = Column("profile_id", String, nullable=False)
+
+    def __repr__(self):
+        return (f"CourseProfile({self.course_code}, {self.year}, {self.semester}, {self.campus},"
+                f" {'internal' if self.is_internal else 'external'}, {self.profile_id})")
+
+
+class CourseSubscription(Base):  # type: ignore
+    """
+    A user's subscription to the weekly assessment digest for a course.
+    """
+    __tablename__ = 'course_subscriptions'
+
+    user_id = Column("user_id", String, primary_key=True)
+    course_code = Column("course_code", String, primary_key=True)
+
+    def __repr__(self):
+        return f"CourseSubscription({self.user_id}, {self.course_code})"
+
+
+class PinnedMessage(Base):  # type: ignore
+    """
+    Index of pinned messages in public channels, by the (Brisbane) month and
+    day they were originally posted on.
+    """
+    __tablename__ = 'pinned_messages'
+    __table_args__ = (Index('ix_pinned_messages_month_day', 'month', 'day'),)
+
+    channel_id = Column("channel_id", String, primary_key=True)
+    message_ts = Column("message_ts", String, primary_key=True)
+    year = Column("year", Integer, nullable=False)
+    month = Column("month", Integer, nullable=False)
+    day = Column("day", Integer, nullable=False)
+    user = Column("user", String, nullable=False)
+    text = Column("text", String, nullable=False)
+
+    def __repr__(self):
+        return (f"PinnedMessage({self.channel_id}, {self.message_ts},"
+                f" {self.year}-{self.month}-{self.day})")
+
+
+class ArchivedChannel(Base):  # type: ignore
+    """
+    A channel which has opted in to having its messages archived.
+    """
+    __tablename__ = 'archived_channels'
+
+    channel_id = Column("channel_id", String, primary_key=True)
+
+    def __repr__(self):
+        return f"ArchivedChannel({self.channel_id})"
+
+
+class ArchivedMessage(Base):  # type: ignore
+    """
+    A message posted in an archived channel. Attachments are stored as JSON.
+    """
+    __tablename__ = 'archived_messages'
+
+    channel_id = Column("channel_id", String, primary_key=True)
+    ts = Column("ts", String, primary_key=True)
+    user = Column("user", String, nullable=True)
+    subtype = Column("subtype", String, nullable=True)
+    thread_ts = Column("thread_ts", String, nullable=True)
+    text = Column("text", String, nullable=False)
+    attachments = Column("attachments", String, nullable=True)
+
+    def __repr__(self):
+        return f"ArchivedMessage({self.channel_id}, {self.ts})"
+
+
+class ArchivedMessageTerm(Base):  # type: ignore
+    """
+    Inverted index of the (lower-cased) terms in each archived message.
+    """
+    __tablename__ = 'archived_message_terms'
+
+    term = Column("term", String, primary_key=True)
+    channel_id = Column("channel_id", String, primary_key=True)
+    ts = Column("ts", String, primary_key=True)
+
+    def __repr__(self):
+        return f"ArchivedMessageTerm({self.term}, {self.channel_id}, {self.ts})"
+
+
+class TriviaScore(Base):  # type: ignore
+    """
+    A user's trivia score in a channel: the number of questions they've
+    answered and how many of those they got right.
+    """
+    __tablename__ = 'trivia_scores'
+
+    channel_id = Column("channel_id", String, primary_key=True)
+    user_id = Column("user_id", String, primary_key=True)
+    answered = Column("answered", Integer, nullable=False, default=0)
+    correct = Column("correct", Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (f"TriviaScore({self.channel_id}, {self.user_id},"
+                f" {self.correct}/{self.answered})")
@@ -1,21 +1,31 @@
 from uqcsbot import bot, Command
 from requests import get
 from urllib.parse import quote
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from typing import List, Tuple
 from functools import partial
 import asyncio
 from uqcsbot.utils.command_utils import UsageSyntaxException
+from uqcsbot.utils.scraping_utils import get_soup
 
 ACRONYM_LIMIT = 5
 BASE_URL = "http://acronyms.thefreedictionary.com"
+# Whole rows are kept so that each acronym cell keeps its sibling definition cell.
+ACRONYM_ROW_STRAINER = SoupStrainer("tr")
 
 
 async def get_acronyms(loop, word: str) -> Tuple[str, List[str]]:
     http_response = await loop.run_in_executor(None, partial(get, f"{BASE_URL}/{quote(word)}"))
-    html = BeautifulSoup(http_response.content, 'html.parser')
+    return word, get_acronyms_from_page(http_response.content)
+
+
+def get_acronyms_from_page(acronym_page: bytes) -> List[str]:
+    """
+    Returns the acronym definitions listed on the given page.
+    """
+    html = get_soup(acronym_page, parse_only=ACRONYM_ROW_STRAINER)
     acronym_tds = html.find_all("td", class_="acr")
-    return word, [td.find_next_sibling("td").text for td in acronym_tds]
+    return [td.find_next_sibling("td").text for td in acronym_tds]
 
 
 @bot.on_command("acro")
@@ -2,11 +2,15 @@ from uqcsbot import bot, Command
 from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
 
 from argparse import ArgumentParser, Namespace
+from collections import defaultdict
+from copy import copy
 from datetime import datetime, timedelta, timezone
 from requests.exceptions import RequestException
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 from enum import Enum
 import os
+import threading
+import time
 import requests
 
 # Leaderboard API URL with placeholders for year and code.
@@ -15,11 +19,19 @@ LEADERBOARD_URL = "https://adventofcode.com/{year}/leaderboard/private/view/{cod
 SESSION_ID = os.environ.get("AOC_SESSION_ID")
 # UQCS leaderboard ID.
 UQCS_LEADERBOARD = 989288
+# Name of the channel to announce new stars on the UQCS leaderboard in (if any).
+AOC_CHANNEL = os.environ.get("AOC_CHANNEL")
 
 # Days in Advent of Code. List of numbers 1 to 25.
 ADVENT_DAYS = list(range(1, 25 + 1))
 # Puzzles are unlocked at midnight EST.
 EST_TIMEZONE = timezone(timedelta(hours=-5))
+# Advent of Code asks that each leaderboard is fetched at most once every 15 minutes.
+LEADERBOARD_REFRESH_INTERVAL = 15 * 60
+# Leaderboards which haven't been viewed for this long stop being refreshed.
+LEADERBOARD_IDLE_TIME = 24 * 60 * 60
+# How often to check for viewed leaderboards which are due to be refreshed.
+LEADERBOARD_REFRESH_CHECK_INTERVAL = 60
 
 
 class SortMode(Enum):
@@ -99,12 +111,21 @@ class Member:
 
         # if day is specified, save that day's information into the day_ fields.
         if day:
-            member.day = day
-            member.day_times = member.all_times[day]
-            member.day_delta = member.all_deltas[day]
+            return member.on_day(day)
 
         return member
 
+    def on_day(self, day: Day) -> "Member":
+        """
+        Returns a copy of this member with the given day's times and delta
+        saved into the day_ fields.
+        """
+        member = copy(self)
+        member.day = day
+        member.day_times = self.all_times[day]
+        member.day_delta = self.all_deltas[day]
+        return member
+
     @staticmethod
     def sort_key(sort: SortMode) -> Callable[["Member"], Any]:
         """
@@ -178,6 +199,19 @@ def format_global_leaderboard(members: List[Member]) -> str:
     return "\n".join(format_member(i, m) for i, m in enumerate(members, 1))
 
 
+def format_seconds(seconds: Optional[int]) -> str:
+    """
+    Returns the given completion time in a short format, or an empty string
+    if there is no time.
+    """
+    if seconds is None:
+        return ""
+    delta = timedelta(seconds=seconds)
+    if delta > timedelta(hours=24):
+        return ">24h"
+    return str(delta)
+
+
 def format_day_leaderboard(members: List[Member]) -> str:
     """
     Returns a string representing the leaderboard of the given members on
@@ -186,14 +220,6 @@ def format_day_leaderboard(members: List[Member]) -> str:
     Full leaderboard includes rank, points, stars (per day), and username.
     """
 
-    def format_seconds(seconds: Optional[int]) -> str:
-        if seconds is None:
-            return ""
-        delta = timedelta(seconds=seconds)
-        if delta > timedelta(hours=24):
-            return ">24h"
-        return str(delta)
-
     #   3         8        8         8
     # |-|  |------| |------|  |------|
     #       Part 1   Part 2     Delta
@@ -210,6 +236,36 @@ def format_day_leaderboard(members: List[Member]) -> str:
     return header + "\n".join(format_member(i, m) for i, m in enumerate(members, 1))
 
 
+def get_leaderboard_members(members: List[Member],
+                            is_day: bool, is_global: bool, sort: SortMode) -> List[Member]:
+    """
+    Returns the given members which belong on the leaderboard with the given
+    options, in the order they're shown.
+    """
+
+    if is_day:
+        # filter to users who have at least one star on this day.
+        return sorted((m for m in members if m.day_times), key=Member.sort_key(sort))
+
+    if is_global:
+        # filter to users who have global points.
+        return sorted((m for m in members if m.global_), key=Member.sort_key(SortMode.GLOBAL))
+
+    return sorted(members, key=Member.sort_key(SortMode.LOCAL))
+
+
+def format_leaderboard_members(members: List[Member], is_day: bool, is_global: bool) -> str:
+    """
+    Returns a leaderboard of the given (filtered and sorted) members.
+    """
+
+    if is_day:
+        return format_day_leaderboard(members)
+    if is_global:
+        return format_global_leaderboard(members)
+    return format_full_leaderboard(members)
+
+
 def format_advent_leaderboard(members: List[Member],
                               is_day: bool, is_global: bool, sort: SortMode) -> str:
     """
@@ -219,20 +275,219 @@ def format_advent_leaderboard(members: List[Member],
     specific day is shown.
     """
 
-    if is_day:
-        # filter to users who have at least one star on this day.
-        members = [m for m in members if m.day_times]
-        members.sort(key=Member.sort_key(sort))
-        return format_day_leaderboard(members)
+    return format_leaderboard_members(get_leaderboard_members(members, is_day, is_global, sort),
+                                      is_day, is_global)
 
-    if is_global:
-        # filter to users who have global points.
-        members = [m for m in members if m.global_]
-        members.sort(key=Member.sort_key(SortMode.GLOBAL))
-        return format_global_leaderboard(members)
 
-    members.sort(key=Member.sort_key(SortMode.LOCAL))
-    return format_full_leaderboard(members)
+# Identifies a view of a leaderboard: the day (or 0 for all days), whether
+# global points are shown, and the sort mode (for a single day).
+ViewKey = Tuple[Day, bool, Optional[SortMode]]
+
+
+def get_view_key(day: Day, is_global: bool, sort: SortMode) -> ViewKey:
+    """
+    Returns the key of the leaderboard view with the given options.
+    """
+
+    if day:
+        return day, False, sort
+    return 0, is_global, None
+
+
+class Leaderboard:
+    """
+    A private leaderboard, parsed from the API response. Its members are
+    sorted for every view (all days, global points, and each day in each
+    sort mode) up front, so showing a view only needs it to be formatted.
+    """
+
+    def __init__(self, data: Dict, year: int) -> None:
+        self.members_by_id = {member_id: Member.from_member_data(m, year)
+                              for member_id, m in data["members"].items()}
+        self.members = list(self.members_by_id.values())
+
+        self.views: Dict[ViewKey, List[Member]] = {}
+        for is_global in (False, True):
+            self.views[get_view_key(0, is_global, SortMode.LOCAL)] = get_leaderboard_members(
+                self.members, False, is_global, SortMode.LOCAL)
+        for day in ADVENT_DAYS:
+            day_members = [m.on_day(day) for m in self.members]
+            for sort in SORT_LABELS:
+                self.views[get_view_key(day, False, sort)] = get_leaderboard_members(
+                    day_members, True, False, sort)
+
+    def format(self, day: Day, is_global: bool, sort: SortMode) -> str:
+        """
+        Returns the view of the leaderboard with the given options.
+        """
+
+        members = self.views[get_view_key(day, is_global, sort)]
+        return format_leaderboard_members(members, bool(day), is_global)
+
+
+# A star gained by a member, and how long after the puzzle unlocked it was gained.
+NewStar = NamedTuple("NewStar", [("name", str), ("day", Day), ("star", Star),
+                                 ("time", Seconds)])
+
+
+def get_new_stars(old: Leaderboard, new: Leaderboard) -> List[NewStar]:
+    """
+    Returns the stars gained between the given snapshots of a leaderboard,
+    in the order they were gained. Members who weren't on the old
+    leaderboard are left out, as their stars weren't all just gained.
+    """
+    new_stars: List[NewStar] = []
+    for member_id, member in new.members_by_id.items():
+        old_member = old.members_by_id.get(member_id)
+        if old_member is None:
+            continue
+        name = member.name or f"(anonymous user #{member_id})"
+        for day, times in member.all_times.items():
+            new_stars.extend(NewStar(name, day, star, seconds) for star, seconds in times.items()
+                             if star not in old_member.all_times[day])
+    # puzzles unlock exactly a day apart, so this orders stars by when they were gained
+    return sorted(new_stars, key=lambda s: (s.day * 24 * 60 * 60 + s.time, s.star))
+
+
+def format_new_star(new_star: NewStar) -> str:
+    """
+    Returns an announcement of the given new star.
+    """
+    return (f"{new_star.name} got star {new_star.star} on day {new_star.day}"
+            f" in {format_seconds(new_star.time)}")
+
+
+# A leaderboard (or None if it couldn't be fetched) and when it was fetched.
+CachedLeaderboard = NamedTuple("CachedLeaderboard", [("leaderboard", Optional[Leaderboard]),
+                                                     ("fetched", float)])
+
+# Cached leaderboards and when they were last viewed, by (year, code).
+_leaderboards: Dict[Tuple[int, int], CachedLeaderboard] = {}
+_last_viewed: Dict[Tuple[int, int], float] = {}
+# Held while a leaderboard is being fetched, so it's only fetched once at a time.
+_leaderboard_locks: Dict[Tuple[int, int], threading.Lock] = defaultdict(threading.Lock)
+# The (year, code) and snapshot of the leaderboard which new stars were last announced from.
+_announced_leaderboard: Optional[Tuple[Tuple[int, int], Leaderboard]] = None
+
+
+def refresh_leaderboard(year: int, code: int) -> Optional[Leaderboard]:
+    """
+    Returns the given leaderboard, fetching it again only if it was last
+    fetched (or failed to be) at least LEADERBOARD_REFRESH_INTERVAL ago.
+    Returns None if it couldn't be fetched. If it can't be fetched again,
+    the previous leaderboard is kept.
+    """
+
+    key = (year, code)
+    with _leaderboard_locks[key]:
+        cached = _leaderboards.get(key)
+        if cached is not None and time.monotonic() - cached.fetched < LEADERBOARD_REFRESH_INTERVAL:
+            return cached.leaderboard
+
+        # the interval is counted from when each request is made
+        fetched = time.monotonic()
+        leaderboard = None
+        try:
+            data = get_leaderboard(year, code)
+            if data is not None:
+                leaderboard = Leaderboard(data, year)
+        except Exception:
+            bot.logger.exception(f"Could not fetch leaderboard {code} for {year}")
+        if leaderboard is None and cached is not None:
+            leaderboard = cached.leaderboard
+
+        _leaderboards[key] = CachedLeaderboard(leaderboard, fetched)
+        return leaderboard
+
+
+def get_cached_leaderboard(year: int, code: int) -> Optional[Leaderboard]:
+    """
+    Returns the given leaderboard from the cache (fetching it if needed),
+    and keeps it refreshed in the background while it's being viewed.
+    Leaderboards which couldn't be fetched aren't kept refreshed.
+    """
+
+    leaderboard = refresh_leaderboard(year, code)
+    if leaderboard is not None:
+        _last_viewed[(year, code)] = time.monotonic()
+    return leaderboard
+
+
+def get_announced_leaderboard_key() -> Optional[Tuple[int, int]]:
+    """
+    Returns the (year, code) of the leaderboard to announce new stars from,
+    which is the UQCS leaderboard during December. Returns None outside of
+    December or if there's no channel to announce them in.
+    """
+
+    now = datetime.now(EST_TIMEZONE)
+    if AOC_CHANNEL is None or now.month != 12:
+        return None
+    return now.year, UQCS_LEADERBOARD
+
+
+def announce_new_stars(key: Tuple[int, int]) -> None:
+    """
+    Announces the stars gained on the given leaderboard since it was last
+    announced from, if it has been fetched again since then.
+    """
+
+    global _announced_leaderboard
+    cached = _leaderboards.get(key)
+    if cached is None or cached.leaderboard is None:
+        return
+    if _announced_leaderboard is None or _announced_leaderboard[0] != key:
+        # nothing to compare to yet
+        _announced_leaderboard = key, cached.leaderboard
+        return
+    if _announced_leaderboard[1] is cached.leaderboard:
+        return
+
+    new_stars = get_new_stars(_announced_leaderboard[1], cached.leaderboard)
+    _announced_leaderboard = key, cached.leaderboard
+    if not new_stars:
+        return
+    channel = bot.channels.get(AOC_CHANNEL)
+    if channel is None:
+        bot.logger.warning(f"Could not find channel {AOC_CHANNEL} to announce new stars in")
+        return
+    bot.post_message(channel, "\n".join(map(format_new_star, new_stars)))
+
+
+@bot.on_schedule("interval", seconds=LEADERBOARD_REFRESH_CHECK_INTERVAL)
+def refresh_leaderboards() -> None:
+    """
+    Refreshes every recently viewed leaderboard as soon as it's allowed to be,
+    so !advent rarely has to wait for one to be fetched. Leaderboards which
+    haven't been viewed for LEADERBOARD_IDLE_TIME, or couldn't be fetched, are
+    forgotten once they're due to be fetched again. During December, the UQCS
+    leaderboard is always refreshed, and any new stars on it are announced.
+    """
+
+    announced_key = get_announced_leaderboard_key()
+    if announced_key is not None:
+        _last_viewed[announced_key] = time.monotonic()
+
+    for key, viewed in list(_last_viewed.items()):
+        if time.monotonic() - viewed > LEADERBOARD_IDLE_TIME:
+            del _last_viewed[key]
+            continue
+        refresh_leaderboard(*key)
+    # this includes leaderboards which failed to be fetched, and so were never viewed,
+    # but only once they're due to be fetched again, so they're still fetched at most
+    # once per interval
+    for key, cached in list(_leaderboards.items()):
+        if key in _last_viewed or time.monotonic() - cached.fetched < LEADERBOARD_REFRESH_INTERVAL:
+            continue
+        lock = _leaderboard_locks[key]
+        # otherwise it's being fetched right now
+        if lock.acquire(blocking=False):
+            del _leaderboards[key]
+            del _leaderboard_locks[key]
+            lock.release()
+
+    if announced_key is not None:
+        announce_new_stars(announced_key)
 
 
 def parse_arguments(argv: List[str]) -> Namespace:
@@ -293,18 +548,16 @@ def advent(command: Command) -> None:
         reply(str(error))
         return
 
-    try:
-        leaderboard = get_leaderboard(args.year, args.code)
-    except ValueError:
+    leaderboard = get_cached_leaderboard(args.year, args.code)
+    if leaderboard is None:
         reply("Error fetching leaderboard data. Check the leaderboard code, year, and day.")
-        raise
+        return
 
     try:
-        members = [Member.from_member_data(data, args.year, args.day)
-                   for data in leaderboard["members"].values()]
-    except Exception:
-        reply("Error parsing leaderboard data.")
-        raise
+        content = leaderboard.format(args.day, args.global_, args.sort)
+    except KeyError:
+        reply(f"There is no day {args.day} in Advent of Code.")
+        return
 
     # whether to show only one day
     is_day = bool(args.day)
@@ -321,7 +574,7 @@ def advent(command: Command) -> None:
     # reply with leaderboard as a file attachment because it gets quite large.
     bot.api.files.upload(
         initial_comment=message,
-        content=format_advent_leaderboard(members, is_day, is_global, args.sort),
+        content=content,
         title=f"advent_{args.code}_{args.year}_{args.day}.txt",
         filetype="text",
         channels=channel.id,
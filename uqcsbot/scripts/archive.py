@@ -0,0 +1,90 @@
+from datetime import datetime
+from uqcsbot import bot, Command
+from uqcsbot.utils.archive_utils import (archive_message,
+                                         unarchive_message,
+                                         is_channel_archived,
+                                         set_channel_archived,
+                                         search_messages)
+from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
+
+# Number of characters of each matching message to show in !search results.
+RESULT_TEXT_LENGTH = 100
+
+
+def get_formatted_search_result(message: dict) -> str:
+    """
+    Returns the given message in a pretty format to display as a search result.
+    """
+    posted = datetime.fromtimestamp(float(message['ts'])).strftime('%d %b %Y')
+    text = ' '.join(message['text'].split())
+    if len(text) > RESULT_TEXT_LENGTH:
+        text = text[:RESULT_TEXT_LENGTH] + '...'
+    author = f"<@{message['user']}>" if 'user' in message else 'A bot'
+    return f'*{posted}* {author}: {text}'
+
+
+@bot.on('message')
+def handle_message(evt: dict):
+    """
+    Keeps the archive of each archived channel in sync with its messages.
+
+    @no_help
+    """
+    channel_id = evt.get('channel')
+    if channel_id is None or not is_channel_archived(channel_id):
+        return
+    subtype = evt.get('subtype')
+    if subtype == 'message_changed':
+        archive_message(channel_id, evt['message'])
+    elif subtype == 'message_deleted':
+        unarchive_message(channel_id, evt['deleted_ts'])
+    elif 'ts' in evt:
+        archive_message(channel_id, evt)
+
+
+@bot.on_command('archive')
+def handle_archive(command: Command):
+    """
+    `!archive [on|off]` - Starts (or stops) archiving the messages in this
+    channel, so that they can be found with `!search`. Stopping removes every
+    archived message, so only workspace admins can do so. With no arguments,
+    says whether the channel is archived.
+    """
+    channel_id = command.channel_id
+    if command.has_arg() and command.arg.strip() not in ('on', 'off'):
+        raise UsageSyntaxException()
+    if command.has_arg() and command.arg.strip() == 'off':
+        user = bot.users.get(command.user_id)
+        if user is None or not (user.is_admin or user.is_owner):
+            bot.post_message(channel_id, 'Only workspace admins can stop archiving a channel,'
+                                         ' as doing so removes its archived messages.')
+            return
+    if command.has_arg():
+        set_channel_archived(channel_id, command.arg.strip() == 'on')
+    if is_channel_archived(channel_id):
+        response = 'Messages in this channel are being archived for `!search`.'
+    else:
+        response = 'Messages in this channel are not being archived.'
+    bot.post_message(channel_id, response)
+
+
+@bot.on_command('search')
+@loading_status
+def handle_search(command: Command):
+    """
+    `!search <QUERY>` - Returns the most recent archived messages in this
+    channel which contain every word of the given query. Only messages posted
+    since `!archive on` was used in the channel can be found.
+    """
+    if not command.has_arg():
+        raise UsageSyntaxException()
+    channel_id = command.channel_id
+    if not is_channel_archived(channel_id):
+        bot.post_message(channel_id, 'Messages in this channel are not being archived.'
+                                     ' Use `!archive on` to start archiving them.')
+        return
+    messages = search_messages(command.arg, [channel_id])
+    if not messages:
+        bot.post_message(channel_id, 'No archived messages found.')
+        return
+    bot.post_message(channel_id, '>>>' + '\n'.join(map(get_formatted_search_result, messages)))
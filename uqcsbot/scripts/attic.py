@@ -1,6 +1,6 @@
 from uqcsbot import bot, Command
-from uqcsbot.utils.command_utils import loading_status
-from typing import List
+from uqcsbot.utils.command_utils import loading_status, streaming_response
+from typing import Iterator, List
 import os
 import requests
 
@@ -27,6 +27,23 @@ def format_files(files: List[dict]) -> List[str]:
     return [f'>*{file["name"]}:* <{BASE_FILE_URL}{file["id"]}|Link>' for file in sorted_files]
 
 
+def iter_folder_files(folder: dict) -> Iterator[List[dict]]:
+    """
+    Takes a parent folder and recursively walks it and any subdirectories,
+    yielding the files directly inside each folder as soon as that folder's
+    contents have been fetched.
+
+    :param folder: a dictionary representing a Google Drive folder.
+    :return: an iterator of lists of file dictionaries, one list per folder visited.
+    """
+    contents = get_folder_contents(folder)
+    yield [file for file in contents
+           if file['mimeType'] != 'application/vnd.google-apps.folder']
+    for file in contents:
+        if file['mimeType'] == 'application/vnd.google-apps.folder':
+            yield from iter_folder_files(file)
+
+
 def get_all_files(folder: dict) -> List[dict]:
     """
     Takes a parent folder and recursively produces a single-level list
@@ -35,13 +52,7 @@ def get_all_files(folder: dict) -> List[dict]:
     :param folder: a dictionary representing a Google Drive folder.
     :return: a single-dimensional list of file dictionaries.
     """
-    files = []
-    for file in get_folder_contents(folder):
-        if file['mimeType'] == 'application/vnd.google-apps.folder':
-            files.extend(get_all_files(file))
-        else:
-            files.append(file)
-    return files
+    return [file for folder_files in iter_folder_files(folder) for file in folder_files]
 
 
 def get_folder_contents(folder: dict) -> List[dict]:
@@ -62,9 +73,19 @@ def get_folder_contents(folder: dict) -> List[dict]:
         return []
 
 
+def get_files_message(course: dict, files: List[dict]) -> str:
+    """
+    Returns the message listing all of the given files found for the given course folder.
+    """
+    return ('All of the UQAttic files found for the course'
+            + f' <{BASE_FOLDER_URL}{course["id"]} | {course["name"]}>'
+            + ' are listed below:\n' + '\n'.join(format_files(files)))
+
+
 @bot.on_command('attic')
 @loading_status
-def handle_attic(command: Command) -> None:
+@streaming_response
+def handle_attic(command: Command):
     """
     `!attic [COURSE CODE]` - Returns a list of links to all documents in the course folder for UQ
     Attic, the unofficial exam solution and study material repository. Defaults to searching for
@@ -80,7 +101,7 @@ def handle_attic(command: Command) -> None:
                                   + f".folder'&pageSize=1000&key={API_KEY}")
     root_directory = requests.get(root_directory_request_url)
     if not root_directory.status_code == 200:
-        bot.post_message(channel, 'There was an error getting the root UQAttic directory.')
+        yield 'There was an error getting the root UQAttic directory.'
         return
     root_directory_data = root_directory.json()
 
@@ -91,25 +112,28 @@ def handle_attic(command: Command) -> None:
         if item['name'] == course_code
     ), None)
     if course is None:
-        bot.post_message(channel, f'No course folder found for {course_code}.')
+        yield f'No course folder found for {course_code}.'
         return
 
-    # Get all files in directory and subdirectories.
-    files = get_all_files(course)
+    # Get all files in directory and subdirectories, showing the files found so far after
+    # each folder is fetched for as long as they would still fit in the room.
+    files: List[dict] = []
+    for folder_files in iter_folder_files(course):
+        if not folder_files:
+            continue
+        files.extend(folder_files)
+        if len(files) > ROOM_FILE_LIMIT:
+            yield f'_Found {len(files)} UQAttic files for {course_code} so far, still looking..._'
+        else:
+            yield f'_Still looking..._\n{get_files_message(course, files)}'
+
+    if not files:
+        yield f'There were no files found in the {course_code} course folder.'
+        return
 
     # Determine whether to send to user or channel (based on number of responses).
     if len(files) > ROOM_FILE_LIMIT:
-        bot.post_message(channel, 'Too many files to list here, sent the list directly to '
-                                  f'<@{command.user_id}>.')
-        response_channel = command.user_id
-    else:
-        response_channel = channel
-
-    # Send response message with formatted list of files.
-    if len(files) > 0:
-        response_message = ('All of the UQAttic files found for the course'
-                            + f' <{BASE_FOLDER_URL}{course["id"]} | {course["name"]}>'
-                            + ' are listed below:\n' + '\n'.join(format_files(files)))
+        bot.post_message(command.user_id, get_files_message(course, files))
+        yield f'Too many files to list here, sent the list directly to <@{command.user_id}>.'
     else:
-        response_message = f'There were no files found in the {course_code} course folder.'
-    bot.post_message(response_channel, response_message)
+        yield get_files_message(course, files)
@@ -1,17 +1,40 @@
 from datetime import datetime
+from hashlib import sha1
+from typing import List, Tuple
 from icalendar import Calendar, Event
-from uuid import uuid4 as uuid
 from uqcsbot import bot, Command
+from uqcsbot.utils.cache_utils import TTLCache
 from uqcsbot.utils.command_utils import loading_status, success_status
 from uqcsbot.utils.uq_course_utils import (get_course_assessment,
-                                           get_parsed_assessment_due_date,
+                                           get_current_semester,
+                                           AssessmentItem,
+                                           ASSESSMENT_CACHE_TTL,
                                            HttpException,
                                            CourseNotFoundException,
-                                           ProfileNotFoundException,
-                                           DateSyntaxException)
+                                           ProfileNotFoundException)
 
 # Maximum number of courses supported by !calendar to reduce call abuse.
 COURSE_LIMIT = 6
+# Domain used to make event UIDs globally unique, as recommended by RFC 5545.
+UID_DOMAIN = 'uqcsbot.uqcs.org.au'
+# Calendars are kept for as long as the assessment they were compiled from.
+CALENDAR_CACHE_TTL = ASSESSMENT_CACHE_TTL
+
+# Compiled calendars, keyed by normalised course set, year and semester.
+CalendarKey = Tuple[Tuple[str, ...], int, int]
+_calendar_cache: TTLCache[CalendarKey, bytes] = TTLCache(CALENDAR_CACHE_TTL, maxsize=64)
+
+
+def get_event_uid(assessment_item: AssessmentItem) -> str:
+    """
+    Returns a UID for the given assessment item which is derived from its
+    course, task and due date, so that re-importing a calendar updates the
+    existing events rather than duplicating them.
+    """
+    item_key = '|'.join([assessment_item.course_name.upper(), assessment_item.task,
+                         assessment_item.due_date])
+    item_hash = sha1(item_key.encode('utf-8')).hexdigest()
+    return f'{item_hash}@{UID_DOMAIN}'
 
 
 def get_calendar(assessment):
@@ -20,29 +43,37 @@ def get_calendar(assessment):
     """
     calendar = Calendar()
     for assessment_item in assessment:
-        course, task, due_date, weight = assessment_item
         event = Event()
-        event['uid'] = str(uuid())
-        event['summary'] = f'{course} ({weight}): {task}'
-        try:
-            start_datetime, end_datetime = get_parsed_assessment_due_date(assessment_item)
-        except DateSyntaxException as e:
-            bot.logger.error(e.message)
-            # If we can't parse a date, set its due date to today
+        event['uid'] = get_event_uid(assessment_item)
+        event['summary'] = (f'{assessment_item.course_name} ({assessment_item.weight}):'
+                            f' {assessment_item.task}')
+        start_datetime, end_datetime = assessment_item.start, assessment_item.end
+        if assessment_item.parse_error is not None:
+            # If we couldn't parse a date, set its due date to today
             # and let the user know through its summary.
-            # TODO(mitch): Keep track of these instances to attempt to accurately
-            # parse them in future. Will require manual detection + parsing.
             start_datetime = end_datetime = datetime.today()
             event['summary'] = ("WARNING: DATE PARSING FAILED\n"
                                 "Please manually set date for event!\n"
                                 "The provided due date from UQ was"
-                                + f" '{due_date}\'. {event['summary']}")
+                                + f" '{assessment_item.due_date}\'. {event['summary']}")
         event.add('dtstart', start_datetime)
         event.add('dtend', end_datetime)
         calendar.add_component(event)
     return calendar.to_ical()
 
 
+def get_calendar_file(course_names: List[str]) -> bytes:
+    """
+    Returns the compiled calendar for the given courses. Calendars are cached
+    against the set of courses for the current semester, so the same courses
+    requested in any order or case are only compiled once.
+    """
+    course_codes = tuple(sorted({course_name.upper() for course_name in course_names}))
+    cache_key = (course_codes, datetime.today().year, get_current_semester())
+    return _calendar_cache.get_or_set(
+        cache_key, lambda: get_calendar(get_course_assessment(list(course_codes))))
+
+
 @bot.on_command('calendar')
 @success_status
 @loading_status
@@ -59,7 +90,7 @@ def handle_calendar(command: Command):
         return
 
     try:
-        assessment = get_course_assessment(course_names)
+        calendar_file = get_calendar_file(course_names)
     except HttpException as e:
         bot.logger.error(e.message)
         bot.post_message(channel, f'An error occurred, please try again.')
@@ -71,4 +102,4 @@ def handle_calendar(command: Command):
     user_direct_channel = bot.channels.get(command.user_id)
     bot.api.files.upload(title='Importable calendar containing your assessment!',
                          channels=user_direct_channel.id, filetype='text/calendar',
-                         filename='assessment.ics', file=get_calendar(assessment))
+                         filename='assessment.ics', file=calendar_file)
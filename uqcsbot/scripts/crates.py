@@ -1,17 +1,27 @@
 import argparse
 import json
+import math
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from enum import Enum
-from typing import NamedTuple, Union, Optional, List, Dict, Tuple
+from typing import NamedTuple, Union, Optional, List, Dict, Tuple, Callable
 
 import requests
 
 from uqcsbot import bot, Command
 from uqcsbot.api import Channel
+from uqcsbot.utils import crates_mirror
 from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
 
 BASE_URL = "https://crates.io/api/v1"
 MAX_LIMIT = 15  # The maximum number of search results from one call to the command
+# crates.io's crawler policy asks for an identifying user agent and at most one request a second
+USER_AGENT = 'uqcsbot (https://github.com/UQComputingSociety/uqcsbot)'
+REQUEST_INTERVAL = 1
+PAGE_FETCH_WORKERS = 4  # The maximum number of pages of results fetched at once
 
 # NamedTuple for the case that the argparse finds a -h flag
 HelpCommand = NamedTuple('HelpCommand', [('help_string', str)])
@@ -85,6 +95,31 @@ class TextBlock(SlackBlock):
                 'text': self.text}
 
 
+class RateLimiter:
+    """
+    Spaces out calls to wait() across every thread, so that no two return
+    within the given interval of each other
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+# Every request made with USER_AGENT shares this limit
+_rate_limiter = RateLimiter(REQUEST_INTERVAL)
+_page_executor = ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS)
+
+
 class SubCommand(Enum):
     """
     Distinguishes the type of sub command that was invoked
@@ -95,6 +130,17 @@ class SubCommand(Enum):
     USERS = 4
 
 
+@bot.on_schedule('cron', hour=4, minute=0, timezone='Australia/Brisbane',
+                 next_run_time=datetime.now())
+def refresh_crates_mirror():
+    """
+    Keeps the local crates.io mirror (if there is one) up to date with the
+    latest database dump, building it when the bot starts if needed.
+    """
+    if crates_mirror.refresh_mirror():
+        bot.logger.info('Rebuilt the crates.io mirror')
+
+
 @bot.on_command('crates')
 @loading_status
 def handle_crates(command: Command):
@@ -232,12 +278,34 @@ def handle_help_route(channel: Channel, args: HelpCommand):
     bot.post_message(channel, args.help_string)
 
 
+def get_crates_io(url: str, params: Optional[dict] = None) -> requests.Response:
+    """
+    Makes a GET request to the crates.io api, keeping to its crawler policy
+    """
+    _rate_limiter.wait()
+    return requests.get(url, params, headers={'User-Agent': USER_AGENT})
+
+
+def get_remaining_pages(get_page: Callable[[int], Optional[list]], page_count: int) -> list:
+    """
+    Concurrently gets every page of results after the first, up to the given
+    page count, and returns their results merged in order. Stops at the
+    first page which failed or had no results.
+    """
+    results: list = []
+    for page_results in _page_executor.map(get_page, range(2, page_count + 1)):
+        if not page_results:
+            break
+        results.extend(page_results)
+    return results
+
+
 def get_user_id(username: str) -> int:
     """
     Tries to get the users numerical id from their username. (Ex: BurntSushi -> 189). -1 on failure.
     """
     url = f'{BASE_URL}/users/{username}'
-    response = requests.get(url)
+    response = get_crates_io(url)
 
     # If there was a problem getting a response return -1
     if response.status_code != requests.codes.ok:
@@ -280,9 +348,15 @@ def get_crate_name_result(channel: Channel, name: str) -> Optional[CrateResult]:
     :param name: The name of the crate to search for
     :return: The api response as a dictionary or None on error
     """
+    # Use the local mirror if possible, only asking crates.io if it misses
+    raw_crate_result = crates_mirror.get_crate(name)
+    crate = None if raw_crate_result is None else convert_crate_result(raw_crate_result)
+    if crate is not None:
+        return crate
+
     url = f'{BASE_URL}/crates/{name}'
 
-    response = requests.get(url)
+    response = get_crates_io(url)
 
     # If there was a problem getting a response post a message to let the user know
     if response.status_code != requests.codes.ok:
@@ -381,13 +455,14 @@ def get_crates_search_results(channel: Channel,
     :param page: The page of the results to get from
     :return: (list of crates, total number of search results) or None if an error occurred
     """
-    params['page'] = page
+    # Pages may be fetched concurrently, so each gets its own copy of the parameters
+    params = {**params, 'page': page}
 
     if search:
         params['letter'] = search
 
     url = BASE_URL + '/crates'
-    response = requests.get(url, params)
+    response = get_crates_io(url, params)
 
     # If there was a problem getting a response post a message to let the user know
     if response.status_code != requests.codes.ok:
@@ -411,10 +486,32 @@ def get_crates_search_results(channel: Channel,
     return crates, total
 
 
+def get_crate_search_header_blocks(shown: int, total: int) -> List[dict]:
+    """
+    Returns the blocks which begin the message listing the results of a crate search
+    """
+    return [
+        create_slack_section_block(TextBlock(f'*Showing {shown} of {total} results*')),
+        create_slack_divider_block()
+    ]
+
+
 def handle_search_crates_route(channel: Channel, args: CrateSearch):
     """
     Handles what happens when a crates are being searched for through multiple criteria
     """
+    # Use the local mirror if possible, only asking crates.io if it finds nothing
+    mirror_result = crates_mirror.search_crates(args.search, args.category, args.user,
+                                                args.sort, args.limit)
+    if mirror_result is not None and mirror_result[0]:
+        raw_crates, total = mirror_result
+        crates = [crate for crate in map(convert_crate_result, raw_crates) if crate is not None]
+        blocks = get_crate_search_header_blocks(min(args.limit, total), total)
+        for crate in crates:
+            blocks.extend(get_crate_blocks(crate))
+        bot.post_message(channel, '', blocks=blocks)
+        return
+
     # Generate the parameters to search with
     params = {'sort': args.sort}
 
@@ -443,29 +540,18 @@ def handle_search_crates_route(channel: Channel, args: CrateSearch):
         bot.post_message(channel, "No crates were found")
         return
 
-    # The beginning of the formatted response
-    blocks = [
-        create_slack_section_block(TextBlock(f'*Showing {min(args.limit, total)}'
-                                             + f' of {total} results*')),
-        create_slack_divider_block()
-    ]
-
-    # Iterate over all of the crates or until limit is reached. Whichever comes first.
-    page = 1
-    remaining = args.limit
-    while remaining > 0:
-        amt = range(0, min(len(crates), remaining))
-        for index in amt:
-            crate = crates[index]
-            blocks.extend(get_crate_blocks(crate))
-            remaining -= 1
+    # Get the rest of the pages needed to reach the limit (now that the total is known)
+    def get_page_crates(page: int) -> Optional[List[CrateResult]]:
+        page_result = get_crates_search_results(channel, args.search, params, page)
+        return None if page_result is None else page_result[0]
 
-        page += 1
-        search_result = get_crates_search_results(channel, args.search, params, page)
-        if search_result is None or not search_result[0]:
-            break
+    page_count = math.ceil(min(args.limit, total) / len(crates))
+    crates.extend(get_remaining_pages(get_page_crates, page_count))
 
-        crates, _ = search_result
+    # The beginning of the formatted response
+    blocks = get_crate_search_header_blocks(min(args.limit, total), total)
+    for crate in crates[:args.limit]:
+        blocks.extend(get_crate_blocks(crate))
 
     bot.post_message(channel, '', blocks=blocks)
 
@@ -481,7 +567,7 @@ def get_category_page(channel: Channel, sort: str, page: int) -> Tuple[Optional[
     """
     # Get the categories
     url = BASE_URL + '/categories'
-    response = requests.get(url, {'sort': sort, 'page': page})  # type: ignore
+    response = get_crates_io(url, {'sort': sort, 'page': page})
 
     if response.status_code != requests.codes.ok:
         bot.post_message(channel, 'There was a problem getting the list of categories')
@@ -503,19 +589,19 @@ def display_all_categories(channel: Channel, args: CategorySearch):
     """
     Displays just the names of all the categories in one big list
     """
-    categories, total = get_category_page(channel, args.sort, 1)
+    # Use the local mirror if possible, otherwise get each page from crates.io
+    categories = crates_mirror.get_categories(args.sort)
+    total = len(categories)
+    if not categories:
+        categories, total = get_category_page(channel, args.sort, 1)
     if categories is None:
         return  # Error occurred
 
-    # Get all of the categories by incrementing page number
-    page = 2
-    while len(categories) < total:
-        next_cats, _ = get_category_page(channel, args.sort, page)
-        if next_cats is None or not next_cats:
-            break
-
-        categories.extend(next_cats)
-        page += 1
+    # Get the rest of the pages of categories (now that the total is known)
+    if categories and len(categories) < total:
+        page_count = math.ceil(total / len(categories))
+        categories.extend(get_remaining_pages(
+            lambda page: get_category_page(channel, args.sort, page)[0], page_count))
 
     # Begin formatting the message
     category_string = '\n'.join(categories)
@@ -534,21 +620,23 @@ def display_specific_category(channel: Channel, args: CategorySearch):
     category and the number of crates that falls into the algorithms category. A search for
     a crate with "!crates search" can be filtered based on these categories using the -c flag.
     """
-    # Get the categories
-    url = BASE_URL + f'/categories/{args.name}'
-    response = requests.get(url)
+    # Use the local mirror if possible, only asking crates.io if it misses
+    raw_category = crates_mirror.get_category(args.name)
+    if raw_category is None:
+        url = BASE_URL + f'/categories/{args.name}'
+        response = get_crates_io(url)
 
-    if response.status_code != requests.codes.ok:
-        bot.post_message(channel, f'There was a problem getting the category "{args.name}"')
-        return
+        if response.status_code != requests.codes.ok:
+            bot.post_message(channel, f'There was a problem getting the category "{args.name}"')
+            return
 
-    # Convert the json response
-    response_data = json.loads(response.content)
-    if 'errors' in response_data:
-        bot.post_message(channel, f'The category "{args.name}" does not exist')
-        return
+        # Convert the json response
+        response_data = json.loads(response.content)
+        if 'errors' in response_data:
+            bot.post_message(channel, f'The category "{args.name}" does not exist')
+            return
 
-    raw_category = response_data.get('category')
+        raw_category = response_data.get('category')
 
     name = raw_category.get('name')
     name = raw_category.get('id') if name is None else name
@@ -579,21 +667,23 @@ def handle_categories_route(channel: Channel, args: CategorySearch):
 
 def get_user(channel: Channel, username: str) -> Optional[UserResult]:
     """
-    Gets a UserResult by querying the crates.io api for the given username.
-    None on error.
+    Gets a UserResult by looking up the given username in the local mirror,
+    or querying the crates.io api if it isn't there. None on error.
     """
-    url = f'{BASE_URL}/users/{username}'
-    response = requests.get(url)
+    raw_user = crates_mirror.get_user(username)
+    if raw_user is None:
+        url = f'{BASE_URL}/users/{username}'
+        response = get_crates_io(url)
 
-    if response.status_code != requests.codes.ok:
-        bot.post_message(channel, 'There was a problem getting the user')
-        return None
+        if response.status_code != requests.codes.ok:
+            bot.post_message(channel, 'There was a problem getting the user')
+            return None
 
-    raw_user = json.loads(response.content).get('user')
+        raw_user = json.loads(response.content).get('user')
 
-    if raw_user is None or 'errors' in raw_user:
-        bot.post_message(channel, f'User "{username}" not found')
-        return None
+        if raw_user is None or 'errors' in raw_user:
+            bot.post_message(channel, f'User "{username}" not found')
+            return None
 
     user_id = raw_user.get('id', -1)
     login = raw_user.get('login', username)
@@ -1,14 +1,16 @@
 import argparse
 from uqcsbot import bot, Command
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from datetime import datetime
 from requests.exceptions import RequestException
 from typing import List
 from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
+from uqcsbot.utils.scraping_utils import get_soup
 import requests
 
 MAX_COUPONS = 10  # Prevents abuse
 COUPONESE_DOMINOS_URL = 'https://www.couponese.com/store/dominos.com.au/'
+COUPON_STRAINER = SoupStrainer(class_='ov-coupon')
 
 
 class Coupon:
@@ -89,7 +91,7 @@ def get_coupons_from_page(coupon_page: bytes) -> List[Coupon]:
     """
     Strips results from html page and returns a list of Coupon(s)
     """
-    soup = BeautifulSoup(coupon_page, 'html.parser')
+    soup = get_soup(coupon_page, parse_only=COUPON_STRAINER)
     soup_coupons = soup.find_all(class_="ov-coupon")
 
     coupons = []
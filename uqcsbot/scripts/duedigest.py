@@ -0,0 +1,160 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from uqcsbot import bot, Command
+from uqcsbot.models import CourseSubscription
+from uqcsbot.scripts.whatsdue import get_formatted_assessment_item
+from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
+from uqcsbot.utils.uq_course_utils import (get_course_profile_id,
+                                           get_each_course_assessment,
+                                           AssessmentItem,
+                                           HttpException,
+                                           CourseNotFoundException,
+                                           ProfileNotFoundException)
+
+# Maximum number of courses a single user can subscribe to.
+SUBSCRIPTION_LIMIT = 8
+# How far ahead the digest looks for assessment.
+DIGEST_PERIOD = timedelta(days=14)
+
+
+def get_subscribed_courses(user_id: str) -> List[str]:
+    """
+    Returns the course codes the given user is subscribed to.
+    """
+    session = bot.create_db_session()
+    subscriptions = session.query(CourseSubscription) \
+        .filter(CourseSubscription.user_id == user_id) \
+        .order_by(CourseSubscription.course_code).all()
+    session.close()
+    return [subscription.course_code for subscription in subscriptions]
+
+
+def subscribe(user_id: str, course_names: List[str]) -> str:
+    """
+    Subscribes the given user to the given courses, returning a response for them.
+    """
+    subscribed_courses = get_subscribed_courses(user_id)
+    course_codes = [name.upper() for name in course_names
+                    if name.upper() not in subscribed_courses]
+    if len(subscribed_courses) + len(course_codes) > SUBSCRIPTION_LIMIT:
+        return f'Cannot subscribe to more than {SUBSCRIPTION_LIMIT} courses.'
+    # Make sure every course exists before subscribing to any of them.
+    try:
+        for course_code in course_codes:
+            get_course_profile_id(course_code)
+    except HttpException as e:
+        bot.logger.error(e.message)
+        return 'An error occurred, please try again.'
+    except (CourseNotFoundException, ProfileNotFoundException) as e:
+        return e.message
+    session = bot.create_db_session()
+    session.add_all([CourseSubscription(user_id=user_id, course_code=course_code)
+                     for course_code in sorted(set(course_codes))])
+    session.commit()
+    session.close()
+    return get_subscriptions_message(user_id)
+
+
+def unsubscribe(user_id: str, course_names: List[str]) -> str:
+    """
+    Unsubscribes the given user from the given courses (or from every course,
+    if none are given), returning a response for them.
+    """
+    session = bot.create_db_session()
+    query = session.query(CourseSubscription).filter(CourseSubscription.user_id == user_id)
+    if course_names:
+        course_codes = [name.upper() for name in course_names]
+        query = query.filter(CourseSubscription.course_code.in_(course_codes))
+    query.delete(synchronize_session=False)
+    session.commit()
+    session.close()
+    return get_subscriptions_message(user_id)
+
+
+def get_subscriptions_message(user_id: str) -> str:
+    """
+    Returns a message listing the courses the given user is subscribed to.
+    """
+    subscribed_courses = get_subscribed_courses(user_id)
+    if not subscribed_courses:
+        return 'You are not subscribed to any courses.'
+    return ('You will be sent the assessment due each week for: '
+            + ', '.join(f'*{course_code}*' for course_code in subscribed_courses))
+
+
+def get_digest_message(course_codes: List[str],
+                       course_assessment: Dict[str, List[AssessmentItem]],
+                       digest_end: datetime) -> Optional[str]:
+    """
+    Returns the digest of the assessment due before the given time for the
+    given courses, or None if nothing is due.
+    """
+    assessment = sorted((item for course_code in course_codes
+                         for item in course_assessment.get(course_code, [])
+                         if item.parse_error is None and item.start <= digest_end),
+                        key=lambda item: (item.start, item.course_name))
+    missing_courses = [course_code for course_code in course_codes
+                       if course_code not in course_assessment]
+    if not assessment and not missing_courses:
+        return None
+    message = f'_Assessment due in the next {DIGEST_PERIOD.days} days:_\n>>>'
+    message += '\n'.join(map(get_formatted_assessment_item, assessment)) or 'Nothing!'
+    if missing_courses:
+        message += ('\n_Could not fetch the assessment for '
+                    + ', '.join(missing_courses) + ', try `!whatsdue`._')
+    return message
+
+
+@bot.on_command('duedigest')
+@loading_status
+def handle_duedigest(command: Command):
+    """
+    `!duedigest [subscribe|unsubscribe] [COURSE CODE 1] [COURSE CODE 2] ...` -
+    Subscribes to (or unsubscribes from) a weekly direct message of the
+    assessment due in the next two weeks for the given courses. If no courses
+    are given, subscribes to the course for the current channel, or
+    unsubscribes from every course. With no arguments, lists your subscriptions.
+    """
+    command_args = command.arg.split() if command.has_arg() else []
+    if not command_args:
+        response = get_subscriptions_message(command.user_id)
+    elif command_args[0] == 'subscribe':
+        channel = bot.channels.get(command.channel_id)
+        course_names = command_args[1:] or [channel.name]
+        response = subscribe(command.user_id, course_names)
+    elif command_args[0] == 'unsubscribe':
+        response = unsubscribe(command.user_id, command_args[1:])
+    else:
+        raise UsageSyntaxException()
+    bot.post_message(command.channel_id, response)
+
+
+@bot.on_schedule('cron', day_of_week='mon', hour=8, timezone='Australia/Brisbane')
+def send_assessment_digests():
+    """
+    Sends each subscribed user a digest of the assessment due in the next two
+    weeks for their courses. Each course is only fetched once, however many
+    users are subscribed to it.
+    """
+    session = bot.create_db_session()
+    subscriptions = session.query(CourseSubscription) \
+        .order_by(CourseSubscription.course_code).all()
+    session.close()
+    user_courses: Dict[str, List[str]] = defaultdict(list)
+    for subscription in subscriptions:
+        user_courses[subscription.user_id].append(subscription.course_code)
+
+    today = datetime.today()
+    course_codes = sorted({subscription.course_code for subscription in subscriptions})
+    course_assessment = get_each_course_assessment(course_codes, today)
+    for user_id, course_codes in user_courses.items():
+        message = get_digest_message(course_codes, course_assessment, today + DIGEST_PERIOD)
+        if message is None:
+            continue
+        direct_channel = bot.channels.get(user_id)
+        if direct_channel is None:
+            bot.logger.warning(f'Could not find direct channel for {user_id}')
+            continue
+        bot.post_message(direct_channel, message)
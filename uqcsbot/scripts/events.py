@@ -1,10 +1,17 @@
 import re
+import threading
 import requests
 
-from typing import List
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from heapq import merge
+from itertools import islice, takewhile
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Set
 from datetime import date, datetime, timedelta
 from calendar import month_name, month_abbr, day_abbr
-from icalendar import Calendar
+from apscheduler.jobstores.base import JobLookupError
+from humanize import naturaldelta
+from icalendar import Calendar, vRecur
 from slackblocks import Attachment, SectionBlock
 from pytz import timezone, utc
 from typing import Tuple, Optional
@@ -24,6 +31,45 @@ BRISBANE_TZ = timezone('Australia/Brisbane')
 MONTH_NUMBER = {month.lower(): index for index, month in enumerate(month_abbr)}
 
 MAX_RECURRING_EVENTS = 3
+# How far ahead recurring events are expanded when building an event index.
+RECURRENCE_HORIZON = timedelta(days=366)
+# How often the event index for each source is rebuilt in the background.
+EVENT_INDEX_REFRESH_MINUTES = 15
+EVENT_SOURCES = ["uqcs", "external", "itee"]
+SOURCE_NAMES = {"uqcs": "UQCS", "external": "external", "itee": "ITEE"}
+# How long !events waits for its sources, in seconds, before replying without the slow ones.
+SOURCE_TIMEOUT = 10
+# How long a single calendar request may take, in seconds.
+REQUEST_TIMEOUT = 30
+# The channel where new and moved events are announced, and reminders are posted.
+EVENTS_CHANNEL = "events"
+# The sources whose changes are announced and whose events get reminders.
+NOTIFY_SOURCES = ["uqcs", "external"]
+# How long before each event its reminder is posted.
+REMINDER_LEAD = timedelta(hours=1)
+# The length of a single period of recurrence rules which can be moved forward by whole periods.
+REBASEABLE_PERIODS = {'DAILY': timedelta(days=1), 'WEEKLY': timedelta(weeks=1)}
+
+# The last successful response for each calendar, along with its validators, so that an
+# unchanged calendar isn't transferred again. See get_calendar_file.
+CalendarResponse = NamedTuple('CalendarResponse', [('body', bytes), ('etag', Optional[str]),
+                                                   ('last_modified', Optional[str])])
+_calendar_responses: Dict[str, CalendarResponse] = {}
+# The most recently parsed Calendar for each calendar, along with the body it was parsed from.
+_parsed_calendars: Dict[str, Tuple[bytes, Calendar]] = {}
+_calendar_lock = threading.Lock()
+# The most recently built EventIndex for each source. See get_event_index.
+_event_indexes: Dict[str, 'EventIndex'] = {}
+_event_index_lock = threading.Lock()
+# The upcoming events from each source as of the last sync, keyed by uid. See sync_events.
+_event_snapshots: Dict[str, Dict[str, 'Event']] = {}
+# The ids of the reminder jobs scheduled for each source.
+_scheduled_reminders: Dict[str, Set[str]] = {}
+# Event sources are fetched concurrently, each in their own worker.
+_source_executor = ThreadPoolExecutor(max_workers=len(EVENT_SOURCES))
+# The build of each source's event index currently in progress, so that
+# there is at most one at a time. See start_event_index_build.
+_event_index_builds: Dict[str, Future] = {}
 
 
 class EventFilter(object):
@@ -52,15 +98,23 @@ class EventFilter(object):
             else:
                 return cls(cap=int(filter_str))
 
-    def filter_events(self, events: List['Event'], start_time: datetime):
+    def filter_events(self, indexes: List['EventIndex'], start_time: datetime) -> List['Event']:
+        """
+        Returns the events from the given indexes which start after the given
+        time and match this filter, merged in order of start time.
+        """
         if self._weeks is not None:
             end_time = start_time + timedelta(weeks=self._weeks)
-            return [e for e in events if e.start < end_time]
+            return list(merge(*(index.between(start_time, end_time) for index in indexes),
+                              key=lambda event: event.start))
         if self._month is not None:
-            return [e for e in events if e.start.month == self._month]
-        elif self._cap is not None:
-            return events[:self._cap]
-        return events
+            return list(merge(*(index.in_month(start_time, self._month) for index in indexes),
+                              key=lambda event: event.start))
+        events = merge(*(index.between(start_time) for index in indexes),
+                       key=lambda event: event.start)
+        if self._cap is not None:
+            return list(islice(events, self._cap))
+        return list(events)
 
     def get_header(self):
         if self._full:
@@ -84,7 +138,7 @@ class EventFilter(object):
 class Event(object):
     def __init__(self, start: datetime, end: datetime,
                  location: str, summary: str, recurring: bool,
-                 link: Optional[str], source: Optional[str] = None):
+                 link: Optional[str], source: Optional[str] = None, uid: Optional[str] = None):
         self.start = start
         self.end = end
         self.location = location
@@ -92,6 +146,8 @@ class Event(object):
         self.recurring = recurring
         self.link = link
         self.source = source
+        # Identifies the event (or, for recurring events, the series) within its source.
+        self.uid = uid
 
     @classmethod
     def encode_text(cls, text: str) -> str:
@@ -133,9 +189,10 @@ class Event(object):
                 end = datetime.combine(end, datetime.max.time()).astimezone(utc)
         location = cal_event.get('location', 'TBA')
         summary = cal_event.get('summary')
+        uid = cal_event.get('uid')
         return cls(start, end, location,
                    f"{'[External] ' if source == 'external' else ''}{summary}",
-                   recurrence_dt is not None, None, source)
+                   recurrence_dt is not None, None, source, None if uid is None else str(uid))
 
     @classmethod
     def from_seminar(cls, seminar_event: Tuple[str, str, datetime, str]):
@@ -143,9 +200,12 @@ class Event(object):
         # ITEE doesn't specify the length of seminars, but they are normally one hour
         end = start + timedelta(hours=1)
         # Note: this
-        return cls(start, end, location, f"[ITEE Seminar] {title}", False, link, "ITEE")
+        return cls(start, end, location, f"[ITEE Seminar] {title}", False, link, "ITEE", link)
 
-    def __str__(self):
+    def get_time_str(self) -> str:
+        """
+        Returns the start and end of the event in Brisbane time, e.g. 'TUE AUG 7 18:30 - 20:00'
+        """
         d1 = self.start.astimezone(BRISBANE_TZ)
         d2 = self.end.astimezone(BRISBANE_TZ)
 
@@ -156,6 +216,18 @@ class Event(object):
                        + f" {month_abbr[d2.month].upper()} {d2.day} {d2.hour}:{d2.minute:02}")
         else:
             end_str = f"{d2.hour}:{d2.minute:02}"
+        return f"{start_str} - {end_str}"
+
+    def get_attachment(self) -> Attachment:
+        """
+        Returns the event as a Slack attachment, coloured by its source.
+        """
+        color = "#5297D1" if self.source == "UQCS" else \
+            "#51237A" if self.source == "ITEE" else "#116B17"
+        return Attachment(SectionBlock(str(self)), color=color)
+
+    def __str__(self):
+        time_str = self.get_time_str()
 
         # Encode user-provided text to prevent certain characters
         # being interpreted as slack commands.
@@ -166,10 +238,72 @@ class Event(object):
             return f"{'*' if self.source == 'UQCS' else ''}" \
                    f"`{summary_str}`" \
                    f"{'*' if self.source == 'UQCS' else ''}\n" \
-                   f"*{start_str} - {end_str}* {'_(' + location_str + ')_' if location_str else ''}"
+                   f"*{time_str}* {'_(' + location_str + ')_' if location_str else ''}"
         else:
             return f"`<{self.link}|{summary_str}>`\n" \
-                   f"*{start_str} - {end_str}* {'_(' + location_str + ')_' if location_str else ''}"
+                   f"*{time_str}* {'_(' + location_str + ')_' if location_str else ''}"
+
+
+class EventIndex(object):
+    """
+    The upcoming events from a single source, sorted by start time so that the
+    events in any time range can be found by binary search rather than by
+    checking every event.
+    """
+    def __init__(self, events: Iterable[Event], built_at: datetime, is_current: bool = False):
+        """
+        If is_current is set, every event is considered upcoming regardless
+        of its start time (e.g. for sources which only list current events).
+        """
+        self.events = sorted(events, key=lambda event: event.start)
+        self._starts = [event.start for event in self.events]
+        self.built_at = built_at
+        self.is_current = is_current
+        # Changes only if the events themselves change, so that anything derived from
+        # the index only needs to be regenerated when the source has changed.
+        self.fingerprint = hash(tuple((event.uid, event.start, event.end, event.summary,
+                                       event.location, event.link) for event in self.events))
+
+    def between(self, start: datetime, end: Optional[datetime] = None) -> Iterator[Event]:
+        """
+        Yields the events starting after the given start time and (if given)
+        before the given end time, in order of start time.
+        """
+        # every event in a current index is upcoming, however long ago it started
+        return self._starting_between(None if self.is_current else start, end)
+
+    def _starting_between(self, start: Optional[datetime],
+                          end: Optional[datetime]) -> Iterator[Event]:
+        """
+        Yields the events starting after the given start time (if given) and
+        before the given end time (if given), whether or not the index is current.
+        """
+        low = 0 if start is None else bisect_right(self._starts, start)
+        high = len(self._starts) if end is None else bisect_left(self._starts, end, low)
+        return (self.events[i] for i in range(low, high))
+
+    def in_month(self, start: datetime, month: int) -> Iterator[Event]:
+        """
+        Yields the events starting after the given start time which fall in
+        the given month of any year (in Brisbane time), in order of start time.
+        """
+        if not self.events:
+            return
+        if self.is_current:
+            start = self._starts[0] - timedelta(microseconds=1)
+        last_year = self._starts[-1].astimezone(BRISBANE_TZ).year
+        for year in range(start.astimezone(BRISBANE_TZ).year, last_year + 1):
+            month_start = BRISBANE_TZ.localize(datetime(year, month, 1))
+            month_end = BRISBANE_TZ.localize(datetime(year + month // 12, month % 12 + 1, 1))
+            if month_end > start:
+                yield from self._starting_between(max(start, month_start), month_end)
+
+    def is_fresh(self, current_time: datetime) -> bool:
+        """
+        Returns whether the index was built recently enough to be used at the given time.
+        """
+        refresh_interval = timedelta(minutes=EVENT_INDEX_REFRESH_MINUTES)
+        return self.built_at <= current_time < self.built_at + refresh_interval
 
 
 def get_current_time():
@@ -180,12 +314,59 @@ def get_current_time():
     return datetime.now(tz=BRISBANE_TZ).astimezone(utc)
 
 
-def handle_calendar(calendar) -> List[Event]:
+def get_rebased_start(recurrence: vRecur, dtstart: datetime, after: datetime) -> datetime:
+    """
+    Returns a start time for the given recurrence rule which gives the same
+    occurrences after the given time as the original start time, but which
+    is as close to it as possible. Daily and weekly rules repeat every whole
+    period, so they are moved forward by whole periods. Other rules (and rules
+    with a COUNT, which is counted from the original start) are not moved.
+    """
+    period = REBASEABLE_PERIODS.get(recurrence['FREQ'][0])
+    if period is None or 'COUNT' in recurrence:
+        return dtstart
+    period *= int(recurrence.get('INTERVAL', [1])[0])
+    # Stop a period short, so that daylight saving changes can't skip an occurrence.
+    periods = (after - dtstart) // period - 1
+    return dtstart + periods * period if periods > 0 else dtstart
+
+
+def get_recurrences(component, after: datetime, before: datetime, count: int) -> List[datetime]:
     """
-    Returns a list of events from a calendar
+    Returns up to `count` of the occurrences of the given recurring event
+    which start between the given times. Occurrences are generated lazily from
+    the nearest whole period before `after`, so the cost doesn't grow with the
+    length of the series, even for rules with no end.
+    """
+    recurrence = component['RRULE']
+    # If the until date exists, update it to UTC. This is done on a copy, as
+    # parsed calendars are reused between calls.
+    if recurrence.get('UNTIL') is not None:
+        until = datetime.combine(recurrence['UNTIL'][0], datetime.min.time()) \
+                    .astimezone(utc)
+        recurrence = vRecur(recurrence)
+        recurrence['UNTIL'] = [until]
+    dtstart = component.get('DTSTART').dt
+    # As in Event.from_cal_event, all-day events start at midnight.
+    if not isinstance(dtstart, datetime):
+        dtstart = datetime.combine(dtstart, datetime.min.time()).astimezone(utc)
+    rule = rrulestr('\n'.join(
+            [f"RRULE:{recurrence.to_ical().decode()}"]
+            + [line for line in component.content_lines() if line.startswith('EXDATE')]
+        ), dtstart=get_rebased_start(recurrence, dtstart, after))
+    return list(takewhile(lambda dt: dt < before, rule.xafter(after, count=count)))
+
+
+def handle_calendar(calendar, source: str = "UQCS",
+                    current_time: Optional[datetime] = None) -> List[Event]:
+    """
+    Returns a list of the upcoming events from a calendar. Recurring events are
+    expanded up to RECURRENCE_HORIZON ahead of the current time.
     """
     events = []
-    current_time = get_current_time()
+    if current_time is None:
+        current_time = get_current_time()
+    horizon = current_time + RECURRENCE_HORIZON
     # subcomponents are how icalendar returns the list of things in the calendar
     for component in calendar.subcomponents:
         # we are only interested in ones with the name VEVENT as they
@@ -193,30 +374,211 @@ def handle_calendar(calendar) -> List[Event]:
         if component.name != 'VEVENT':
             continue
         elif component.get('RRULE') is not None:
-            # If the until date exists, update it to UTC
-            if component['RRULE'].get('UNTIL') is not None:
-                until = datetime.combine(component['RRULE']['UNTIL'][0], datetime.min.time()) \
-                            .astimezone(utc)
-                component['RRULE']['UNTIL'] = [until]
-            rule = rrulestr('\n'.join([
-                    line for line in component.content_lines()
-                    if line.startswith('RRULE')
-                    or line.startswith('EXDATE')
-                ]), dtstart=component.get('DTSTART').dt)
-            rule = [dt for dt in list(rule) if dt > current_time]
-            for dt in rule[:MAX_RECURRING_EVENTS]:
+            for dt in get_recurrences(component, current_time, horizon, MAX_RECURRING_EVENTS):
                 dt = dt.replace(tzinfo=BRISBANE_TZ)
-                event = Event.from_cal_event(component, recurrence_dt=dt)
+                event = Event.from_cal_event(component, source, recurrence_dt=dt)
                 events.append(event)
         else:
             # we convert it to our own event class
-            event = Event.from_cal_event(component)
+            event = Event.from_cal_event(component, source)
             # then we want to filter out any events that are not after the current time
             if event.start > current_time:
                 events.append(event)
 
     return events
 
+def get_seminar_events() -> List[Event]:
+    """
+    Returns the upcoming events from the ITEE seminars page. If the page could
+    not be loaded (e.g. it timed out), there are assumed to be no seminars.
+    """
+    try:
+        return [Event.from_seminar(seminar) for seminar in get_seminars()]
+    except (HttpException, InvalidFormatException) as e:
+        bot.logger.error(e.message)
+        return []
+    except requests.RequestException as e:
+        bot.logger.error(f'Could not load the ITEE seminars page: {e}')
+        return []
+
+
+def build_event_index(source: str, current_time: datetime) -> EventIndex:
+    """
+    Builds a new index of the upcoming events from the given source.
+    """
+    if source == "itee":
+        # The ITEE website only lists current events.
+        index = EventIndex(get_seminar_events(), current_time, is_current=True)
+    else:
+        events = handle_calendar(get_calendar(source), "UQCS" if source == "uqcs" else source,
+                                 current_time)
+        index = EventIndex(events, current_time)
+    with _event_index_lock:
+        _event_indexes[source] = index
+    return index
+
+
+def start_event_index_build(source: str, current_time: datetime) -> Future:
+    """
+    Starts building the index of upcoming events from the given source in
+    the background, and returns the future of the build. If the index is
+    already being built, the future of that build is returned instead.
+    """
+    with _event_index_lock:
+        future = _event_index_builds.get(source)
+        if future is not None:
+            return future
+        future = _source_executor.submit(build_event_index, source, current_time)
+        _event_index_builds[source] = future
+
+    def finish_build(finished: Future):
+        with _event_index_lock:
+            if _event_index_builds.get(source) is finished:
+                del _event_index_builds[source]
+
+    future.add_done_callback(finish_build)
+    return future
+
+
+def get_event_index(source: str) -> Future:
+    """
+    Returns the future index of upcoming events from the given source. Indexes
+    are kept up to date in the background, so this is only built on demand
+    if there is no recent index (e.g. just after startup).
+    """
+    current_time = get_current_time()
+    with _event_index_lock:
+        index = _event_indexes.get(source)
+    if index is not None and index.is_fresh(current_time):
+        future: Future = Future()
+        future.set_result(index)
+        return future
+    return start_event_index_build(source, current_time)
+
+
+@bot.on_schedule('interval', minutes=EVENT_INDEX_REFRESH_MINUTES)
+def refresh_event_indexes():
+    """
+    Rebuilds the event index for every source, so that !events doesn't have to
+    fetch or expand any calendars itself.
+    """
+    current_time = get_current_time()
+    futures = {source: start_event_index_build(source, current_time)
+               for source in EVENT_SOURCES}
+    for source, future in futures.items():
+        try:
+            index = future.result()
+        except Exception as e:
+            bot.logger.error(f"Could not refresh the {source} event index: {e}")
+            continue
+        if source in NOTIFY_SOURCES:
+            sync_events(source, index, current_time)
+
+
+def get_event_snapshot(index: EventIndex) -> Dict[str, Event]:
+    """
+    Returns the events in the given index keyed by uid. Recurring events are
+    represented by their next occurrence.
+    """
+    snapshot: Dict[str, Event] = {}
+    for event in index.events:
+        if event.uid is not None and event.uid not in snapshot:
+            snapshot[event.uid] = event
+    return snapshot
+
+
+def diff_event_snapshots(previous: Dict[str, Event], current: Dict[str, Event]) \
+        -> Tuple[List[Event], List[Tuple[Event, Event]]]:
+    """
+    Returns the events which are new in the current snapshot, and the (previous,
+    current) versions of the events which have moved since the previous snapshot.
+    The next occurrence of a recurring event changes as each one passes, so
+    recurring events are never considered moved.
+    """
+    new_events = [event for uid, event in current.items() if uid not in previous]
+    moved_events = [(previous[uid], event) for uid, event in current.items()
+                    if uid in previous and not event.recurring
+                    and (previous[uid].start, previous[uid].end) != (event.start, event.end)]
+    return new_events, moved_events
+
+
+def sync_events(source: str, index: EventIndex, current_time: datetime):
+    """
+    Compares the given freshly built index against the last one synced for the
+    source, announcing any new or moved events, then schedules a reminder
+    ahead of each upcoming event. Nothing is announced on the first sync, as
+    there is nothing to compare against.
+    """
+    snapshot = get_event_snapshot(index)
+    previous_snapshot = _event_snapshots.get(source)
+    _event_snapshots[source] = snapshot
+    if previous_snapshot is not None:
+        new_events, moved_events = diff_event_snapshots(previous_snapshot, snapshot)
+        channel = bot.channels.get(EVENTS_CHANNEL)
+        for event in new_events:
+            bot.post_message(channel, "_New event added:_",
+                             attachments=[event.get_attachment()._resolve()])
+        for previous_event, event in moved_events:
+            bot.post_message(channel, f"_Event moved from *{previous_event.get_time_str()}*:_",
+                             attachments=[event.get_attachment()._resolve()])
+    schedule_event_reminders(source, index, current_time)
+
+
+def schedule_event_reminders(source: str, index: EventIndex, current_time: datetime):
+    """
+    Ensures that a reminder is scheduled for each of the upcoming events in the
+    given index, and that reminders for events which have since moved or been
+    removed are cancelled.
+    """
+    reminders = {f"event-reminder:{source}:{event.uid}:{event.start.isoformat()}": event
+                 for event in index.between(current_time + REMINDER_LEAD)
+                 if event.uid is not None}
+    scheduled_reminders = _scheduled_reminders.setdefault(source, set())
+    for job_id in scheduled_reminders - reminders.keys():
+        try:
+            bot._scheduler.remove_job(job_id)
+        except JobLookupError:
+            # The reminder has already been posted.
+            pass
+    for job_id in reminders.keys() - scheduled_reminders:
+        event = reminders[job_id]
+        bot._scheduler.add_job(post_event_reminder, 'date', run_date=event.start - REMINDER_LEAD,
+                               args=[event], id=job_id, replace_existing=True)
+    _scheduled_reminders[source] = set(reminders)
+
+
+def post_event_reminder(event: Event):
+    """
+    Posts a reminder for the given event to the events channel.
+    """
+    bot.post_message(bot.channels.get(EVENTS_CHANNEL),
+                     f"_Starting in {naturaldelta(REMINDER_LEAD)}:_",
+                     attachments=[event.get_attachment()._resolve()])
+
+
+def get_event_indexes(sources: List[str]) -> Tuple[List[EventIndex], List[str]]:
+    """
+    Returns the event indexes for the given sources, fetching any sources
+    without a fresh index concurrently. Sources which fail or take longer
+    than SOURCE_TIMEOUT are left out, and returned separately. A source which
+    timed out is still indexed once it loads, ready for the next call.
+    """
+    futures = [get_event_index(source) for source in sources]
+    done, _ = wait(futures, timeout=SOURCE_TIMEOUT)
+    indexes, missing_sources = [], []
+    for source, future in zip(sources, futures):
+        if future not in done:
+            bot.logger.error(f"Timed out loading the {source} event index")
+            missing_sources.append(source)
+            continue
+        try:
+            indexes.append(future.result())
+        except Exception as e:
+            bot.logger.error(f"Could not load the {source} event index: {e}")
+            missing_sources.append(source)
+    return indexes, missing_sources
+
+
 @bot.on_command('events')
 @loading_status
 def handle_events(command: Command):
@@ -243,55 +605,80 @@ def handle_events(command: Command):
     if not event_filter.is_valid:
         raise UsageSyntaxException()
 
-    events = []
-
-    if source_get["uqcs"]:
-        uqcs_calendar = Calendar.from_ical(get_calendar_file("uqcs"))
-        events += handle_calendar(uqcs_calendar)
-    if source_get["external"]:
-        external_calendar = Calendar.from_ical(get_calendar_file("external"))
-        events += handle_calendar(external_calendar)
-    if source_get["itee"]:
-        try:
-            # Try to include events from the ITEE seminars page
-            seminars = get_seminars()
-            for seminar in seminars:
-                # The ITEE website only lists current events.
-                event = Event.from_seminar(seminar)
-                events.append(event)
-        except (HttpException, InvalidFormatException) as e:
-            bot.logger.error(e.message)
-
-    # then we apply our event filter as generated earlier
-    events = event_filter.filter_events(events, current_time)
-    # then, we sort the events by date
-    events = sorted(events, key=lambda event_: event_.start)
+    indexes, missing_sources = get_event_indexes([source for source in EVENT_SOURCES
+                                                  if source_get[source]])
+    # then we apply our event filter as generated earlier, which returns the events by date
+    events = event_filter.filter_events(indexes, current_time)
 
-    attachments = []
+    attachments = [event.get_attachment() for event in events]
     if not events:
         message_text = f"_{event_filter.get_no_result_msg()}_\n" \
                        f"For a full list of events, visit: " \
                        f"https://uqcs.org/events " \
                        f"and https://www.itee.uq.edu.au/seminar-list"
     else:
-        for event in events:
-            color = "#5297D1" if event.source == "UQCS" else \
-                "#51237A" if event.source == "ITEE" else "#116B17"
-            attachments.append(Attachment(SectionBlock(str(event)), color=color))
         message_text = f"_{event_filter.get_header()}_"
+    if missing_sources:
+        missing_names = ", ".join(SOURCE_NAMES[source] for source in missing_sources)
+        message_text += f"\n_Note: {missing_names} events couldn't be loaded in time," \
+                        f" so they aren't included. Try again shortly._"
 
     bot.post_message(command.channel_id, text=message_text,
                      attachments=[attachment._resolve() for attachment in attachments])
 
 
+def get_calendar(calendar: str = "uqcs") -> Calendar:
+    """
+    Returns the parsed UQCS or External Events calendar. The calendar is only
+    re-parsed if its file has changed since it was last parsed.
+    """
+    body = get_calendar_file(calendar)
+    with _calendar_lock:
+        parsed = _parsed_calendars.get(calendar)
+        # An unchanged calendar file is returned as the same object, so this is cheap.
+        if parsed is not None and parsed[0] is body:
+            return parsed[1]
+    parsed_calendar = Calendar.from_ical(body)
+    with _calendar_lock:
+        _parsed_calendars[calendar] = (body, parsed_calendar)
+    return parsed_calendar
+
+
 def get_calendar_file(calendar: str = "uqcs") -> bytes:
     """
     Loads the UQCS or External Events calender .ics file from Google Calendar.
+    The validators from the last response are sent with each request, so if
+    the calendar hasn't changed since, the previous file is returned without
+    being transferred again. If the request fails, the previous file is used.
     This method is mocked by unit tests.
     :return: The returned ics calendar file, as a stream
     """
-    if calendar == "uqcs":
-        http_response = requests.get(UQCS_CALENDAR_URL)
-    else:
-        http_response = requests.get(EXTERNAL_CALENDAR_URL)
+    url = UQCS_CALENDAR_URL if calendar == "uqcs" else EXTERNAL_CALENDAR_URL
+    with _calendar_lock:
+        previous_response = _calendar_responses.get(calendar)
+    headers = {}
+    if previous_response is not None:
+        if previous_response.etag is not None:
+            headers['If-None-Match'] = previous_response.etag
+        if previous_response.last_modified is not None:
+            headers['If-Modified-Since'] = previous_response.last_modified
+    try:
+        http_response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        if previous_response is None:
+            raise
+        bot.logger.error(f'Could not fetch the {calendar} calendar, using the last copy: {e}')
+        return previous_response.body
+    if http_response.status_code == requests.codes.not_modified and previous_response:
+        return previous_response.body
+    if http_response.status_code != requests.codes.ok:
+        if previous_response is None:
+            return http_response.content
+        bot.logger.error(f'Received status code {http_response.status_code} for the'
+                         f' {calendar} calendar, using the last copy')
+        return previous_response.body
+    with _calendar_lock:
+        _calendar_responses[calendar] = CalendarResponse(http_response.content,
+                                                         http_response.headers.get('ETag'),
+                                                         http_response.headers.get('Last-Modified'))
     return http_response.content
@@ -0,0 +1,150 @@
+import json
+import os
+import socketserver
+import threading
+from hashlib import sha1
+from heapq import merge
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from icalendar import Calendar, Event as CalendarEvent
+
+from uqcsbot import bot
+from uqcsbot.scripts.events import (Event, EVENT_SOURCES, EVENT_INDEX_REFRESH_MINUTES,
+                                    get_event_indexes)
+
+# The merged events are only served if a port is given, e.g. for a reverse proxy to expose.
+EVENTS_FEED_PORT = os.environ.get('EVENTS_FEED_PORT')
+EVENTS_FEED_HOST = os.environ.get('EVENTS_FEED_HOST', '127.0.0.1')
+FEED_CONTENT_TYPES = {'/events.ics': 'text/calendar; charset=utf-8',
+                      '/events.json': 'application/json; charset=utf-8'}
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    An HTTP server handling each request in its own thread, as
+    http.server.ThreadingHTTPServer does from Python 3.7.
+    """
+    daemon_threads = True
+
+
+EventsFeed = NamedTuple('EventsFeed', [('ical', bytes), ('json', bytes), ('etag', str)])
+# The current feed, along with the sources and index fingerprints it was generated from.
+_events_feed: Optional[Tuple[tuple, EventsFeed]] = None
+_events_feed_lock = threading.Lock()
+_events_feed_server: Optional[ThreadingHTTPServer] = None
+
+
+def get_feed_uid(event: Event) -> str:
+    """
+    Returns a uid for the given event which is unique within the feed. Each
+    occurrence of a recurring event is listed separately, so they need their own.
+    """
+    if event.recurring:
+        return f'{event.uid}-{event.start:%Y%m%dT%H%M%S%z}'
+    return event.uid or f'{event.summary}-{event.start:%Y%m%dT%H%M%S%z}'
+
+
+def get_events_ical(events: List[Event]) -> bytes:
+    """
+    Returns a compiled calendar containing the given events.
+    """
+    calendar = Calendar()
+    calendar.add('prodid', '-//UQCS//uqcsbot events//EN')
+    calendar.add('version', '2.0')
+    calendar.add('x-wr-calname', 'UQCS Events')
+    for event in events:
+        calendar_event = CalendarEvent()
+        calendar_event['uid'] = get_feed_uid(event)
+        calendar_event['summary'] = event.summary
+        calendar_event.add('dtstart', event.start)
+        calendar_event.add('dtend', event.end)
+        if event.location:
+            calendar_event['location'] = event.location
+        if event.link is not None:
+            calendar_event['url'] = event.link
+        calendar.add_component(calendar_event)
+    return calendar.to_ical()
+
+
+def get_events_json(events: List[Event]) -> bytes:
+    """
+    Returns the given events as a JSON list.
+    """
+    return json.dumps([{'uid': get_feed_uid(event), 'summary': event.summary,
+                        'start': event.start.isoformat(), 'end': event.end.isoformat(),
+                        'location': event.location, 'link': event.link,
+                        'source': event.source, 'recurring': event.recurring}
+                       for event in events]).encode('utf-8')
+
+
+def get_events_feed() -> EventsFeed:
+    """
+    Returns the feed of the merged upcoming events from every source. The
+    feed is only regenerated when the events from one of the sources change.
+    """
+    global _events_feed
+    indexes, missing_sources = get_event_indexes(EVENT_SOURCES)
+    sources = [source for source in EVENT_SOURCES if source not in missing_sources]
+    feed_key = tuple(zip(sources, (index.fingerprint for index in indexes)))
+    with _events_feed_lock:
+        if _events_feed is not None and _events_feed[0] == feed_key:
+            return _events_feed[1]
+    events = list(merge(*(index.events for index in indexes), key=lambda event: event.start))
+    ical = get_events_ical(events)
+    feed = EventsFeed(ical, get_events_json(events), sha1(ical).hexdigest())
+    with _events_feed_lock:
+        _events_feed = (feed_key, feed)
+    return feed
+
+
+class EventsFeedHandler(BaseHTTPRequestHandler):
+    """
+    Serves the events feed as /events.ics and /events.json.
+    """
+    def do_GET(self):
+        path = urlparse(self.path).path
+        content_type = FEED_CONTENT_TYPES.get(path)
+        if content_type is None:
+            self.send_error(404)
+            return
+        feed = get_events_feed()
+        body = feed.ical if path == '/events.ics' else feed.json
+        etag = f'"{feed.etag}{os.path.splitext(path)[1]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', f'max-age={EVENT_INDEX_REFRESH_MINUTES * 60}')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        bot.logger.debug(f'Events feed: {format % args}')
+
+
+def create_events_feed_server(host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Creates a server for the events feed and starts serving it in the background.
+    """
+    server = ThreadingHTTPServer((host, port), EventsFeedHandler)
+    threading.Thread(target=server.serve_forever, name='events-feed', daemon=True).start()
+    return server
+
+
+@bot.on('hello')
+def start_events_feed(evt: dict):
+    """
+    Starts serving the events feed once connected, if a port has been configured.
+    """
+    global _events_feed_server
+    if EVENTS_FEED_PORT is None or _events_feed_server is not None:
+        return
+    _events_feed_server = create_events_feed_server(EVENTS_FEED_HOST, int(EVENTS_FEED_PORT))
+    bot.logger.info(f'Serving the events feed on {EVENTS_FEED_HOST}:{EVENTS_FEED_PORT}')
@@ -1,8 +1,12 @@
 from uqcsbot import bot
+from uqcsbot.models import PinnedMessage
 from datetime import datetime
+from typing import Optional
 from pytz import timezone, utc
 from random import choice
 
+BRISBANE_TIMEZONE = timezone('Australia/Brisbane')
+
 
 class Pin:
     """
@@ -22,30 +26,119 @@ class Pin:
         return bot.channels.get(self.channel)
 
 
-@bot.on_schedule('cron', hour=12, minute=0, timezone='Australia/Brisbane')
-def daily_history() -> None:
+def get_pinned_message(channel_id: str, message: dict) -> Optional[PinnedMessage]:
     """
-    Selets a random pin that was posted on this date some years ago,
-    and reposts it in the same channel
+    Returns the index entry for the given message pinned in the given
+    channel, or None if it shouldn't be indexed.
     """
-    anniversary = []
-    today = datetime.now(utc).astimezone(timezone('Australia/Brisbane')).date()
+    channel = bot.channels.get(channel_id)
+    # Only pins from public channels are reposted
+    if channel is None or channel.is_im or channel.is_private or 'user' not in message:
+        return None
+    # messily get the date the pin was originally posted
+    pin_date = (datetime.fromtimestamp(int(float(message['ts'])), tz=utc)
+                .astimezone(BRISBANE_TIMEZONE).date())
+    return PinnedMessage(channel_id=channel_id, message_ts=message['ts'], year=pin_date.year,
+                         month=pin_date.month, day=pin_date.day, user=message['user'],
+                         text=message['text'])
 
-    # for every channel
+
+def index_pins() -> int:
+    """
+    Indexes the pins of every non-archived public channel, returning the
+    number of pins indexed. This calls the Slack API once per channel, so is
+    only done when the index is empty; afterwards it is kept current by
+    pin_added and pin_removed events.
+    """
+    pinned_messages = []
     for channel in bot.api.conversations.list(types="public_channel")['channels']:
         # skip archived channels
-        if channel['is_archived']:
+        if channel.get('is_archived', False):
             continue
-
         for pin in bot.api.pins.list(channel=channel['id'])['items']:
-            # messily get the date the pin was originally posted
-            pin_date = (datetime.fromtimestamp(int(float(pin['message']['ts'])), tz=utc)
-                        .astimezone(timezone('Australia/Brisbane')).date())
-            # if same date as today
-            if pin_date.month == today.month and pin_date.day == today.day:
-                # add pin to possibilities
-                anniversary.append(Pin(channel=channel['name'], years=today.year-pin_date.year,
-                                       user=pin['message']['user'], text=pin['message']['text']))
+            if pin.get('type') != 'message':
+                continue
+            pinned_message = get_pinned_message(channel['id'], pin['message'])
+            if pinned_message is not None:
+                pinned_messages.append(pinned_message)
+
+    session = bot.create_db_session()
+    for pinned_message in pinned_messages:
+        session.merge(pinned_message)
+    session.commit()
+    session.close()
+    return len(pinned_messages)
+
+
+@bot.on('hello')
+def bootstrap_pin_index(evt: dict):
+    """
+    Builds the pin index on first connection, if it's empty.
+    """
+    session = bot.create_db_session()
+    is_empty = session.query(PinnedMessage).first() is None
+    session.close()
+    if is_empty:
+        bot.logger.info(f'Indexed {index_pins()} pins')
+
+
+@bot.on('pin_added')
+def handle_pin_added(evt: dict):
+    """
+    Adds a newly pinned message to the pin index.
+    """
+    item = evt.get('item', {})
+    if item.get('type') != 'message':
+        return
+    pinned_message = get_pinned_message(evt['channel_id'], item['message'])
+    if pinned_message is None:
+        return
+    session = bot.create_db_session()
+    session.merge(pinned_message)
+    session.commit()
+    session.close()
+
+
+@bot.on('pin_removed')
+def handle_pin_removed(evt: dict):
+    """
+    Removes an unpinned message from the pin index.
+    """
+    item = evt.get('item', {})
+    if item.get('type') != 'message':
+        return
+    session = bot.create_db_session()
+    session.query(PinnedMessage) \
+        .filter(PinnedMessage.channel_id == evt['channel_id'],
+                PinnedMessage.message_ts == item['message']['ts']) \
+        .delete(synchronize_session=False)
+    session.commit()
+    session.close()
+
+
+@bot.on_schedule('cron', hour=12, minute=0, timezone='Australia/Brisbane')
+def daily_history() -> None:
+    """
+    Selets a random pin that was posted on this date some years ago,
+    and reposts it in the same channel. Pins are looked up from the pin
+    index, so no Slack API calls are needed to find them.
+    """
+    today = datetime.now(utc).astimezone(BRISBANE_TIMEZONE).date()
+
+    session = bot.create_db_session()
+    pinned_messages = session.query(PinnedMessage) \
+        .filter(PinnedMessage.month == today.month, PinnedMessage.day == today.day).all()
+    session.close()
+
+    anniversary = []
+    for pinned_message in pinned_messages:
+        # skip channels which have since been archived
+        channel = bot.channels.get(pinned_message.channel_id)
+        if channel is None or channel.is_archived:
+            continue
+        anniversary.append(Pin(channel=pinned_message.channel_id,
+                               years=today.year-pinned_message.year,
+                               user=pinned_message.user, text=pinned_message.text))
 
     # if no pins were posted on this date, do nothing
     if not anniversary:
@@ -1,6 +1,7 @@
 from uqcsbot import bot
 from uqcsbot.utils.command_utils import HYPE_REACTS
-from bs4 import BeautifulSoup
+from uqcsbot.utils.scraping_utils import get_soup
+from bs4 import SoupStrainer
 from datetime import datetime
 from random import choice
 from requests.exceptions import RequestException
@@ -10,6 +11,7 @@ from typing import List
 
 HOLIDAY_URL = "https://www.timeanddate.com/holidays/fun/"
 HOLIDAY_CSV_PATH = "uqcsbot/static/geek_holidays.csv"
+HOLIDAY_STRAINER = SoupStrainer(class_=["c0", "c1", "hl"])
 
 
 class Holiday:
@@ -63,7 +65,7 @@ def get_holidays_from_page(holiday_page) -> List[Holiday]:
     """
     Strips results from html page
     """
-    soup = BeautifulSoup(holiday_page, 'html.parser')
+    soup = get_soup(holiday_page, parse_only=HOLIDAY_STRAINER)
     soup_holidays = (soup.find_all(class_="c0") + soup.find_all(class_="c1")
                      + soup.find_all(class_="hl"))
 
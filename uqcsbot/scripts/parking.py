@@ -1,9 +1,12 @@
 from uqcsbot import bot, Command
 from uqcsbot.utils.command_utils import loading_status
-from typing import Tuple
+from uqcsbot.utils.scraping_utils import get_soup
+from typing import List, Tuple
 
 import requests
-from bs4 import BeautifulSoup as Soup
+from bs4 import SoupStrainer
+
+PARKING_TABLE_STRAINER = SoupStrainer("table", attrs={"id": "parkingAvailability"})
 
 
 def get_pf_parking_data() -> Tuple[int, str]:
@@ -14,6 +17,16 @@ def get_pf_parking_data() -> Tuple[int, str]:
     return (page.status_code, page.text)
 
 
+def get_parking_areas(data: str) -> List[List[str]]:
+    """
+    Returns the cells of each row of the parking availability table
+    """
+    table = get_soup(data, parse_only=PARKING_TABLE_STRAINER).find("table")
+    rows = table.find_all("tr")[1:]
+    # split and join for single space whitespace
+    return [[" ".join(i.get_text().split()) for i in j.find_all("td")] for j in rows]
+
+
 @bot.on_command("parking")
 @loading_status
 def handle_parking(command: Command) -> None:
@@ -52,13 +65,7 @@ def handle_parking(command: Command) -> None:
             return "Few"
         return fill
 
-    # find parks
-    table = Soup(data, "html.parser").find("table", attrs={"id": "parkingAvailability"})
-    rows = table.find_all("tr")[1:]
-    # split and join for single space whitespace
-    areas = [[" ".join(i.get_text().split()) for i in j.find_all("td")] for j in rows]
-
-    for area in areas:
+    for area in get_parking_areas(data):
         if area[2]:
             response.append(f"{category(area[2])} Carparks Available in {names[area[0]]}")
         elif permit and area[1]:
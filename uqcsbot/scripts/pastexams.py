@@ -1,8 +1,12 @@
 from uqcsbot import bot, Command
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Iterable, Tuple
 import requests
 from uqcsbot.utils.command_utils import loading_status
+from uqcsbot.utils.scraping_utils import get_soup
+
+# The 'no results' notice is within the page div, and the exams are in the main table.
+EXAM_PAGE_STRAINER = SoupStrainer(class_=['page', 'maintable'])
 
 
 @bot.on_command('pastexams')
@@ -57,8 +61,15 @@ def get_past_exams(course_code: str) -> str:
     if http_response.status_code != requests.codes.ok:
         return "There was a problem getting a response"
 
+    return get_past_exams_from_page(course_code, http_response.content)
+
+
+def get_past_exams_from_page(course_code: str, exam_page: bytes) -> str:
+    """
+    Returns the past exams message for the given course from the given exam page.
+    """
     # Check if the course code exists
-    soup = BeautifulSoup(http_response.content, 'html.parser')
+    soup = get_soup(exam_page, parse_only=EXAM_PAGE_STRAINER)
     no_course = soup.find('div', class_='page').find('div').contents[0]
     if "Sorry. We have not found any past exams for this course" in no_course:
         return f"The course code {course_code} did not return any results"
@@ -2,24 +2,34 @@ import argparse
 import base64
 import json
 import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from functools import partial
-from typing import List, Dict, Union, NamedTuple, Optional, Callable, Set
+from functools import lru_cache, partial
+from typing import List, Dict, Union, NamedTuple, Optional, Callable, Set, Tuple, Deque
 
 import requests
 
 from uqcsbot import bot, Command
 from uqcsbot.api import Channel
+from uqcsbot.models import TriviaScore
 from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
 
 API_URL = "https://opentdb.com/api.php"
 CATEGORIES_URL = "https://opentdb.com/api_category.php"
+TOKEN_URL = "https://opentdb.com/api_token.php"
 
 # NamedTuple for use with the data returned from the api
 QuestionData = NamedTuple('QuestionData',
                           [('type', str), ('question', str), ('correct_answer', str),
                            ('answers', List[str]), ('is_boolean', bool)])
 
+# The options a question was asked for: (category, difficulty, type). Questions are
+# pooled for each combination of options, as that's what OpenTDB filters them by.
+PoolKey = Tuple[int, str, str]
+
 # Contains information about a reaction and the list of users who used said reaction
 ReactionUsers = NamedTuple('ReactionUsers', [('name', str), ('users', Set[str])])
 
@@ -38,20 +48,97 @@ BOOLEAN_REACTS = ['this', 'not-this']  # Format of [ <True>, <False> ]
 MULTIPLE_CHOICE_REACTS = ['green_heart', 'yellow_heart', 'heart', 'blue_heart']
 CHOICE_COLORS = ['#6C9935', '#F3C200', '#B6281E', '#3176EF']
 
+# Questions are fetched from OpenTDB in batches of this many (the most it allows),
+# and each pool is refilled in the background once it has fewer than REFILL_THRESHOLD.
+POOL_BATCH_SIZE = 50
+REFILL_THRESHOLD = 10
+# Number of attempts made to fetch a batch of questions, and the number of seconds to
+# wait after being rate limited (OpenTDB allows one request every 5 seconds).
+FETCH_ATTEMPTS = 3
+RATE_LIMIT_SECONDS = 5
+REQUEST_TIMEOUT = 10
+
+# Number of seconds between a question's answer and the next sequential question
+SEQUENTIAL_QUESTION_DELAY = 5
+# Number of users shown on the leaderboard
+LEADERBOARD_SIZE = 10
+
 # What arguments to use for the cron job version
 CRON_CHANNEL = 'trivia'
 # (One day - 15 seconds) Overrides any -s argument below and ignores MAX_SECONDS rule
 CRON_SECONDS = 86385
 CRON_ARGUMENTS = ''
 
+# Pools of fetched but not yet asked questions
+_question_pools: Dict[PoolKey, Deque[QuestionData]] = defaultdict(deque)
+_refilling_pools: Set[PoolKey] = set()
+_pools_lock = threading.Lock()
+# Refills are made one at a time to stay within OpenTDB's rate limit.
+_refill_executor = ThreadPoolExecutor(max_workers=1)
+# Questions waiting to be answered, keyed by the (channel id, ts) of the message to react to
+_sessions: Dict[Tuple[str, str], 'TriviaSession'] = {}
+_sessions_lock = threading.Lock()
+# The OpenTDB session token, which stops questions from being repeated.
+_session_token: Optional[str] = None
+_session_token_lock = threading.Lock()
+
+
+class TriviaSession:
+    """
+    A question which is waiting to be answered. Votes are tracked from reaction
+    events as they arrive, and are scored once the question's time is up.
+    """
+    def __init__(self, channel: Channel, message_ts: str, question_data: QuestionData,
+                 args: argparse.Namespace):
+        self.channel = channel
+        self.channel_id = channel if isinstance(channel, str) else channel.id
+        self.message_ts = message_ts
+        self.question_data = question_data
+        self.args = args
+        reactions = BOOLEAN_REACTS if question_data.is_boolean else MULTIPLE_CHOICE_REACTS
+        self.votes = {reaction: ReactionUsers(reaction, set()) for reaction in reactions}
+        self.correct_reaction = get_correct_reaction(question_data)
+        self._lock = threading.Lock()
+
+    def add_vote(self, user: str, reaction: str):
+        with self._lock:
+            if reaction in self.votes:
+                self.votes[reaction].users.add(user)
+
+    def remove_vote(self, user: str, reaction: str):
+        with self._lock:
+            if reaction in self.votes:
+                self.votes[reaction].users.discard(user)
+
+    def get_results(self) -> Tuple[Set[str], Set[str]]:
+        """
+        Returns the users who answered and the users who answered correctly.
+        Users who voted for more than one answer don't count as answering.
+        """
+        with self._lock:
+            voters = [user for vote in self.votes.values() for user in vote.users]
+            answered = {user for user in voters if voters.count(user) == 1}
+            correct = answered & self.votes[self.correct_reaction].users
+        return answered, correct
+
+
+class TriviaException(Exception):
+    """
+    Raised when questions could not be fetched from OpenTDB.
+    """
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
 
 @bot.on_command('trivia')
 @loading_status
 def handle_trivia(command: Command):
     """
     `!trivia [-d <easy|medium|hard>] [-c <CATEGORY>]
-             [-t <multiple|tf>] [-s <N>] [-n <N>] [--cats]`
-        - Asks a new trivia question
+             [-t <multiple|tf>] [-s <N>] [-n <N>] [--cats] [--leaderboard]`
+        - Asks a new trivia question. Answer by reacting, and see who has
+        answered the most questions correctly with --leaderboard
     """
     args = parse_arguments(command.channel_id, command.arg if command.has_arg() else '')
 
@@ -64,6 +151,10 @@ def handle_trivia(command: Command):
         bot.post_message(command.channel_id, get_categories())
         return
 
+    if args.leaderboard:
+        bot.post_message(command.channel_id, get_leaderboard(command.channel_id))
+        return
+
     # Check if the channel is valid for sequential questions
     current_channel = bot.channels.get(command.channel_id)
     if all([args.count > 1, not current_channel.is_im,
@@ -111,6 +202,8 @@ def parse_arguments(channel: Channel, arg_string: str) -> argparse.Namespace:
                         f"quick succession (max : {MAX_SEQUENTIAL_QUESTIONS})")
     parser.add_argument('--cats', action='store_true',
                         help='Sends a list of valid categories to the user')
+    parser.add_argument('--leaderboard', action='store_true',
+                        help="Sends the channel's trivia leaderboard")
     parser.add_argument('-h', '--help', action='store_true', help='Prints this help message')
 
     args = parser.parse_args(arg_string.split())
@@ -134,15 +227,26 @@ def parse_arguments(channel: Channel, arg_string: str) -> argparse.Namespace:
     return args
 
 
-def get_categories() -> str:
+@lru_cache(maxsize=None)
+def get_category_list() -> List[dict]:
     """
-    Gets the message to send if the user wants a list of the available categories.
+    Returns the trivia categories available from OpenTDB. These never change,
+    so are only fetched once (unless fetching them fails).
     """
-    http_response = requests.get(CATEGORIES_URL)
+    http_response = requests.get(CATEGORIES_URL, timeout=REQUEST_TIMEOUT)
     if http_response.status_code != requests.codes.ok:
-        return "There was a problem getting the response"
+        raise TriviaException("There was a problem getting the response")
+    return json.loads(http_response.content)['trivia_categories']
 
-    categories = json.loads(http_response.content)['trivia_categories']
+
+def get_categories() -> str:
+    """
+    Gets the message to send if the user wants a list of the available categories.
+    """
+    try:
+        categories = get_category_list()
+    except TriviaException as e:
+        return e.message
 
     # Construct pretty results to print in a code block to avoid a large spammy message
     pretty_results = '```Use the id to specify a specific category \n\nID  Name\n'
@@ -158,7 +262,7 @@ def get_categories() -> str:
 def handle_question(channel: Channel, args: argparse.Namespace):
     """
     Handles getting a question and posting it to the channel as well as scheduling the answer.
-    Returns the reaction string for the correct answer.
+    Votes for the question are tracked by its TriviaSession until the answer is posted.
     """
     question_data = get_question_data(channel, args)
 
@@ -167,66 +271,251 @@ def handle_question(channel: Channel, args: argparse.Namespace):
 
     question_number = args.original_count - args.count + 1
     prefix = f'Q{question_number}:' if args.original_count > 1 else ''
-    post_question(channel, question_data, prefix)
+    message_ts = post_question(channel, question_data, prefix)
+
+    # Start tracking votes before adding the answer reactions, so no early votes are missed
+    session = TriviaSession(channel, message_ts, question_data, args)
+    with _sessions_lock:
+        _sessions[(session.channel_id, message_ts)] = session
+    reactions = BOOLEAN_REACTS if question_data.is_boolean else MULTIPLE_CHOICE_REACTS
+    add_reactions_interval(reactions, channel, message_ts, REACT_INTERVAL)
+
+    # Schedule the answer to be posted after the specified number of seconds has passed
+    schedule_action(partial(end_question, session), args.seconds)
+
 
+def end_question(session: TriviaSession):
+    """
+    Posts the answer to the given question along with who got it right, and
+    records everyone's scores. Asks the next question if there are more to ask.
+    """
+    with _sessions_lock:
+        _sessions.pop((session.channel_id, session.message_ts), None)
+
+    question_data = session.question_data
     # Get the answer message
     if question_data.is_boolean:
-        if question_data.correct_answer == 'True':
-            answer_text = f':{BOOLEAN_REACTS[0]}:'
-        else:
-            answer_text = f':{BOOLEAN_REACTS[1]}:'
+        answer_text = f':{session.correct_reaction}:'
     else:
         answer_text = question_data.correct_answer
 
+    answered, correct = session.get_results()
     answer_message = f'The answer to the question *{question_data.question}* is: *{answer_text}*'
-
-    # Schedule the answer to be posted after the specified number of seconds has passed
-    post_answer = partial(bot.post_message, channel, answer_message)
-    schedule_action(post_answer, args.seconds)
-
-    # If more questions are to be asked schedule the question for 5 seconds after the current answer
+    if correct:
+        answer_message += '\nCorrect: ' + ', '.join(f'<@{user}>' for user in sorted(correct))
+    elif answered:
+        answer_message += '\nNobody got it right!'
+    bot.post_message(session.channel, answer_message)
+    record_scores(session.channel_id, answered, correct)
+
+    # If more questions are to be asked schedule the question for shortly after this answer
+    args = session.args
     if args.count > 1:
         args.count -= 1
-        schedule_action(partial(handle_question, channel, args), args.seconds + 5)
+        schedule_action(partial(handle_question, session.channel, args),
+                        SEQUENTIAL_QUESTION_DELAY)
 
 
-def get_question_data(channel: Channel, args: argparse.Namespace) -> Optional[QuestionData]:
+def get_trivia_session(evt: dict) -> Optional[TriviaSession]:
     """
-    Attempts to get a question from the api using the specified arguments.
-    Returns the dictionary object for the question on success
-    and None on failure (after posting an error message).
+    Returns the session for the question that the given reaction event was for,
+    if any. Reactions from bots (i.e. the answer reactions) are ignored.
     """
-    # Base64 to help with encoding the message for slack
-    params: Dict[str, Union[int, str]] = {'amount': 1, 'encode': 'base64'}
+    item = evt.get('item', {})
+    with _sessions_lock:
+        session = _sessions.get((item.get('channel'), item.get('ts')))
+    if session is None:
+        return None
+    user = bot.users.get(evt.get('user'))
+    if user is None or user.is_bot:
+        return None
+    return session
 
-    # Add in any explicitly specified arguments
-    if args.category != -1:
-        params['category'] = args.category
 
-    if args.difficulty != 'random':
-        params['difficulty'] = args.difficulty
+@bot.on('reaction_added')
+def handle_reaction_added(evt: dict):
+    """
+    Counts a vote for a trivia question's answer.
 
-    if args.type != 'random':
-        params['type'] = args.type
+    @no_help
+    """
+    session = get_trivia_session(evt)
+    if session is not None:
+        session.add_vote(evt['user'], evt['reaction'])
 
-    # Get the response and check that it is valid
-    http_response = requests.get(API_URL, params=params)
-    if http_response.status_code != requests.codes.ok:
-        bot.post_message(channel, "There was a problem getting the response")
-        return None
 
-    # Check the response codes and post a useful message in the case of an error
-    response_content = json.loads(http_response.content)
-    if response_content['response_code'] == 2:
-        bot.post_message(channel, "Invalid category id. "
-                         + "Try !trivia --cats for a list of valid categories.")
-        return None
-    elif response_content['response_code'] != 0:
-        bot.post_message(channel, "No results were returned")
+@bot.on('reaction_removed')
+def handle_reaction_removed(evt: dict):
+    """
+    Takes back a vote for a trivia question's answer.
+
+    @no_help
+    """
+    session = get_trivia_session(evt)
+    if session is not None:
+        session.remove_vote(evt['user'], evt['reaction'])
+
+
+def record_scores(channel: str, answered: Set[str], correct: Set[str]):
+    """
+    Adds the given results for a question to each user's score in the given channel.
+    """
+    if not answered:
+        return
+    session = bot.create_db_session()
+    scores = {score.user_id: score for score in session.query(TriviaScore)
+              .filter(TriviaScore.channel_id == channel, TriviaScore.user_id.in_(answered))}
+    for user_id in answered:
+        score = scores.get(user_id)
+        if score is None:
+            score = TriviaScore(channel_id=channel, user_id=user_id, answered=0, correct=0)
+            session.add(score)
+        score.answered += 1
+        score.correct += user_id in correct
+    session.commit()
+    session.close()
+
+
+def get_leaderboard(channel: str) -> str:
+    """
+    Returns the message listing the users with the most correct answers in the given channel.
+    """
+    session = bot.create_db_session()
+    scores = session.query(TriviaScore).filter(TriviaScore.channel_id == channel) \
+        .order_by(TriviaScore.correct.desc(), TriviaScore.answered) \
+        .limit(LEADERBOARD_SIZE).all()
+    session.close()
+    if not scores:
+        return 'Nobody has answered any trivia questions in this channel yet.'
+    return '*Trivia leaderboard*\n>>>' + '\n'.join(
+        f'{rank}. <@{score.user_id}>: {score.correct}/{score.answered} correct'
+        for rank, score in enumerate(scores, start=1))
+
+
+def get_question_data(channel: Channel, args: argparse.Namespace) -> Optional[QuestionData]:
+    """
+    Attempts to get a question using the specified arguments.
+    Returns the question on success and None on failure (after posting an error message).
+    """
+    try:
+        return get_question((args.category, args.difficulty, args.type))
+    except TriviaException as e:
+        bot.post_message(channel, e.message)
         return None
 
-    question_data = response_content['results'][0]
 
+def get_question(pool_key: PoolKey) -> QuestionData:
+    """
+    Returns a question for the given options from its pool, refilling the pool in
+    the background once it runs low. If the pool is empty, a batch of questions is
+    fetched immediately instead, with the rest added to the pool.
+    """
+    with _pools_lock:
+        pool = _question_pools[pool_key]
+        question_data = pool.popleft() if pool else None
+        needs_refill = (question_data is not None and len(pool) < REFILL_THRESHOLD
+                        and pool_key not in _refilling_pools)
+        if needs_refill:
+            _refilling_pools.add(pool_key)
+
+    if question_data is None:
+        question_data, *remaining_questions = fetch_questions(pool_key)
+        with _pools_lock:
+            _question_pools[pool_key].extend(remaining_questions)
+    elif needs_refill:
+        _refill_executor.submit(refill_pool, pool_key)
+    return question_data
+
+
+def refill_pool(pool_key: PoolKey):
+    """
+    Fetches a batch of questions for the given options into their pool.
+    """
+    try:
+        questions = fetch_questions(pool_key)
+        with _pools_lock:
+            _question_pools[pool_key].extend(questions)
+    except (TriviaException, requests.RequestException) as e:
+        bot.logger.warning(f'Could not refill trivia questions for {pool_key}: {e}')
+    finally:
+        with _pools_lock:
+            _refilling_pools.discard(pool_key)
+
+
+def get_session_token(renew: bool = False) -> Optional[str]:
+    """
+    Returns the OpenTDB session token, requesting a new one if there isn't one
+    yet or if renew is set. Returns None if a token couldn't be requested.
+    """
+    global _session_token
+    with _session_token_lock:
+        if _session_token is None or renew:
+            _session_token = None
+            try:
+                http_response = requests.get(TOKEN_URL, params={'command': 'request'},
+                                             timeout=REQUEST_TIMEOUT)
+                if http_response.status_code == requests.codes.ok:
+                    _session_token = json.loads(http_response.content).get('token')
+            except requests.RequestException as e:
+                bot.logger.warning(f'Could not request a trivia session token: {e}')
+        return _session_token
+
+
+def fetch_questions(pool_key: PoolKey) -> List[QuestionData]:
+    """
+    Fetches a batch of questions for the given options from OpenTDB, using the
+    session token so that questions aren't repeated. Raises a TriviaException
+    with a useful message if no questions could be fetched.
+    """
+    category, difficulty, question_type = pool_key
+    # Base64 to help with encoding the message for slack
+    params: Dict[str, Union[int, str]] = {'amount': POOL_BATCH_SIZE, 'encode': 'base64'}
+
+    # Add in any explicitly specified arguments
+    if category != -1:
+        params['category'] = category
+
+    if difficulty != 'random':
+        params['difficulty'] = difficulty
+
+    if question_type != 'random':
+        params['type'] = question_type
+
+    session_token = get_session_token()
+    for _ in range(FETCH_ATTEMPTS):
+        if session_token is not None:
+            params['token'] = session_token
+
+        # Get the response and check that it is valid
+        http_response = requests.get(API_URL, params=params, timeout=REQUEST_TIMEOUT)
+        if http_response.status_code != requests.codes.ok:
+            raise TriviaException("There was a problem getting the response")
+
+        # Check the response codes, retrying if it's something we can fix
+        response_content = json.loads(http_response.content)
+        response_code = response_content['response_code']
+        if response_code == 0:
+            return [get_question_from_result(result) for result in response_content['results']]
+        elif response_code == 1 and params['amount'] != 1:
+            # There aren't enough questions left for a full batch
+            params['amount'] = 1
+        elif response_code == 2:
+            raise TriviaException("Invalid category id. "
+                                  + "Try !trivia --cats for a list of valid categories.")
+        elif response_code in (3, 4) and session_token is not None:
+            # The token has expired or every question has been asked, so start over
+            session_token = get_session_token(renew=True)
+        elif response_code == 5:
+            time.sleep(RATE_LIMIT_SECONDS)
+        else:
+            break
+    raise TriviaException("No results were returned")
+
+
+def get_question_from_result(question_data: dict) -> QuestionData:
+    """
+    Returns the QuestionData for the given (base64 encoded) question from OpenTDB.
+    """
     # Get the type of question and make the NamedTuple container for the data
     is_boolean = len(question_data['incorrect_answers']) == 1
     answers = [question_data['correct_answer']] + question_data['incorrect_answers']
@@ -242,32 +531,27 @@ def get_question_data(channel: Channel, args: argparse.Namespace) -> Optional[Qu
     question_data['correct_answer'] = decode_b64(question_data['correct_answer'])
     answers = [decode_b64(ans) for ans in answers]
 
-    question_data = QuestionData(is_boolean=is_boolean, answers=answers, **question_data)
+    result = QuestionData(is_boolean=is_boolean, answers=answers, **question_data)
 
     # Shuffle the answers
-    random.shuffle(question_data.answers)
+    random.shuffle(result.answers)
 
-    return question_data
+    return result
 
 
-def post_question(channel: Channel, question_data: QuestionData, prefix: str = '') -> float:
+def post_question(channel: Channel, question_data: QuestionData, prefix: str = '') -> str:
     """
     Posts the question from the given QuestionData along with
     the possible answers list if applicable.
-    Also creates the answer reacts.
-    Returns the timestamp of the posted message.
+    Returns the timestamp of the message to add the answer reactions to.
     """
     # Post the question and get the timestamp for the reactions (asterisks bold it)
     message_ts = bot.post_message(channel, f'*{prefix} {question_data.question}*')['ts']
 
-    # Print the questions (if multiple choice) and add the answer reactions
-    reactions = BOOLEAN_REACTS if question_data.is_boolean else MULTIPLE_CHOICE_REACTS
-
+    # Print the questions (if multiple choice)
     if not question_data.is_boolean:
         message_ts = post_possible_answers(channel, question_data.answers)
 
-    add_reactions_interval(reactions, channel, message_ts, REACT_INTERVAL)
-
     return message_ts
 
 
@@ -282,25 +566,11 @@ def add_reactions_interval(reactions: List[str], channel: Channel,
     :param msg_timestamp: The timestamp of the required message
     :param interval: The interval between posting each reaction (defaults to 1 second)
     """
-    # If the react interval is 0 don't do any of the scheduling stuff
-    if REACT_INTERVAL == 0:
-        for reaction in reactions:
-            bot.api.reactions.add(name=reaction, channel=channel, timestamp=msg_timestamp)
-
-        return
-
-    # Do the first one immediately
-    bot.api.reactions.add(name=reactions[0], channel=channel, timestamp=msg_timestamp)
-
-    # I am not 100% sure why this is needed. Doing it with a normal partial or
-    # lambda will try to post the same reacts
-    def add_reaction(reaction: str):
+    for index, reaction in enumerate(reactions):
+        if index > 0 and interval > 0:
+            time.sleep(interval)
         bot.api.reactions.add(name=reaction, channel=channel, timestamp=msg_timestamp)
 
-    for index, reaction in enumerate(reactions[1:]):
-        delay = (index + 1) * interval
-        schedule_action(partial(add_reaction, reaction), delay)
-
 
 def decode_b64(encoded: str) -> str:
     """
@@ -325,7 +595,7 @@ def get_correct_reaction(question_data: QuestionData):
     return correct_reaction
 
 
-def post_possible_answers(channel: Channel, answers: List[str]) -> float:
+def post_possible_answers(channel: Channel, answers: List[str]) -> str:
     """
     Posts the possible answers for a multiple choice question in a nice way.
     Returns the timestamp of the message to allow reacting to it.
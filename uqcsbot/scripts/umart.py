@@ -1,8 +1,9 @@
 from uqcsbot import bot, Command
 from requests import get
 from requests.exceptions import RequestException
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from uqcsbot.utils.command_utils import loading_status
+from uqcsbot.utils.scraping_utils import get_soup
 
 NO_QUERY_MESSAGE = "You can't look for nothing. `!umart <QUERY>`"
 NO_RESULTS_MESSAGE = "I can't find nothing baus! Try `!umart <SOMETHING NOT AS SPECIFIC>`"
@@ -10,6 +11,7 @@ ERROR_MESSAGE = "I tried to get the things but alas I could not. Error with HTTP
 
 UMART_SEARCH_URL = "https://www.umart.com.au/umart1/pro/products_list_searchnew_min.phtml"
 UMART_PRODUCT_URL = "https://www.umart.com.au/umart1/pro/"
+SEARCH_RESULT_STRAINER = SoupStrainer("li")
 
 
 @bot.on_command("umart")
@@ -57,7 +59,7 @@ def get_results_from_page(search_page):
     """
     Strips results from html page
     """
-    html = BeautifulSoup(search_page, "html.parser")
+    html = get_soup(search_page, parse_only=SEARCH_RESULT_STRAINER)
     search_items = []
     for li in html.select("li"):
         name = li.select("a.proname")[0].get_text()
@@ -1,23 +1,188 @@
 from uqcsbot import bot, Command
 from uqcsbot.utils.command_utils import loading_status
-from urllib.request import urlopen
+from concurrent.futures import Future, ThreadPoolExecutor
+from ftplib import FTP, all_errors as FTP_ERRORS, error_perm
 import xml.etree.ElementTree as ET
-from datetime import datetime as DT
-from typing import Union, Tuple
+from datetime import date, datetime as DT, timedelta, timezone
+from difflib import get_close_matches
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union, Tuple
+import threading
+import pytz
+
+# BOM forecast product for each state
+STATE_PRODUCTS = {"NSW": "IDN11060", "ACT": "IDN11060", "NT": "IDD10207", "QLD": "IDQ11295",
+                  "SA": "IDS10044", "TAS": "IDT16710", "VIC": "IDV10753", "WA": "IDW14199"}
+# BOM product with the detailed forecast for Brisbane
+BRISBANE_DETAILED_PRODUCT = "IDQ10605"
+BRISBANE_TIMEZONE = pytz.timezone("Australia/Brisbane")
+BOM_FTP_HOST = "ftp.bom.gov.au"
+BOM_FTP_PORT = 21
+BOM_FTP_DIRECTORY = "/anon/gen/fwo"
+FTP_TIMEOUT = 30
+# Number of threads which parse products while the rest are being downloaded
+PARSE_WORKERS = 2
+# How long after a product's next issue time to wait before fetching it again
+ISSUE_DELAY = timedelta(minutes=5)
+# How long to keep a product which doesn't say when it'll next be issued
+DEFAULT_PRODUCT_LIFETIME = timedelta(hours=1)
+# How often to check for products which are due to be fetched again, in minutes
+REFRESH_CHECK_INTERVAL = 5
+# How similar a location has to be to one in a forecast to match it (between 0 and 1)
+LOCATION_MATCH_CUTOFF = 0.8
+
+# Each area in a forecast: its name, whether it's a region (rather than a
+# location), and its forecast periods by index
+ForecastArea = NamedTuple("ForecastArea", [("name", str), ("is_region", bool),
+                                           ("periods", Dict[int, ET.Element])])
+
+
+def get_location_key(location: str) -> str:
+    """
+    Returns the key a location is looked up by, ignoring case and spacing
+    """
+    return " ".join(location.lower().split())
+
 
+class ForecastIndex:
+    """
+    A BOM forecast product, parsed once into an index of its areas, and when
+    it should next be fetched again
+    """
 
-def get_xml(state: str) -> Union[None, ET.Element]:
+    def __init__(self, root: ET.Element) -> None:
+        self.areas: Dict[str, ForecastArea] = {}
+        # the first area with each name, whatever its type
+        self.first_areas: Dict[str, ForecastArea] = {}
+        for node in root.iter("area"):
+            area = ForecastArea(node.get("description", ""), node.get("type") != "location",
+                                {int(period.get("index")): period
+                                 for period in node.iter("forecast-period")})
+            key = get_location_key(area.name)
+            self.first_areas.setdefault(key, area)
+            # locations take precedence over regions of the same name
+            if key not in self.areas or self.areas[key].is_region:
+                self.areas[key] = area
+
+        next_issue = root.findtext(".//next-routine-issue-time-utc")
+        if next_issue is None:
+            self.refresh_time = DT.now(timezone.utc) + DEFAULT_PRODUCT_LIFETIME
+        else:
+            # %z can't parse the trailing Z before Python 3.7
+            issue_time = DT.strptime(next_issue.rstrip("Z"), "%Y-%m-%dT%H:%M:%S")
+            self.refresh_time = issue_time.replace(tzinfo=timezone.utc) + ISSUE_DELAY
+
+    def find(self, location: str) -> Optional[ForecastArea]:
+        """
+        Returns the area with the given name (ignoring case), or failing that
+        the area with the most similar name, or None if none are similar
+        """
+        key = get_location_key(location)
+        if key not in self.areas:
+            matches = get_close_matches(key, self.areas, n=1, cutoff=LOCATION_MATCH_CUTOFF)
+            if not matches:
+                return None
+            key = matches[0]
+        return self.areas[key]
+
+
+# The latest index of each product, kept up to date by refresh_forecasts
+_forecast_indexes: Dict[str, ForecastIndex] = {}
+# Held while products are being fetched
+_forecast_indexes_lock = threading.Lock()
+_parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+# The daily weather message and the (Brisbane) day it was rendered for, ready to be posted
+_daily_weather_message: Optional[Tuple[date, str]] = None
+
+
+def fetch_products(products: Iterable[str]) -> Dict[str, Union[None, ET.Element]]:
     """
-    Get BOM data as an XML for a given state
+    Get the given BOM products as XMLs. They're all downloaded over one FTP
+    session, and each is parsed while the rest are downloaded. Products
+    which can't be fetched (or parsed) are None.
     """
-    source = {"NSW": "IDN11060", "ACT": "IDN11060", "NT": "IDD10207", "QLD": "IDQ11295",
-              "SA": "IDS10044", "TAS": "IDT16710", "VIC": "IDV10753", "WA": "IDW14199"}
+    products = list(products)
+    parsed: Dict[str, Future] = {}
     try:
-        data = urlopen(f"ftp://ftp.bom.gov.au/anon/gen/fwo/{source[state]}.xml")
-        root = ET.fromstring(data.read())
-    except Exception:
-        return None
-    return root
+        with FTP(timeout=FTP_TIMEOUT) as ftp:
+            ftp.connect(BOM_FTP_HOST, BOM_FTP_PORT)
+            ftp.login()
+            ftp.cwd(BOM_FTP_DIRECTORY)
+            # set binary mode once, rather than for every file as retrbinary would
+            ftp.voidcmd("TYPE I")
+            for product in products:
+                try:
+                    connection = ftp.transfercmd(f"RETR {product}.xml")
+                except error_perm as error:
+                    bot.logger.warning(f"Could not fetch BOM product {product}: {error}")
+                    continue
+                with connection:
+                    data = b"".join(iter(lambda: connection.recv(8192), b""))
+                ftp.voidresp()
+                parsed[product] = _parse_executor.submit(ET.fromstring, data)
+    except FTP_ERRORS as error:
+        bot.logger.warning(f"Could not fetch BOM products {products}: {error}")
+
+    roots: Dict[str, Union[None, ET.Element]] = {}
+    for product in products:
+        try:
+            roots[product] = parsed[product].result() if product in parsed else None
+        except ET.ParseError:
+            roots[product] = None
+    return roots
+
+
+def fetch_forecast_indexes(products: Iterable[str]) -> Dict[str, ForecastIndex]:
+    """
+    Fetches and indexes the given BOM products in one batch, replacing any
+    previous indexes of them. Returns the indexes of the products which
+    could be fetched and indexed (the previous indexes of the rest are kept).
+    """
+    indexes: Dict[str, ForecastIndex] = {}
+    for product, root in fetch_products(products).items():
+        if root is None:
+            continue
+        try:
+            indexes[product] = ForecastIndex(root)
+        except ValueError as error:
+            bot.logger.warning(f"Could not index BOM product {product}: {error}")
+    _forecast_indexes.update(indexes)
+    return indexes
+
+
+def get_forecast_index(product: str) -> Optional[ForecastIndex]:
+    """
+    Returns the latest index of the given BOM product. It's only fetched here
+    if it hasn't been yet; refresh_forecasts fetches it as new ones are issued.
+    """
+    index = _forecast_indexes.get(product)
+    if index is not None:
+        return index
+    with _forecast_indexes_lock:
+        return _forecast_indexes.get(product) or fetch_forecast_indexes([product]).get(product)
+
+
+def refresh_products(products: Iterable[str]) -> None:
+    """
+    Fetches those of the given BOM products which have been issued again (or
+    haven't been fetched yet), together in one batch. Only one batch is
+    fetched at a time, so products aren't fetched twice over separate sessions.
+    """
+    with _forecast_indexes_lock:
+        now = DT.now(timezone.utc)
+        due: List[str] = [product for product in sorted(set(products))
+                          if product not in _forecast_indexes
+                          or _forecast_indexes[product].refresh_time <= now]
+        if due:
+            fetch_forecast_indexes(due)
+
+
+@bot.on_schedule('interval', minutes=REFRESH_CHECK_INTERVAL, next_run_time=DT.now())
+def refresh_forecasts() -> None:
+    """
+    Fetches each BOM product once it's been issued again (or if it hasn't
+    been fetched yet), so !weather never has to wait for one
+    """
+    refresh_products([*STATE_PRODUCTS.values(), BRISBANE_DETAILED_PRODUCT])
 
 
 def process_arguments(arguments: str) -> Tuple[str, str, int]:
@@ -33,7 +198,7 @@ def process_arguments(arguments: str) -> Tuple[str, str, int]:
 
     # get location
     if args:
-        if args[0].upper() in ["NSW", "ACT", "NT", "QLD", "SA", "TAS", "VIC", "WA"]:
+        if args[0].upper() in STATE_PRODUCTS:
             state = args.pop(0).upper()
         else:
             state = "QLD"
@@ -45,20 +210,22 @@ def process_arguments(arguments: str) -> Tuple[str, str, int]:
     return state, location, future
 
 
-def find_location(root: ET.Element, location: str, future: int) \
-                  -> Tuple[Union[None, ET.Element], Union[None, str]]:
+def find_location(index: ForecastIndex, location: str, future: int) \
+                  -> Tuple[Union[None, ET.Element], str]:
     """
-    Returns the XML for a given the location and how far into the future
+    Returns the XML for a given the location and how far into the future,
+    along with the location's name. If it can't be found, returns None and
+    the reason why instead.
     """
-    node = root.find(f".//area[@description='{location}']")
-    if node is None:
+    area = index.find(location)
+    if area is None:
         return None, "Location Not Found"
-    if node.get("type") != "location":
+    if area.is_region:
         return None, "Location Given Is Region"
-    node = node.find(f".//forecast-period[@index='{future}']")
+    node = area.periods.get(future)
     if node is None:
         return None, "No Forecast Available For That Day"
-    return node, None
+    return node, area.name
 
 
 def response_header(node: ET.Element, location: str) -> str:
@@ -129,15 +296,14 @@ def response_brisbane_detailed() -> Tuple[str, str, str]:
     """
     Returns a detailed forecast for Brisbane
     """
-    try:
-        data = urlopen("ftp://ftp.bom.gov.au/anon/gen/fwo/IDQ10605.xml")
-        root = ET.fromstring(data.read())
-    except Exception:
+    index = get_forecast_index(BRISBANE_DETAILED_PRODUCT)
+    if index is None:
         return "", "", ""
-    node = root.find(".//area[@description='Brisbane']")
-    if node is None:
+    # the detailed forecast is for the metropolitan area, which comes before the location
+    area = index.first_areas.get(get_location_key("Brisbane"))
+    if area is None:
         return "", "", ""
-    node = node.find(".//forecast-period[@index='0']")
+    node = area.periods.get(0)
     if node is None:
         return "", "", ""
 
@@ -167,17 +333,18 @@ def handle_weather(command: Command) -> None:
 
     (state, location, future) = process_arguments(command.arg)
 
-    root = get_xml(state)
-    if root is None:
+    index = get_forecast_index(STATE_PRODUCTS[state])
+    if index is None:
         failure_respone = bot.post_message(command.channel_id, "Could Not Retrieve BOM Data")
         bot.api.reactions.add(channel=failure_respone["channel"],
                               timestamp=failure_respone["ts"], name="disapproval")
         return
 
-    node, find_response = find_location(root, location, future)
+    node, find_response = find_location(index, location, future)
     if node is None:
         bot.post_message(command.channel_id, find_response)
         return
+    location = find_response
 
     # get responses
     response = []
@@ -189,21 +356,21 @@ def handle_weather(command: Command) -> None:
     bot.post_message(command.channel_id, "\n".join([r for r in response if r]))
 
 
-@bot.on_schedule('cron', hour=6, minute=0, timezone='Australia/Brisbane')
-def daily_weather() -> None:
+def render_daily_weather() -> Optional[str]:
     """
-    Posts today's Brisbane weather at 6:00am every day
+    Returns today's Brisbane weather, as posted every morning, or None if
+    the forecast isn't available
     """
 
     (state, location, future) = ("QLD", "Brisbane", 0)
 
-    root = get_xml(state)
-    if root is None:
-        return
+    index = get_forecast_index(STATE_PRODUCTS[state])
+    if index is None:
+        return None
 
-    node, find_response = find_location(root, location, future)
+    node, find_response = find_location(index, location, future)
     if node is None:
-        return
+        return None
 
     # get responses
     response = []
@@ -214,6 +381,37 @@ def daily_weather() -> None:
     response.append(response_temperature(node))
     response.append(brisbane_fire)
     response.append(brisbane_uv)
+    return "\n".join([r for r in response if r])
+
+
+@bot.on_schedule('cron', hour=5, minute=55, timezone='Australia/Brisbane')
+def prerender_daily_weather() -> None:
+    """
+    Fetches the forecasts needed for the daily weather (if they've been
+    reissued) and renders it, shortly before it's posted
+    """
+    global _daily_weather_message
+
+    refresh_products([STATE_PRODUCTS["QLD"], BRISBANE_DETAILED_PRODUCT])
+    message = render_daily_weather()
+    if message is not None:
+        _daily_weather_message = (DT.now(BRISBANE_TIMEZONE).date(), message)
+
+
+@bot.on_schedule('cron', hour=6, minute=0, timezone='Australia/Brisbane')
+def daily_weather() -> None:
+    """
+    Posts today's Brisbane weather at 6:00am every day
+    """
+
+    today = DT.now(BRISBANE_TIMEZONE).date()
+    if _daily_weather_message is not None and _daily_weather_message[0] == today:
+        message: Optional[str] = _daily_weather_message[1]
+    else:
+        message = render_daily_weather()
+    if message is None:
+        return
+
     # post
     general = bot.channels.get("general")
-    bot.post_message(general.id, "\n".join([r for r in response if r]))
+    bot.post_message(general.id, message)
@@ -1,14 +1,21 @@
+import re
 from datetime import datetime
 from uqcsbot import bot, Command
-from uqcsbot.utils.command_utils import loading_status
-from uqcsbot.utils.uq_course_utils import (get_course_assessment,
-                                           get_course_assessment_page,
+from uqcsbot.utils.command_utils import loading_status, streaming_response
+from uqcsbot.utils.uq_course_utils import (iter_course_assessment,
+                                           get_assessment_url,
+                                           prewarm_course_profile_index,
+                                           prune_course_profile_index,
                                            HttpException,
                                            CourseNotFoundException,
                                            ProfileNotFoundException)
 
 # Maximum number of courses supported by !whatsdue to reduce call abuse.
 COURSE_LIMIT = 6
+# Channels named after a course code, e.g. csse1001.
+COURSE_CHANNEL_REGEX = re.compile(r'^[a-z]{4}[0-9]{4}$')
+# Number of the most popular course channels to pre-warm the course profile index for.
+PREWARM_CHANNEL_LIMIT = 50
 
 
 def get_formatted_assessment_item(assessment_item):
@@ -16,12 +23,31 @@ def get_formatted_assessment_item(assessment_item):
     Returns the given assessment item in a pretty
     message format to display to a user.
     """
-    course, task, due, weight = assessment_item
-    return f'*{course}*: `{weight}` _{task}_ *({due})*'
+    return (f'*{assessment_item.course_name}*: `{assessment_item.weight}`'
+            f' _{assessment_item.task}_ *({assessment_item.due_date})*')
+
+
+def get_whatsdue_message(assessment, profile_ids, is_full_output, remaining_courses=0):
+    """
+    Returns the !whatsdue response for the given assessment. If there are
+    still courses remaining to be fetched, notes how many instead of linking
+    to the assessment page.
+    """
+    message = ('_*WARNING:* Assessment information may vary/change/be entirely'
+               + ' different! Use at your own discretion_\n>>>')
+    message += '\n'.join(map(get_formatted_assessment_item, assessment))
+    if remaining_courses:
+        return message + f'\n_Still fetching assessment for {remaining_courses} more course(s)..._'
+    if not is_full_output:
+        message += ('\n_Note: This may not be the full assessment list. Use -f'
+                    + '/--full to print out the full list._')
+    message += f'\nLink to assessment page <{get_assessment_url(profile_ids)}|here>'
+    return message
 
 
 @bot.on_command('whatsdue')
 @loading_status
+@streaming_response
 def handle_whatsdue(command: Command):
     """
     `!whatsdue [-f] [--full] [COURSE CODE 1] [COURSE CODE 2] ...` - Returns all
@@ -46,27 +72,50 @@ def handle_whatsdue(command: Command):
     course_names = command_args if len(command_args) > 0 else [channel.name]
 
     if len(course_names) > COURSE_LIMIT:
-        bot.post_message(channel, f'Cannot process more than {COURSE_LIMIT} courses.')
+        yield f'Cannot process more than {COURSE_LIMIT} courses.'
         return
 
     # If full output is not specified, set the cutoff to today's date.
     cutoff = None if is_full_output else datetime.today()
+    # Courses are fetched concurrently, and the response is updated with each
+    # course as soon as it arrives. Completed courses are always listed in the
+    # order they were given, regardless of the order they finish in.
+    fetched_courses = {}
     try:
-        asses_page = get_course_assessment_page(course_names)
-        assessment = get_course_assessment(course_names, cutoff, asses_page)
+        for course_name, profile_id, course_assessment in iter_course_assessment(course_names,
+                                                                                 cutoff):
+            fetched_courses[course_name] = (profile_id, course_assessment)
+            completed = [fetched_courses[name] for name in course_names
+                         if name in fetched_courses]
+            profile_ids = [profile_id for profile_id, _ in completed]
+            assessment = [item for _, course_assessment in completed
+                          for item in course_assessment]
+            yield get_whatsdue_message(assessment, profile_ids, is_full_output,
+                                       len(course_names) - len(completed))
     except HttpException as e:
         bot.logger.error(e.message)
-        bot.post_message(channel, f'An error occurred, please try again.')
-        return
+        yield f'An error occurred, please try again.'
     except (CourseNotFoundException, ProfileNotFoundException) as e:
-        bot.post_message(channel, e.message)
-        return
+        yield e.message
 
-    message = ('_*WARNING:* Assessment information may vary/change/be entirely'
-               + ' different! Use at your own discretion_\n>>>')
-    message += '\n'.join(map(get_formatted_assessment_item, assessment))
-    if not is_full_output:
-        message += ('\n_Note: This may not be the full assessment list. Use -f'
-                    + '/--full to print out the full list._')
-    message += f'\nLink to assessment page <{asses_page}|here>'
-    bot.post_message(channel, message)
+
+@bot.on_schedule('cron', month='1,2,7,8', day_of_week='mon', hour=4,
+                 timezone='Australia/Brisbane')
+def prewarm_course_profiles() -> None:
+    """
+    Weekly in the lead up to and start of each semester, drops course profiles
+    from the index which are no longer for the current offering, then indexes
+    the profiles for the most popular course channels so that their first
+    !whatsdue or !calendar doesn't have to look them up. Courses already
+    indexed are not looked up again, so only profiles which weren't
+    available on previous runs are retried.
+    """
+    removed = prune_course_profile_index()
+    course_channels = [channel for channel in bot.channels
+                       if COURSE_CHANNEL_REGEX.match(channel.name) and not channel.is_archived
+                       and not channel.is_im]
+    course_channels.sort(key=lambda channel: len(channel.members), reverse=True)
+    course_names = [channel.name for channel in course_channels[:PREWARM_CHANNEL_LIMIT]]
+    indexed = prewarm_course_profile_index(course_names)
+    bot.logger.info(f'Removed {removed} stale course profiles and indexed'
+                    f' {indexed}/{len(course_names)} popular courses')
@@ -1,11 +1,62 @@
 from uqcsbot import bot, Command
-from typing import Iterable, Tuple, Optional
+from typing import Dict, Iterable, NamedTuple, Tuple, Optional
 import requests
 import json
 import os
+from uqcsbot.utils.cache_utils import TTLCache
 from uqcsbot.utils.command_utils import loading_status, UsageSyntaxException
 
 WOLFRAM_APP_ID = os.environ.get('WOLFRAM_APP_ID')
+# How long a conversation can be continued for after its last reply.
+CONVERSATION_TTL = 24 * 60 * 60
+# Maximum number of conversations that can be continued at once.
+MAX_CONVERSATIONS = 1000
+# How long (and how many) Wolfram responses are cached for, so that repeated
+# queries don't count against the App ID's quota.
+RESPONSE_CACHE_TTL = 60 * 60
+RESPONSE_CACHE_SIZE = 256
+# Status codes whose responses are cached. 501 means Wolfram has no result
+# for the query, which won't change with a retry.
+CACHEABLE_STATUS_CODES = {requests.codes.ok, 501}
+
+# The state needed to continue a Wolfram conversation: the host to ask the next
+# question to, the s output (which is only sometimes returned) and the conversation id.
+ConversationState = NamedTuple('ConversationState', [('host', str), ('s_output', str),
+                                                     ('conversation_id', str)])
+
+WolframResponse = NamedTuple('WolframResponse', [('status_code', int), ('content', bytes)])
+
+# Conversations which can be continued, keyed by (channel id, thread ts).
+_conversations: TTLCache[Tuple[str, str], ConversationState] = TTLCache(
+    CONVERSATION_TTL, maxsize=MAX_CONVERSATIONS)
+# Wolfram responses, keyed by API url and (sorted) parameters.
+_response_cache: TTLCache[Tuple[str, Tuple[Tuple[str, str], ...]], WolframResponse] = TTLCache(
+    RESPONSE_CACHE_TTL, maxsize=RESPONSE_CACHE_SIZE)
+
+
+def normalise_query(search_query: str) -> str:
+    """
+    Returns the given query with surrounding and repeated whitespace removed,
+    so that trivially different queries share a cached response.
+    """
+    return ' '.join(search_query.split())
+
+
+def get_wolfram_response(api_url: str, params: Dict[str, str]) -> WolframResponse:
+    """
+    Returns Wolfram's response to the given request. Responses are cached, and
+    identical requests made while one is in flight share its response rather
+    than making their own. Error responses are not cached.
+    """
+    def fetch_response():
+        http_response = requests.get(api_url, params=params)
+        return WolframResponse(http_response.status_code, http_response.content)
+
+    cache_key = (api_url, tuple(sorted(params.items())))
+    response = _response_cache.get_or_set(cache_key, fetch_response)
+    if response.status_code not in CACHEABLE_STATUS_CODES:
+        _response_cache.invalidate(cache_key)
+    return response
 
 
 def get_subpods(pods: list) -> Iterable[Tuple[str, dict]]:
@@ -57,7 +108,8 @@ def wolfram_full(search_query: str, channel):
     !wolfram --full y = 2x + c
     """
     api_url = "http://api.wolframalpha.com/v2/query?&output=json"
-    http_response = requests.get(api_url, params={'input': search_query, 'appid': WOLFRAM_APP_ID})
+    http_response = get_wolfram_response(api_url, {'input': normalise_query(search_query),
+                                                   'appid': WOLFRAM_APP_ID})
 
     # Check if the response is ok
     if http_response.status_code != requests.codes.ok:
@@ -98,7 +150,8 @@ def get_short_answer(search_query: str):
     pineapple is not a great conversation starter but may be interesting).
     """
     api_url = "http://api.wolframalpha.com/v2/result?"
-    http_response = requests.get(api_url, params={'input': search_query, 'appid': WOLFRAM_APP_ID})
+    http_response = get_wolfram_response(api_url, {'input': normalise_query(search_query),
+                                                   'appid': WOLFRAM_APP_ID})
 
     # Check if the response is ok. A status code of 501 signifies that no result could be found.
     if http_response.status_code == 501:
@@ -133,16 +186,18 @@ def wolfram_normal(search_query: str, channel):
             bot.post_message(channel, result)
             return
 
-    # TODO(mubiquity): Is there a better option than storing the id in the fallback?
-    # Here we store the conversation ID in the fallback so we can get it back later.
-    # We also store an identifier string to check against later and the reply_host and s_output
-    # string. Attachments is a slack thing that allows the formatting or more complex messages.
-    # In this case we add a footer and use the fallback to cheekily store information for later.
-    attachments = [{'fallback': f'WolframCanReply {reply_host} {s_output} {conversation_id}',
+    # Attachments is a slack thing that allows the formatting or more complex messages.
+    # In this case we add a footer to let users know they can reply in a thread.
+    attachments = [{'fallback': result,
                     'footer': 'Further questions may be asked',
                     'text': result}]
 
-    bot.post_message(channel, "", attachments=attachments)
+    response = bot.post_message(channel, "", attachments=attachments)
+    if not response.get('ok'):
+        return
+    # Keep the conversation's state so that replies to the message's thread can continue it.
+    _conversations.set((response['channel'], response['ts']),
+                       ConversationState(reply_host, s_output or '', conversation_id))
 
 
 def extract_reply(wolfram_response: dict) -> Tuple[str, str, str, str]:
@@ -174,16 +229,19 @@ def conversation_request(
     # (has a conversation_id). Any of the following would suffice but may as well be thorough
     if any([host_name is None, conversation_id is None, s_output is None]):
         api_url = "http://api.wolframalpha.com/v1/conversation.jsp?"
-        params = {'appid': WOLFRAM_APP_ID, 'i': search_query}
+        params = {'appid': WOLFRAM_APP_ID, 'i': normalise_query(search_query)}
     else:
-        # Slack annoyingly formats the reply_host link so we have to extract what we want:
-        # The format is <http://www.domain.com|www.domain.com>
-        host_name = host_name[1:-1].split('|')[0]
-        api_url = f'{host_name}/api/v1/conversation.jsp?'
+        # The host is only a hostname, e.g. www5b.wolframalpha.com
+        api_url = f'http://{host_name}/api/v1/conversation.jsp?'
         params = {'appid': WOLFRAM_APP_ID, 'i': search_query,
                   'conversationid': conversation_id, 's': s_output}
 
-    http_response = requests.get(api_url, params=params)
+    # Only the start of a conversation is worth caching, as continuing one depends on its state.
+    if 'conversationid' not in params:
+        http_response = get_wolfram_response(api_url, params)
+    else:
+        response = requests.get(api_url, params=params)
+        http_response = WolframResponse(response.status_code, response.content)
 
     if http_response.status_code != requests.codes.ok:
         return "There was a problem getting the response", None, None, None
@@ -200,7 +258,7 @@ def conversation_request(
 def handle_reply(evt: dict):
     """
     Handles a message event. Whenever a message is a reply to one of !wolframs conversational
-    results this handles getting the next response and updating the old stored information.
+    results this handles getting the next response and updating the stored conversation state.
     """
     # If the message isn't from a thread or is from a bot ignore it (avoid those infinite loops)
     if 'thread_ts' not in evt or evt.get('subtype') == 'bot_message':
@@ -208,44 +266,21 @@ def handle_reply(evt: dict):
 
     channel = evt['channel']
     thread_ts = evt['thread_ts']  # This refers to time the original message
-    thread_parent = bot.api.conversations.history(channel=channel, limit=1,
-                                                  inclusive=True, latest=thread_ts)
-
-    if not thread_parent['ok']:
-        # The most likely reason for this error is auth issues or possibly rate limiting
-        bot.logger.error(f'Error with wolfram script thread history: {thread_parent}')
-        return
-
-    # Limit=1 was used so the first (and only) message is what we want
-    parent_message = thread_parent['messages'][0]
-    # If the threads parent wasn't by a bot ignore it
-    if parent_message.get('subtype') != 'bot_message':
+    # Threads which aren't a Wolfram conversation are ignored without asking Slack for anything
+    conversation = _conversations.get((channel, thread_ts))
+    if conversation is None:
         return
 
-    # Finally, we have to check that this is a Wolfram replyable message
-    # It is rare we would reach this point and not pass as who
-    # replies to a bot in a thread for another reason?
-    parent_attachment = parent_message['attachments'][0]  # Only one attachment to get
-    parent_fallback = parent_attachment['fallback']
-    if 'WolframCanReply' not in parent_fallback:
-        return
-
-    # Now we can grab the conversation_id from the message
-    # and get the new question (s only sometimes appears).
-    # Recall the format of the fallback "identifier hostname s_output conversationID"
-    _, reply_host, s_output, conversation_id = parent_fallback.split(' ')
     new_question = evt['text']  # This is the value of the message that triggered the response
-    s_output = '' if s_output is None else s_output
 
     # Ask Wolfram for the new answer grab the new stuff and post the reply.
-    reply, conversation_id, reply_host, s_output = conversation_request(new_question, reply_host,
-                                                                        conversation_id, s_output)
+    reply, conversation_id, reply_host, s_output = conversation_request(
+        new_question, conversation.host, conversation.conversation_id, conversation.s_output)
 
     bot.post_message(channel, reply, thread_ts=thread_ts)
 
     # If getting a the conversation request results in an error then conversation_id will be None
     if conversation_id is not None:
-        # Update the old fallback to reflect the new state of the conversation
-        parent_attachment['fallback'] = f'WolframCanReply {reply_host} {s_output} {conversation_id}'
-
-        bot.api.chat.update(channel=channel, attachments=[parent_attachment], ts=thread_ts)
+        # Update the stored state to reflect the new state of the conversation
+        _conversations.set((channel, thread_ts),
+                           ConversationState(reply_host, s_output or '', conversation_id))
@@ -0,0 +1,175 @@
+"""
+Utilities for archiving the messages of channels which have opted in, so that
+they can be looked up and searched locally rather than through the Slack API.
+"""
+
+import json
+import re
+import threading
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import and_, or_, func
+from uqcsbot import bot
+from uqcsbot.models import ArchivedChannel, ArchivedMessage, ArchivedMessageTerm
+
+# Terms are runs of word characters, ignoring any too short or long to be useful.
+TERM_REGEX = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+# Default maximum number of messages returned by a search.
+SEARCH_LIMIT = 10
+# Message subtypes which don't carry a message of their own.
+IGNORED_SUBTYPES = {'message_replied'}
+
+# Ids of the archived channels, loaded from the DB when first needed.
+_archived_channel_ids: Optional[Set[str]] = None
+_archived_channels_lock = threading.Lock()
+
+
+def get_terms(text: str) -> Set[str]:
+    """
+    Returns the distinct, lower-cased terms in the given text.
+    """
+    return {term for term in TERM_REGEX.findall(text.lower())
+            if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH}
+
+
+def get_archived_channel_ids() -> Set[str]:
+    """
+    Returns the ids of every archived channel. These are checked for every
+    message, so are kept in memory rather than queried each time.
+    """
+    global _archived_channel_ids
+    with _archived_channels_lock:
+        if _archived_channel_ids is None:
+            session = bot.create_db_session()
+            _archived_channel_ids = {channel.channel_id
+                                     for channel in session.query(ArchivedChannel).all()}
+            session.close()
+        return _archived_channel_ids
+
+
+def is_channel_archived(channel_id: str) -> bool:
+    """
+    Returns whether the given channel's messages are being archived.
+    """
+    return channel_id in get_archived_channel_ids()
+
+
+def set_channel_archived(channel_id: str, is_archived: bool) -> None:
+    """
+    Starts or stops archiving the given channel. When a channel stops being
+    archived, all of its archived messages are removed.
+    """
+    archived_channel_ids = get_archived_channel_ids()
+    session = bot.create_db_session()
+    if is_archived:
+        session.merge(ArchivedChannel(channel_id=channel_id))
+    else:
+        for model in (ArchivedChannel, ArchivedMessage, ArchivedMessageTerm):
+            session.query(model).filter(model.channel_id == channel_id) \
+                .delete(synchronize_session=False)
+    session.commit()
+    session.close()
+    with _archived_channels_lock:
+        if is_archived:
+            archived_channel_ids.add(channel_id)
+        else:
+            archived_channel_ids.discard(channel_id)
+
+
+def archive_message(channel_id: str, message: dict) -> None:
+    """
+    Archives (or updates the archived copy of) the given message, if it
+    was posted in an archived channel.
+    """
+    if not is_channel_archived(channel_id) or message.get('subtype') in IGNORED_SUBTYPES:
+        return
+    attachments = message.get('attachments')
+    if attachments is not None and not isinstance(attachments, str):
+        attachments = json.dumps(attachments)
+    text = message.get('text', '')
+    session = bot.create_db_session()
+    session.merge(ArchivedMessage(channel_id=channel_id, ts=message['ts'],
+                                  user=message.get('user'), subtype=message.get('subtype'),
+                                  thread_ts=message.get('thread_ts'), text=text,
+                                  attachments=attachments))
+    session.query(ArchivedMessageTerm) \
+        .filter(ArchivedMessageTerm.channel_id == channel_id,
+                ArchivedMessageTerm.ts == message['ts']) \
+        .delete(synchronize_session=False)
+    session.add_all([ArchivedMessageTerm(term=term, channel_id=channel_id, ts=message['ts'])
+                     for term in get_terms(text)])
+    session.commit()
+    session.close()
+
+
+def unarchive_message(channel_id: str, ts: str) -> None:
+    """
+    Removes the given message from the archive, e.g. once it's been deleted.
+    """
+    session = bot.create_db_session()
+    for model in (ArchivedMessage, ArchivedMessageTerm):
+        session.query(model).filter(model.channel_id == channel_id, model.ts == ts) \
+            .delete(synchronize_session=False)
+    session.commit()
+    session.close()
+
+
+def get_message_dict(archived_message: ArchivedMessage) -> dict:
+    """
+    Returns the given archived message in the same form as the Slack API
+    would return it.
+    """
+    message = {'type': 'message', 'channel': archived_message.channel_id,
+               'ts': archived_message.ts, 'text': archived_message.text}
+    if archived_message.user is not None:
+        message['user'] = archived_message.user
+    if archived_message.subtype is not None:
+        message['subtype'] = archived_message.subtype
+    if archived_message.thread_ts is not None:
+        message['thread_ts'] = archived_message.thread_ts
+    if archived_message.attachments is not None:
+        message['attachments'] = json.loads(archived_message.attachments)
+    return message
+
+
+def get_archived_message(channel_id: str, ts: str) -> Optional[dict]:
+    """
+    Returns the archived message posted at the given time in the given
+    channel, or None if it hasn't been archived.
+    """
+    session = bot.create_db_session()
+    archived_message = session.query(ArchivedMessage) \
+        .filter(ArchivedMessage.channel_id == channel_id, ArchivedMessage.ts == ts).first()
+    session.close()
+    return None if archived_message is None else get_message_dict(archived_message)
+
+
+def search_messages(query: str, channel_ids: Iterable[str],
+                    limit: int = SEARCH_LIMIT) -> List[dict]:
+    """
+    Returns the most recent archived messages from the given channels which
+    contain every term in the given query, newest first. Bot messages and
+    commands are left out.
+    """
+    terms = get_terms(query)
+    channel_ids = list(channel_ids)
+    if not terms or not channel_ids:
+        return []
+    session = bot.create_db_session()
+    matches = session.query(ArchivedMessageTerm.channel_id, ArchivedMessageTerm.ts) \
+        .filter(ArchivedMessageTerm.term.in_(terms),
+                ArchivedMessageTerm.channel_id.in_(channel_ids)) \
+        .group_by(ArchivedMessageTerm.channel_id, ArchivedMessageTerm.ts) \
+        .having(func.count(ArchivedMessageTerm.term) == len(terms)) \
+        .subquery()
+    archived_messages = session.query(ArchivedMessage) \
+        .join(matches, and_(ArchivedMessage.channel_id == matches.c.channel_id,
+                            ArchivedMessage.ts == matches.c.ts)) \
+        .filter(or_(ArchivedMessage.subtype.is_(None),
+                    ArchivedMessage.subtype != 'bot_message'),
+                ~ArchivedMessage.text.startswith('!')) \
+        .order_by(ArchivedMessage.ts.desc()).limit(limit).all()
+    session.close()
+    return [get_message_dict(archived_message) for archived_message in archived_messages]
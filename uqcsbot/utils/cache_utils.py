@@ -0,0 +1,107 @@
+"""
+Utilities for caching the results of slow lookups (e.g. HTTP requests) in memory.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A thread-safe cache whose entries expire `ttl` seconds after being set. If
+    `maxsize` is given, the least recently used entries are evicted once the
+    cache grows beyond that many entries.
+    """
+    def __init__(self, ttl: float, maxsize: Optional[int] = None) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[K, Tuple[float, V]]' = OrderedDict()
+        # Values currently being computed by get_or_set, for other callers to wait on.
+        self._pending: Dict[K, Future] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """
+        Returns the value cached for the given key, or the default if there is
+        no unexpired value cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expiry, value = entry
+            if expiry <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        """
+        Caches the given value against the given key.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def get_or_set(self, key: K, value_fn: Callable[[], V]) -> V:
+        """
+        Returns the value cached for the given key. If there is none, calls
+        value_fn to get it and caches the result. Concurrent calls for the
+        same key are coalesced: only the first calls value_fn, and the rest
+        wait for and share its result. Exceptions raised by value_fn are
+        propagated to every waiting caller and nothing is cached.
+        """
+        with self._lock:
+            value = self.get(key)
+            if value is not None:
+                return value
+            future = self._pending.get(key)
+            is_computing = future is None
+            if future is None:
+                future = self._pending[key] = Future()
+        if not is_computing:
+            return future.result()
+
+        try:
+            value = value_fn()
+        except Exception as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self.set(key, value)
+            del self._pending[key]
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: K) -> None:
+        """
+        Removes any value cached for the given key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every cached value.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,6 +1,7 @@
 from random import choice
 from functools import wraps
 from typing import List
+import time
 import uqcsbot  # Necessary to avoid circular imports.
 
 LOADING_REACTS = ['waiting', 'apple_waiting', 'waiting_droid', 'twiddle_thumbs',
@@ -16,6 +17,8 @@ HYPE_REACTS = ['nice', 'noice', 'ok-hand', 'exclamation', 'fiestaparrot',
 FAILURE_REACTS = ['blood_drops', 'confusedparrot', 'dumpster_fire', 'excuse_me_what_the_fuck',
                   'mtg_b', 'oof', "ph'nglui_mglw'nafh_cthulhu_r'lyeh_wgah'nagl_fhtagn",
                   'sob_blood', 'tf2_sapper', "time's_end", 'ohno', 'dead_link']
+# Minimum number of seconds between edits of a streamed response (see streaming_response).
+STREAM_UPDATE_INTERVAL = 1.0
 
 
 class UsageSyntaxException(Exception):
@@ -102,3 +105,36 @@ def loading_status(command_fn):
         uqcsbot.bot.api.reactions.remove(**reaction_kwargs)
         return res
     return wrapper
+
+
+def streaming_response(command_fn):
+    """
+    Decorator function which lets the wrapped command be written as a generator
+    that yields the full text of its response so far. The first yielded text is
+    posted straight away to the calling channel, and each later yield edits that
+    same message in place. Edits are throttled to at most one per
+    STREAM_UPDATE_INTERVAL seconds, with the last yielded text always being
+    flushed once the command finishes. This lets users see partial results as
+    soon as the first upstream response arrives, rather than after the slowest.
+    """
+    @wraps(command_fn)
+    def wrapper(command: uqcsbot.Command):
+        message = None
+        pending_text = None
+        last_update = 0.0
+        for text in command_fn(command):
+            if message is None:
+                message = uqcsbot.bot.post_message(command.channel_id, text,
+                                                   thread_ts=command.thread_ts)
+                last_update = time.monotonic()
+                continue
+            pending_text = text
+            if time.monotonic() - last_update >= STREAM_UPDATE_INTERVAL:
+                uqcsbot.bot.api.chat.update(channel=message['channel'], ts=message['ts'],
+                                            text=pending_text)
+                pending_text = None
+                last_update = time.monotonic()
+        if message is not None and pending_text is not None:
+            uqcsbot.bot.api.chat.update(channel=message['channel'], ts=message['ts'],
+                                        text=pending_text)
+    return wrapper
@@ -0,0 +1,356 @@
+"""
+A local mirror of crates.io's metadata, built from its daily database dump
+(see https://crates.io/data-access), so that !crates can be answered without
+calling the crates.io API. The mirror is an SQLite file which is only used if
+CRATES_MIRROR_PATH is set.
+"""
+
+import csv
+import os
+import sqlite3
+import tarfile
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+from uqcsbot import bot
+
+CRATES_MIRROR_PATH = os.environ.get('CRATES_MIRROR_PATH')
+DUMP_URL = 'https://static.crates.io/db-dump.tar.gz'
+DUMP_TIMEOUT = 60
+GITHUB_URL = 'https://github.com/'
+# Owners of kind 0 are users (rather than teams).
+USER_OWNER_KIND = '0'
+# The dump stores some very large fields (e.g. readmes), so raise csv's field limit.
+CSV_FIELD_SIZE_LIMIT = 2 ** 30
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE crates (id INTEGER PRIMARY KEY, name TEXT NOT NULL, name_key TEXT NOT NULL,
+                     description TEXT, downloads INTEGER NOT NULL DEFAULT 0, homepage TEXT,
+                     repository TEXT, documentation TEXT);
+CREATE TABLE crate_downloads (crate_id INTEGER PRIMARY KEY, downloads INTEGER NOT NULL);
+CREATE TABLE categories (id INTEGER PRIMARY KEY, slug TEXT NOT NULL, name TEXT NOT NULL,
+                         description TEXT, crates_cnt INTEGER NOT NULL);
+CREATE TABLE crate_categories (category_id INTEGER, crate_id INTEGER,
+                               PRIMARY KEY (category_id, crate_id)) WITHOUT ROWID;
+CREATE TABLE users (id INTEGER PRIMARY KEY, login TEXT NOT NULL, login_key TEXT NOT NULL,
+                    name TEXT, avatar TEXT);
+CREATE TABLE crate_owners (user_id INTEGER, crate_id INTEGER,
+                           PRIMARY KEY (user_id, crate_id)) WITHOUT ROWID;
+"""
+INDEXES = """
+CREATE UNIQUE INDEX crates_name_key ON crates (name_key);
+CREATE INDEX crates_downloads ON crates (downloads);
+CREATE UNIQUE INDEX categories_slug ON categories (slug);
+CREATE INDEX users_login_key ON users (login_key);
+"""
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE crates_fts USING fts5(name, description, content='crates',
+                                           content_rowid='id');
+INSERT INTO crates_fts (crates_fts) VALUES ('rebuild');
+"""
+
+# For each CSV in the dump that the mirror is built from: the table it's loaded
+# into, and the CSV columns to load into each of the table's columns.
+DUMP_TABLES: Dict[str, Tuple[str, Dict[str, str]]] = {
+    'crates.csv': ('crates', {'id': 'id', 'name': 'name', 'description': 'description',
+                              'downloads': 'downloads', 'homepage': 'homepage',
+                              'repository': 'repository', 'documentation': 'documentation'}),
+    'crate_downloads.csv': ('crate_downloads', {'crate_id': 'crate_id',
+                                                'downloads': 'downloads'}),
+    'categories.csv': ('categories', {'id': 'id', 'slug': 'slug', 'name': 'category',
+                                      'description': 'description',
+                                      'crates_cnt': 'crates_cnt'}),
+    'crates_categories.csv': ('crate_categories', {'category_id': 'category_id',
+                                                   'crate_id': 'crate_id'}),
+    'users.csv': ('users', {'id': 'id', 'login': 'gh_login', 'name': 'name',
+                            'avatar': 'gh_avatar'}),
+    'crate_owners.csv': ('crate_owners', {'user_id': 'owner_id', 'crate_id': 'crate_id'}),
+}
+
+_refresh_lock = threading.Lock()
+
+
+def get_name_key(name: str) -> str:
+    """
+    Returns the key a crate name is looked up by. Like crates.io, names are
+    case insensitive and treat hyphens and underscores the same.
+    """
+    return name.lower().replace('_', '-')
+
+
+def is_available(path: Optional[str] = None) -> bool:
+    """
+    Returns whether the mirror has been configured and built.
+    """
+    path = path or CRATES_MIRROR_PATH
+    return path is not None and os.path.exists(path)
+
+
+def connect(path: Optional[str] = None) -> Optional[sqlite3.Connection]:
+    """
+    Returns a read-only connection to the mirror, or None if it's unavailable.
+    A new connection is made each time, so the mirror can be replaced while
+    the bot is running.
+    """
+    path = path or CRATES_MIRROR_PATH
+    if not is_available(path):
+        return None
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def load_dump_table(connection: sqlite3.Connection, file_name: str, lines: Iterable[str]):
+    """
+    Loads the lines of the given CSV file from the dump into its table in the mirror.
+    """
+    table, columns = DUMP_TABLES[file_name]
+    reader = csv.DictReader(lines)
+    # Older dumps have downloads in crates.csv, newer ones in crate_downloads.csv
+    columns = {column: csv_column for column, csv_column in columns.items()
+               if csv_column in (reader.fieldnames or [])}
+    if table == 'crates':
+        columns['name_key'] = 'name'
+    elif table == 'users':
+        columns['login_key'] = 'gh_login'
+
+    def get_row(csv_row: Dict[str, str]) -> Optional[List[Optional[str]]]:
+        if table == 'crate_owners' and csv_row.get('owner_kind') != USER_OWNER_KIND:
+            return None
+        row = [csv_row[csv_column] or None for csv_column in columns.values()]
+        if table in ('crates', 'users'):
+            row[-1] = get_name_key(row[-1] or '')
+        return row
+
+    column_names = ', '.join(columns)
+    placeholders = ', '.join('?' for _ in columns)
+    connection.executemany(f'INSERT OR REPLACE INTO {table} ({column_names}) VALUES'
+                           f' ({placeholders})',
+                           filter(None, map(get_row, reader)))
+
+
+def build_mirror(dump: tarfile.TarFile, path: str, meta: Dict[str, str]) -> None:
+    """
+    Builds the mirror at the given path from the given crates.io database dump,
+    which can be read as a stream. The given metadata is stored with it.
+    """
+    csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SCHEMA)
+        for member in dump:
+            file_name = os.path.basename(member.name)
+            csv_file = dump.extractfile(member) if file_name in DUMP_TABLES else None
+            if csv_file is not None:
+                # Members of a streamed dump aren't seekable, which io.TextIOWrapper needs
+                load_dump_table(connection, file_name,
+                                (line.decode('utf-8') for line in csv_file))
+        connection.execute('UPDATE crates SET downloads = (SELECT downloads FROM crate_downloads'
+                           ' WHERE crate_id = crates.id) WHERE id IN'
+                           ' (SELECT crate_id FROM crate_downloads)')
+        connection.execute('DROP TABLE crate_downloads')
+        connection.executescript(INDEXES)
+        try:
+            connection.executescript(FTS_SCHEMA)
+            meta = {**meta, 'has_fts': '1'}
+        except sqlite3.OperationalError:
+            # SQLite wasn't built with FTS5, so descriptions are searched with LIKE instead
+            pass
+        connection.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', meta.items())
+        connection.commit()
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+
+
+def get_meta(path: str) -> Dict[str, str]:
+    """
+    Returns the metadata stored with the mirror at the given path.
+    """
+    connection = connect(path)
+    if connection is None:
+        return {}
+    try:
+        return dict(connection.execute('SELECT key, value FROM meta').fetchall())
+    finally:
+        connection.close()
+
+
+def refresh_mirror(path: Optional[str] = None) -> bool:
+    """
+    Rebuilds the mirror if crates.io has published a new database dump since it
+    was last built, returning whether it was rebuilt. The dump is only
+    downloaded if it has changed, and the new mirror replaces the old one
+    once it has been completely built.
+    """
+    path = path or CRATES_MIRROR_PATH
+    if path is None:
+        return False
+    with _refresh_lock:
+        meta = get_meta(path)
+        headers = {}
+        if 'etag' in meta:
+            headers['If-None-Match'] = meta['etag']
+        if 'last_modified' in meta:
+            headers['If-Modified-Since'] = meta['last_modified']
+        with requests.get(DUMP_URL, headers=headers, stream=True,
+                          timeout=DUMP_TIMEOUT) as response:
+            if response.status_code == requests.codes.not_modified:
+                return False
+            if response.status_code != requests.codes.ok:
+                bot.logger.warning(f'Could not download the crates.io database dump:'
+                                   f' {response.status_code}')
+                return False
+            new_meta = {'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')}
+            building_path = path + '.building'
+            with tarfile.open(fileobj=response.raw, mode='r|gz') as dump:
+                build_mirror(dump, building_path,
+                             {key: value for key, value in new_meta.items() if value})
+        os.replace(building_path, path)
+        return True
+
+
+def get_crate_dict(row: sqlite3.Row) -> dict:
+    """
+    Returns the given crate in the same form as the crates.io API would.
+    """
+    return {'name': row['name'], 'description': row['description'],
+            'downloads': row['downloads'], 'homepage': row['homepage'],
+            'repository': row['repository'], 'documentation': row['documentation']}
+
+
+def get_crate(name: str) -> Optional[dict]:
+    """
+    Returns the crate with the given name, or None if it isn't in the mirror.
+    """
+    connection = connect()
+    if connection is None:
+        return None
+    try:
+        row = connection.execute('SELECT * FROM crates WHERE name_key = ?',
+                                 (get_name_key(name),)).fetchone()
+    finally:
+        connection.close()
+    return None if row is None else get_crate_dict(row)
+
+
+def get_fts_query(search: str) -> str:
+    """
+    Returns an FTS5 query which matches every word of the given search as a prefix.
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in search.split())
+
+
+def search_crates(search: str, category: str = '', user: str = '', sort: str = 'downloads',
+                  limit: int = 5) -> Optional[Tuple[List[dict], int]]:
+    """
+    Returns the crates (up to the given limit) whose name starts with the given
+    search, or whose name or description contains words starting with each
+    word of it, along with the total number of matching crates. Results can be
+    filtered by category slug and owner (username or id), and are sorted by
+    downloads or alphabetically. Returns None if the mirror is unavailable or
+    the owner isn't in it.
+    """
+    connection = connect()
+    if connection is None:
+        return None
+    try:
+        conditions: List[str] = []
+        params: List[object] = []
+        if user:
+            if user.isdigit():
+                owner = connection.execute('SELECT id FROM users WHERE id = ?',
+                                           (int(user),)).fetchone()
+            else:
+                owner = connection.execute('SELECT id FROM users WHERE login_key = ?',
+                                           (get_name_key(user),)).fetchone()
+            if owner is None:
+                return None
+            conditions.append('id IN (SELECT crate_id FROM crate_owners WHERE user_id = ?)')
+            params.append(owner['id'])
+        if category:
+            conditions.append('id IN (SELECT crate_id FROM crate_categories JOIN categories'
+                              ' ON categories.id = category_id WHERE slug = ?)')
+            params.append(category)
+        if search.strip():
+            search_key = get_name_key(search.strip())
+            has_fts = connection.execute("SELECT 1 FROM meta WHERE key = 'has_fts'").fetchone()
+            if has_fts:
+                text_condition = ('id IN (SELECT rowid FROM crates_fts'
+                                  ' WHERE crates_fts MATCH ?)')
+                text_param = get_fts_query(search)
+            else:
+                text_condition = 'description LIKE ?'
+                text_param = f'%{search.strip()}%'
+            conditions.append(f'((name_key >= ? AND name_key < ?) OR {text_condition})')
+            params.extend([search_key, search_key + '\uffff', text_param])
+
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        order = 'downloads DESC' if sort == 'downloads' else 'name_key'
+        total = connection.execute(f'SELECT COUNT(*) FROM crates {where}', params).fetchone()[0]
+        rows = connection.execute(f'SELECT * FROM crates {where} ORDER BY {order} LIMIT ?',
+                                  params + [limit]).fetchall()
+    finally:
+        connection.close()
+    return [get_crate_dict(row) for row in rows], total
+
+
+def get_categories(sort: str = 'alpha') -> List[str]:
+    """
+    Returns the names of every category, sorted alphabetically or by number of crates.
+    """
+    connection = connect()
+    if connection is None:
+        return []
+    order = 'crates_cnt DESC' if sort == 'crates' else 'name'
+    try:
+        return [row['name'] for row in connection.execute(f'SELECT name FROM categories'
+                                                          f' ORDER BY {order}')]
+    finally:
+        connection.close()
+
+
+def get_category(slug: str) -> Optional[dict]:
+    """
+    Returns the category with the given slug in the same form as the crates.io
+    API would, or None if it isn't in the mirror.
+    """
+    connection = connect()
+    if connection is None:
+        return None
+    try:
+        row = connection.execute('SELECT * FROM categories WHERE slug = ?', (slug,)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    return {'id': row['slug'], 'name': row['name'], 'description': row['description'],
+            'crates_cnt': row['crates_cnt']}
+
+
+def get_user(username: str) -> Optional[dict]:
+    """
+    Returns the user with the given username in the same form as the crates.io
+    API would, or None if they aren't in the mirror.
+    """
+    connection = connect()
+    if connection is None:
+        return None
+    try:
+        row = connection.execute('SELECT * FROM users WHERE login_key = ?',
+                                 (get_name_key(username),)).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    user = {'id': row['id'], 'login': row['login'], 'url': GITHUB_URL + row['login']}
+    if row['name']:
+        user['name'] = row['name']
+    if row['avatar']:
+        user['avatar'] = row['avatar']
+    return user
@@ -1,11 +1,14 @@
 from uqcsbot import bot
 import requests
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 from dateutil import parser
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from pytz import timezone
+from uqcsbot.utils.cache_utils import TTLCache
+from uqcsbot.utils.scraping_utils import get_soup
 
 # Utilities for parsing seminar information from the School of ITEE's seminar listing page at
 # https://www.itee.uq.edu.au/seminar-list.
@@ -13,6 +16,18 @@ ITEE_BASE_URL = 'https://www.itee.uq.edu.au'
 ITEE_SEMINAR_LIST_URL = 'https://www.itee.uq.edu.au/seminar-list'
 BRISBANE_TZ = timezone('Australia/Brisbane')
 SEMINAR_DETAILS_REGEX = re.compile('group_seminar_details_element')
+# Only the seminar table and details are parsed out of each page.
+SEMINAR_SUMMARY_STRAINER = SoupStrainer('table', summary='ITEE Seminar List')
+SEMINAR_DETAILS_STRAINER = SoupStrainer('div', class_=SEMINAR_DETAILS_REGEX)
+# Maximum number of seminar details pages fetched at once.
+MAX_DETAILS_WORKERS = 4
+# How long a single page request may take, in seconds.
+REQUEST_TIMEOUT = 30
+# Number of seconds the speaker from a seminar details page is reused for.
+SEMINAR_DETAILS_CACHE_TTL = 6 * 60 * 60
+
+_details_executor = ThreadPoolExecutor(max_workers=MAX_DETAILS_WORKERS)
+_seminar_speaker_cache: TTLCache[str, str] = TTLCache(SEMINAR_DETAILS_CACHE_TTL, maxsize=128)
 
 
 class InvalidFormatException(Exception):
@@ -42,15 +57,29 @@ def get_seminars() -> List[Tuple[str, str, datetime, str]]:
     Returns summary information for upcoming ITEE seminars, comprising
     seminar date, seminar title, venue, and an information link.
     """
-    html = BeautifulSoup(get_seminar_summary_page(), 'html.parser')
-    summary_table = html.find('table', summary='ITEE Seminar List')
+    return get_seminars_from_page(get_seminar_summary_page())
+
+
+def get_seminars_from_page(summary_page: bytes) -> List[Tuple[str, str, datetime, str]]:
+    """
+    Returns summary information for the seminars listed on the given seminar
+    summary page.
+    """
+    html = get_soup(summary_page, parse_only=SEMINAR_SUMMARY_STRAINER)
+    summary_table = html.find('table')
     if (summary_table is None) or (summary_table.tbody is None):
         # When no seminars are scheduled, no table is shown.
         return []
 
     seminar_rows = summary_table.tbody.find_all('tr')
-    seminar_summaries = map(get_seminar_summary, seminar_rows)
-    return list(seminar_summaries)
+    seminar_summaries = [get_seminar_summary(row) for row in seminar_rows]
+    # Follow each seminar's link to obtain its speaker. The details pages are fetched in
+    # parallel, and seminars whose speaker couldn't be obtained are left without one.
+    seminar_links = [link for _, link, _, _ in seminar_summaries]
+    seminar_speakers = _details_executor.map(get_seminar_speaker, seminar_links)
+    return [(title if speaker is None else f'{title} - {speaker}', link, seminar_date, venue)
+            for (title, link, seminar_date, venue), speaker
+            in zip(seminar_summaries, seminar_speakers)]
 
 
 def get_seminar_summary_page() -> bytes:
@@ -59,7 +88,7 @@ def get_seminar_summary_page() -> bytes:
     This method is stubbed in unit tests.
     :return: The HTML of the page containing upcoming seminar information.
     """
-    http_response = requests.get(ITEE_SEMINAR_LIST_URL)
+    http_response = requests.get(ITEE_SEMINAR_LIST_URL, timeout=REQUEST_TIMEOUT)
     if http_response.status_code != requests.codes.ok:
         raise HttpException(ITEE_SEMINAR_LIST_URL, http_response.status_code)
     return http_response.content
@@ -71,6 +100,7 @@ def get_seminar_summary(seminar_row) -> Tuple[str, str, datetime, str]:
     table row.
     This method makes assumptions about the format of seminar information on the
     UQ website and is likely to break if the website is updated.
+    The title does not include the seminar's speaker, see get_seminar_speaker.
     :param seminar_row: The table row element (tr) to parse
     :return: A structure containing seminar information
              in the order: seminar title, link, date, venue.
@@ -95,15 +125,25 @@ def get_seminar_summary(seminar_row) -> Tuple[str, str, datetime, str]:
     # Venue is in the third column
     venue = elements[2].get_text().strip()
 
-    # Follow the link to obtain the seminar author
+    return title, link, seminar_date, venue
+
+
+def get_seminar_speaker(seminar_url: str) -> Optional[str]:
+    """
+    Returns the name of the speaker delivering the seminar at the given seminar
+    details URL, or None if it could not be obtained (e.g. the page timed out),
+    so that the rest of the seminars are still listed. Speakers are cached, so
+    each details page is only fetched once in a while.
+    """
     try:
-        # Append author name if it could be successfully obtained, otherwise
-        # forget about it
-        title = title + ' - ' + get_seminar_details(link)
+        return _seminar_speaker_cache.get_or_set(seminar_url,
+                                                 lambda: str(get_seminar_details(seminar_url)))
     except (HttpException, InvalidFormatException) as e:
         bot.logger.error(e.message)
-
-    return title, link, seminar_date, venue
+        return None
+    except requests.RequestException as e:
+        bot.logger.error(f'Could not load \'{seminar_url}\': {e}')
+        return None
 
 
 def get_seminar_details(seminar_url: str) -> str:
@@ -112,8 +152,15 @@ def get_seminar_details(seminar_url: str) -> str:
     :param seminar_url: the URL containing Seminar details
     :return: the name of the speaker
     """
-    html = BeautifulSoup(get_seminar_details_page(seminar_url), 'html.parser')
-    seminar_details_element = html.find('div', class_=SEMINAR_DETAILS_REGEX)
+    return get_seminar_details_from_page(get_seminar_details_page(seminar_url), seminar_url)
+
+
+def get_seminar_details_from_page(details_page: bytes, seminar_url: str) -> str:
+    """
+    Obtains the name of the speaker delivering the seminar from the given seminar details page.
+    """
+    html = get_soup(details_page, parse_only=SEMINAR_DETAILS_STRAINER)
+    seminar_details_element = html.find('div')
     if (seminar_details_element is None) or (seminar_details_element.contents[1] is None):
         raise InvalidFormatException(seminar_url, f'The details for the seminar could not be found')
 
@@ -126,7 +173,7 @@ def get_seminar_details_page(seminar_url: str) -> bytes:
     This method is stubbed in unit tests.
     :return: The HTML of the page containing seminar details.
     """
-    http_response = requests.get(seminar_url)
+    http_response = requests.get(seminar_url, timeout=REQUEST_TIMEOUT)
     if http_response.status_code != requests.codes.ok:
         raise HttpException(seminar_url, http_response.status_code)
     return http_response.content
@@ -0,0 +1,25 @@
+"""
+Utilities for scraping HTML pages with BeautifulSoup.
+"""
+
+from typing import Optional, Union
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml is considerably faster than Python's built-in html.parser, but is an
+# optional dependency (pip install uqcsbot[lxml]), so fall back if it's missing.
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+
+def get_soup(markup: Union[str, bytes],
+             parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """
+    Returns the parsed BeautifulSoup for the given HTML using the fastest
+    available parser. If a SoupStrainer is given, only the elements it matches
+    (and their descendants) are parsed and kept, which is much faster than
+    parsing the full page when only a small part of it is needed.
+    """
+    return BeautifulSoup(markup, HTML_PARSER, parse_only=parse_only)
@@ -1,18 +1,54 @@
 from uqcsbot import bot
+from uqcsbot.models import CourseProfile
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.exceptions import RequestException
+from sqlalchemy import and_, not_
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from dateutil import parser
-from bs4 import BeautifulSoup
-from functools import partial
+from bs4 import SoupStrainer
+from functools import lru_cache
 from binascii import hexlify
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple, NamedTuple
+from uqcsbot.utils.cache_utils import TTLCache
+from uqcsbot.utils.scraping_utils import get_soup
 
 BASE_COURSE_URL = 'https://my.uq.edu.au/programs-courses/course.html?course_code='
 BASE_ASSESSMENT_URL = ('https://www.courses.uq.edu.au/'
                        'student_section_report.php?report=assessment&profileIds=')
 BASE_CALENDAR_URL = 'http://www.uq.edu.au/events/calendar_view.php?category_id=16&year='
 OFFERING_PARAMETER = 'offer'
+DEFAULT_CAMPUS = 'STLUC'
+# Number of seconds a parsed assessment table is reused for before being fetched again.
+ASSESSMENT_CACHE_TTL = 60 * 60
+# Shared parser settings for assessment due dates, which are given day first (e.g. 26 Mar 18).
+DATE_PARSER_INFO = parser.parserinfo(dayfirst=True)
+
+# A single parsed row of an assessment table. The start and end datetimes are
+# resolved once when the table is parsed. If the due date could not be parsed,
+# they are both None and parse_error describes why.
+AssessmentItem = NamedTuple('AssessmentItem',
+                            [('course_name', str), ('task', str), ('due_date', str),
+                             ('weight', str), ('start', Optional[datetime]),
+                             ('end', Optional[datetime]), ('parse_error', Optional[str])])
+# Only the parts of UQ's pages which are needed are parsed.
+CALENDAR_EVENT_STRAINER = SoupStrainer('li', class_='description-calendar-view')
+ASSESSMENT_TABLE_STRAINER = SoupStrainer('table', class_='tblborder')
+# Maximum number of concurrent requests made to UQ when resolving multiple courses.
+MAX_COURSE_WORKERS = 6
+# Maximum number of concurrent requests made to UQ when pre-warming the course profile index.
+MAX_PREWARM_WORKERS = 2
+
+# Shared between all callers so the total number of in-flight UQ requests stays bounded.
+_course_executor = ThreadPoolExecutor(max_workers=MAX_COURSE_WORKERS)
+# Pre-warming has its own executor, so it doesn't hold up commands waiting on _course_executor.
+_prewarm_executor = ThreadPoolExecutor(max_workers=MAX_PREWARM_WORKERS)
+_exam_period_lock = threading.Lock()
+# Parsed assessment tables, keyed by the assessment table url.
+_assessment_cache: TTLCache[str, List[AssessmentItem]] = TTLCache(ASSESSMENT_CACHE_TTL,
+                                                                  maxsize=256)
 
 
 class DateSyntaxException(Exception):
@@ -58,7 +94,17 @@ class HttpException(Exception):
         super().__init__(self.message, self.url, self.status_code)
 
 
-def get_offering_code(semester=None, campus='STLUC', is_internal=True):
+def get_current_semester() -> int:
+    """
+    Returns the current semester (1 or 2).
+
+    Note: Assumes that Semester 1 always occurs before or
+    during June, with Semester 2 occurring after.
+    """
+    return 1 if datetime.today().month <= 6 else 2
+
+
+def get_offering_code(semester=None, campus=DEFAULT_CAMPUS, is_internal=True):
     """
     Returns the hex encoded offering string for the given semester and campus.
 
@@ -69,7 +115,7 @@ def get_offering_code(semester=None, campus='STLUC', is_internal=True):
     """
     # TODO: Codes for other campuses.
     if semester is None:
-        semester = 1 if datetime.today().month <= 6 else 2
+        semester = get_current_semester()
     location = 'IN' if is_internal else 'EX'
     return hexlify(f'{campus}{semester}{location}'.encode('utf-8')).decode('utf-8')
 
@@ -100,7 +146,14 @@ def get_course_profile_url(course_name):
         course_url, params={OFFERING_PARAMETER: get_offering_code()})
     if http_response.status_code != requests.codes.ok:
         raise HttpException(course_url, http_response.status_code)
-    html = BeautifulSoup(http_response.content, 'html.parser')
+    return get_course_profile_url_from_page(course_name, http_response.content)
+
+
+def get_course_profile_url_from_page(course_name, course_page):
+    """
+    Returns the URL to the latest course profile from the given course page.
+    """
+    html = get_soup(course_page)
     if html.find(id='course-notfound'):
         raise CourseNotFoundException(course_name)
     profile = html.find('a', class_='profile-available')
@@ -111,12 +164,94 @@ def get_course_profile_url(course_name):
 
 def get_course_profile_id(course_name):
     """
-    Returns the ID to the latest course profile for the given course.
+    Returns the ID to the latest course profile for the given course. IDs are
+    stored in the course profile index, so each course is only looked up on
+    the UQ website once per offering.
     """
+    course_code = course_name.upper()
+    profile_id = get_indexed_course_profile_id(course_code)
+    if profile_id is not None:
+        return profile_id
     profile_url = get_course_profile_url(course_name)
     # The profile url looks like this
     # https://course-profiles.uq.edu.au/student_section_loader/section_1/100728
-    return profile_url[profile_url.rindex('/')+1:]
+    profile_id = profile_url[profile_url.rindex('/')+1:]
+    index_course_profile_id(course_code, profile_id)
+    return profile_id
+
+
+def get_current_course_profile_filter():
+    """
+    Returns the filter criteria matching course profiles of the current
+    offering (see get_offering_code).
+    """
+    return (CourseProfile.year == datetime.today().year,
+            CourseProfile.semester == get_current_semester(),
+            CourseProfile.campus == DEFAULT_CAMPUS,
+            CourseProfile.is_internal == True)  # noqa: E712
+
+
+def get_indexed_course_profile_id(course_code: str) -> Optional[str]:
+    """
+    Returns the indexed course profile ID for the given course in the current
+    offering, or None if it has not been indexed yet.
+    """
+    session = bot.create_db_session()
+    course_profile = session.query(CourseProfile).filter(
+        CourseProfile.course_code == course_code,
+        *get_current_course_profile_filter()).one_or_none()
+    session.close()
+    return course_profile.profile_id if course_profile else None
+
+
+def index_course_profile_id(course_code: str, profile_id: str) -> None:
+    """
+    Stores the given course profile ID against the current offering.
+    """
+    session = bot.create_db_session()
+    session.add(CourseProfile(course_code=course_code, year=datetime.today().year,
+                              semester=get_current_semester(), campus=DEFAULT_CAMPUS,
+                              is_internal=True, profile_id=profile_id))
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another lookup for the same course beat us to it, which is fine.
+        session.rollback()
+    session.close()
+
+
+def prune_course_profile_index() -> int:
+    """
+    Removes all indexed course profiles that are not for the current offering,
+    as profile IDs change once the offering rolls over. Returns the number of
+    profiles removed.
+    """
+    session = bot.create_db_session()
+    stale_profiles = session.query(CourseProfile).filter(
+        not_(and_(*get_current_course_profile_filter())))
+    removed = stale_profiles.delete(synchronize_session=False)
+    session.commit()
+    session.close()
+    return removed
+
+
+def prewarm_course_profile_index(course_names: List[str]) -> int:
+    """
+    Ensures that the course profile index contains the given courses for the
+    current offering, resolving any missing courses a few at a time. Courses
+    that cannot be resolved are skipped. Returns the number of courses that
+    are now indexed.
+    """
+    futures = [_prewarm_executor.submit(get_course_profile_id, course_name)
+               for course_name in course_names]
+    indexed = 0
+    for future in as_completed(futures):
+        try:
+            future.result()
+            indexed += 1
+        except (HttpException, CourseNotFoundException, ProfileNotFoundException) as e:
+            bot.logger.info(e.message)
+    return indexed
 
 
 def get_current_exam_period():
@@ -127,15 +262,33 @@ def get_current_exam_period():
     during June, with Semester 2 occurring after.
     """
     today = datetime.today()
-    current_calendar_url = BASE_CALENDAR_URL + str(today.year)
+    current_semester = str(get_current_semester())
+    # Held while fetching so that concurrent lookups share a single request.
+    with _exam_period_lock:
+        return get_exam_period(today.year, current_semester)
+
+
+@lru_cache(maxsize=None)
+def get_exam_period(year: int, semester: str):
+    """
+    Returns the start and end datetimes for the given semester's exam period.
+    Results are memoised, as the exam period only changes once per semester.
+    """
+    current_calendar_url = BASE_CALENDAR_URL + str(year)
     http_response = get_uq_request(current_calendar_url)
     if http_response.status_code != requests.codes.ok:
         raise HttpException(current_calendar_url, http_response.status_code)
-    html = BeautifulSoup(http_response.content, 'html.parser')
-    event_date_elements = html.findAll('li', class_='description-calendar-view')
-    event_date_texts = [element.text for element in event_date_elements]
-    current_semester = '1' if today.month <= 6 else '2'
-    exam_snippet = f'Semester {current_semester} examination period '
+    return get_exam_period_from_page(http_response.content, semester)
+
+
+def get_exam_period_from_page(calendar_page, semester: str):
+    """
+    Returns the start and end datetimes for the given semester's exam period
+    from the given UQ calendar page.
+    """
+    html = get_soup(calendar_page, parse_only=CALENDAR_EVENT_STRAINER)
+    event_date_texts = [element.text for element in html.find_all('li')]
+    exam_snippet = f'Semester {semester} examination period '
     # The first event encountered is the one which states the commencement of
     # the current semester's exams and also provides the exam period.
     exam_date_text = [t for t in event_date_texts if exam_snippet in t][0]
@@ -145,42 +298,42 @@ def get_current_exam_period():
     return start_datetime, end_datetime
 
 
-def get_parsed_assessment_due_date(assessment_item):
+def get_parsed_assessment_due_date(course_name: str, due_date: str):
     """
-    Returns the parsed due date for the given assessment item as a datetime
-    object. If the date cannot be parsed, a DateSyntaxException is raised.
+    Returns the parsed start and end datetimes for the given assessment due
+    date. If the date cannot be parsed, a DateSyntaxException is raised.
     """
-    course_name, _, due_date, _ = assessment_item
     if due_date == 'Examination Period':
         return get_current_exam_period()
-    parser_info = parser.parserinfo(dayfirst=True)
     try:
         # If a date range is detected, attempt to split into start and end
         # dates. Else, attempt to just parse the whole thing.
         if ' - ' in due_date:
             start_date, end_date = due_date.split(' - ', 1)
-            start_datetime = parser.parse(start_date, parser_info)
-            end_datetime = parser.parse(end_date, parser_info)
+            start_datetime = parser.parse(start_date, DATE_PARSER_INFO)
+            end_datetime = parser.parse(end_date, DATE_PARSER_INFO)
             return start_datetime, end_datetime
-        due_datetime = parser.parse(due_date, parser_info)
+        due_datetime = parser.parse(due_date, DATE_PARSER_INFO)
         return due_datetime, due_datetime
     except Exception:
         raise DateSyntaxException(due_date, course_name)
 
 
-def is_assessment_after_cutoff(assessment, cutoff):
+def is_assessment_after_cutoff(assessment: AssessmentItem, cutoff: datetime) -> bool:
     """
     Returns whether the assessment occurs after the given cutoff.
     """
-    try:
-        start_datetime, end_datetime = get_parsed_assessment_due_date(assessment)
-    except DateSyntaxException as e:
-        bot.logger.error(e.message)
-        # If we can't parse a date, we're better off keeping it just in case.
-        # TODO(mitch): Keep track of these instances to attempt to accurately
-        # parse them in future. Will require manual detection + parsing.
+    if assessment.parse_error is not None:
+        # If we couldn't parse a date, we're better off keeping it just in case.
         return True
-    return end_datetime >= cutoff if end_datetime else start_datetime >= cutoff
+    return assessment.end >= cutoff if assessment.end else assessment.start >= cutoff
+
+
+def get_assessment_url(profile_ids: List[str]) -> str:
+    """
+    Returns the url to the assessment table for the given course profile ids.
+    """
+    return BASE_ASSESSMENT_URL + ','.join(profile_ids)
 
 
 def get_course_assessment_page(course_names: List[str]) -> str:
@@ -188,32 +341,114 @@ def get_course_assessment_page(course_names: List[str]) -> str:
     Determines the course ids from the course names and returns the
     url to the assessment table for the provided courses
     """
-    profile_ids = map(get_course_profile_id, course_names)
-    return BASE_ASSESSMENT_URL + ','.join(profile_ids)
+    return get_assessment_url(get_course_profile_ids(course_names))
+
+
+def get_course_profile_ids(course_names: List[str]) -> List[str]:
+    """
+    Returns the profile ids for the given courses, in the same order. The
+    courses are resolved concurrently, with at most MAX_COURSE_WORKERS
+    requests to UQ in flight at once.
+    """
+    return list(_course_executor.map(get_course_profile_id, course_names))
+
+
+def get_single_course_assessment(course_name: str,
+                                 cutoff=None) -> Tuple[str, str, List[AssessmentItem]]:
+    """
+    Returns (course name, profile id, assessment) for the given course, with
+    only the assessment that occurs after the given cutoff.
+    """
+    profile_id = get_course_profile_id(course_name)
+    assessment_url = get_assessment_url([profile_id])
+    return course_name, profile_id, get_course_assessment([course_name], cutoff, assessment_url)
 
 
-def get_course_assessment(course_names, cutoff=None, assessment_url=None):
+def get_each_course_assessment(course_names: List[str],
+                               cutoff=None) -> Dict[str, List[AssessmentItem]]:
+    """
+    Concurrently fetches the assessment for each of the given courses,
+    returning the assessment for each course that occurs after the given
+    cutoff. Unlike iter_course_assessment, courses which could not be
+    fetched are logged and left out rather than raising.
+    """
+    futures = [_course_executor.submit(get_single_course_assessment, course_name, cutoff)
+               for course_name in course_names]
+    course_assessment = {}
+    for future in as_completed(futures):
+        try:
+            course_name, _, assessment = future.result()
+        except (HttpException, CourseNotFoundException, ProfileNotFoundException) as e:
+            bot.logger.error(e.message)
+            continue
+        course_assessment[course_name] = assessment
+    return course_assessment
+
+
+def iter_course_assessment(course_names: List[str],
+                           cutoff=None) -> Iterator[Tuple[str, str, list]]:
+    """
+    Concurrently fetches the assessment for each of the given courses, yielding
+    (course name, profile id, assessment) for each course as soon as it has
+    been fetched. Courses are therefore not necessarily yielded in the order
+    given. Any exception raised while fetching a course is re-raised.
+    """
+    futures = [_course_executor.submit(get_single_course_assessment, course_name, cutoff)
+               for course_name in course_names]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Don't bother fetching the remaining courses if we've stopped early.
+        for future in futures:
+            future.cancel()
+
+
+def get_course_assessment(course_names, cutoff=None,
+                          assessment_url=None) -> List[AssessmentItem]:
     """
     Returns all the course assessment for the given
     courses that occur after the given cutoff.
     """
     if assessment_url is None:
-        joined_assessment_url = get_course_assessment_page(course_names)
-    else:
-        joined_assessment_url = assessment_url
-        http_response = get_uq_request(joined_assessment_url)
+        assessment_url = get_course_assessment_page(course_names)
+    assessment = get_parsed_assessment(assessment_url)
+    # If no cutoff is specified, return everything.
+    if cutoff is None:
+        return assessment
+    return [item for item in assessment if is_assessment_after_cutoff(item, cutoff)]
+
+
+def get_parsed_assessment(assessment_url: str) -> List[AssessmentItem]:
+    """
+    Returns every item in the assessment table at the given url, with their
+    due dates resolved. Parsed tables are cached for ASSESSMENT_CACHE_TTL
+    seconds so that repeated lookups of the same courses don't refetch or
+    reparse them.
+    """
+    return _assessment_cache.get_or_set(assessment_url,
+                                        lambda: fetch_parsed_assessment(assessment_url))
+
+
+def fetch_parsed_assessment(assessment_url: str) -> List[AssessmentItem]:
+    """
+    Fetches and parses every item in the assessment table at the given url.
+    """
+    http_response = get_uq_request(assessment_url)
     if http_response.status_code != requests.codes.ok:
-        raise HttpException(joined_assessment_url, http_response.status_code)
-    html = BeautifulSoup(http_response.content, 'html.parser')
-    assessment_table = html.find('table', class_='tblborder')
+        raise HttpException(assessment_url, http_response.status_code)
+    return get_parsed_assessment_from_page(http_response.content)
+
+
+def get_parsed_assessment_from_page(assessment_page) -> List[AssessmentItem]:
+    """
+    Parses every item in the assessment table on the given assessment page.
+    """
+    html = get_soup(assessment_page, parse_only=ASSESSMENT_TABLE_STRAINER)
+    assessment_table = html.find('table')
     # Start from 1st index to skip over the row containing column names.
-    assessment = assessment_table.findAll('tr')[1:]
-    parsed_assessment = map(get_parsed_assessment_item, assessment)
-    # If no cutoff is specified, set cutoff to UNIX epoch (i.e. filter nothing).
-    cutoff = cutoff or datetime.min
-    assessment_filter = partial(is_assessment_after_cutoff, cutoff=cutoff)
-    filtered_assessment = filter(assessment_filter, parsed_assessment)
-    return list(filtered_assessment)
+    assessment = assessment_table.find_all('tr')[1:]
+    return [get_parsed_assessment_item(item) for item in assessment]
 
 
 def get_element_inner_html(dom_element):
@@ -223,7 +458,7 @@ def get_element_inner_html(dom_element):
     return dom_element.decode_contents(formatter='html')
 
 
-def get_parsed_assessment_item(assessment_item):
+def get_parsed_assessment_item(assessment_item) -> AssessmentItem:
     """
     Returns the parsed assessment details for the
     given assessment item table row element.
@@ -233,7 +468,7 @@ def get_parsed_assessment_item(assessment_item):
     This is likely insufficient to handle every course's
     structure, and thus is subject to change.
     """
-    course_name, task, due_date, weight = assessment_item.findAll('div')
+    course_name, task, due_date, weight = assessment_item.find_all('div')
     # Handles courses of the form 'CSSE1001 - Sem 1 2018 - St Lucia - Internal'.
     # Thus, this bit of code will extract the course.
     course_name = course_name.text.strip().split(' - ')[0]
@@ -246,4 +481,12 @@ def get_parsed_assessment_item(assessment_item):
     # Handles weights of the form '30%<br/>Alternative to oral presentation'.
     # Thus, this bit of code will keep only the weight portion of the field.
     weight = get_element_inner_html(weight).strip().split('<br/>')[0]
-    return (course_name, task, due_date, weight)
+    try:
+        start_datetime, end_datetime = get_parsed_assessment_due_date(course_name, due_date)
+        parse_error = None
+    except DateSyntaxException as e:
+        bot.logger.error(e.message)
+        start_datetime = end_datetime = None
+        parse_error = e.message
+    return AssessmentItem(course_name, task, due_date, weight,
+                          start_datetime, end_datetime, parse_error)